@@ -1,4 +1,6 @@
-from sqlalchemy import Column, Integer, String, JSON, DateTime, func, Sequence
+from sqlalchemy import (
+    Column, Integer, String, JSON, DateTime, func, Sequence, ForeignKey, Index, UniqueConstraint
+)
 from app.core.database import Base
 
 class Cliente(Base):
@@ -8,8 +10,38 @@ class Cliente(Base):
     email = Column(String(255), unique=True, index=True)
     credentials = Column(JSON, nullable=True)
     expiry = Column(String)
+    # Expiração do access token (credentials['expiry']), indexada para a
+    # varredura de renovação. Mantida por quem grava credentials.
+    token_expiry = Column(DateTime(timezone=True), index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.current_timestamp())
     updated_at = Column(DateTime(timezone=True), onupdate=func.current_timestamp())
 
     def __repr__(self):
-        return f"<Cliente(id={self.id}, email={self.email})>" 
\ No newline at end of file
+        return f"<Cliente(id={self.id}, email={self.email})>" 
+
+class CalendarEvent(Base):
+    """Espelho local dos eventos do Google Calendar de cada cliente"""
+    __tablename__ = "calendar_event"
+    __table_args__ = (
+        UniqueConstraint("cliente_id", "google_id", name="uq_calendar_event_cliente_google_id"),
+        Index("ix_calendar_event_cliente_periodo", "cliente_id", "start", "end"),
+    )
+
+    id = Column(Integer, Sequence('calendar_event_id_seq'), primary_key=True)
+    cliente_id = Column(Integer, ForeignKey("cliente.id", ondelete="CASCADE"), nullable=False)
+    google_id = Column(String(1024), nullable=False)
+    start = Column(DateTime(timezone=True), nullable=False)
+    end = Column(DateTime(timezone=True), nullable=False)
+    data = Column(JSON, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.current_timestamp(), onupdate=func.current_timestamp())
+
+    def __repr__(self):
+        return f"<CalendarEvent(cliente_id={self.cliente_id}, google_id={self.google_id})>"
+
+class CalendarSyncState(Base):
+    """Estado da sincronização incremental (syncToken) por cliente"""
+    __tablename__ = "calendar_sync_state"
+
+    cliente_id = Column(Integer, ForeignKey("cliente.id", ondelete="CASCADE"), primary_key=True)
+    sync_token = Column(String, nullable=True)
+    synced_at = Column(DateTime(timezone=True), nullable=True)
\ No newline at end of file
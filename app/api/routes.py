@@ -1,7 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 from app.core.database import get_db
+from app.services.cliente_service import encode_cursor, decode_cursor
 from . import models, schemas
 from datetime import datetime
 from pydantic import EmailStr
@@ -12,7 +14,7 @@ router = APIRouter(tags=["clientes"])
 async def create_cliente(
     email: EmailStr,
     cliente: schemas.ClienteCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Cria um novo cliente.
@@ -21,7 +23,8 @@ async def create_cliente(
     - **credentials**: Credenciais do cliente
     - **expiry**: Data de expiração
     """
-    if db.query(models.Cliente).filter(models.Cliente.email == email).first():
+    result = await db.execute(select(models.Cliente).where(models.Cliente.email == email))
+    if result.scalars().first():
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email já registrado"
@@ -34,34 +37,51 @@ async def create_cliente(
     )
     
     db.add(db_cliente)
-    db.commit()
-    db.refresh(db_cliente)
+    await db.commit()
+    await db.refresh(db_cliente)
     return db_cliente
 
 @router.get("/clientes", response_model=List[schemas.ClienteResponse])
-async def list_clientes(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+async def list_clientes(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_db)
+):
     """
-    Lista todos os clientes.
+    Lista todos os clientes em ordem de ID.
+
+    A próxima página é indicada pelo cabeçalho X-Next-Cursor.
     """
-    clientes = db.query(models.Cliente).offset(skip).limit(limit).all()
+    query = select(models.Cliente).order_by(models.Cliente.id).limit(limit + 1)
+    if cursor:
+        after = decode_cursor(cursor)
+        if not isinstance(after, int):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor inválido")
+        query = query.where(models.Cliente.id > after)
+    result = await db.execute(query)
+    clientes = list(result.scalars().all())
+    if len(clientes) > limit:
+        clientes = clientes[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(clientes[-1].id)
     return clientes
 
 @router.get("/clientes/{cliente_id}", response_model=schemas.ClienteResponse)
-async def get_cliente(cliente_id: int, db: Session = Depends(get_db)):
+async def get_cliente(cliente_id: int, db: AsyncSession = Depends(get_db)):
     """
     Obtém um cliente específico pelo ID.
     """
-    cliente = db.query(models.Cliente).filter(models.Cliente.id == cliente_id).first()
+    cliente = await db.get(models.Cliente, cliente_id)
     if cliente is None:
         raise HTTPException(status_code=404, detail="Cliente não encontrado")
     return cliente
 
 @router.patch("/clientes/{cliente_id}", response_model=schemas.ClienteResponse)
-async def update_cliente(cliente_id: int, cliente: schemas.ClienteUpdate, db: Session = Depends(get_db)):
+async def update_cliente(cliente_id: int, cliente: schemas.ClienteUpdate, db: AsyncSession = Depends(get_db)):
     """
     Atualiza as informações de credentials e expiry de um cliente.
     """
-    db_cliente = db.query(models.Cliente).filter(models.Cliente.id == cliente_id).first()
+    db_cliente = await db.get(models.Cliente, cliente_id)
     if db_cliente is None:
         raise HTTPException(status_code=404, detail="Cliente não encontrado")
     
@@ -70,18 +90,18 @@ async def update_cliente(cliente_id: int, cliente: schemas.ClienteUpdate, db: Se
         setattr(db_cliente, field, value)
     
     db_cliente.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(db_cliente)
+    await db.commit()
+    await db.refresh(db_cliente)
     return db_cliente
 
 @router.delete("/clientes/{cliente_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_cliente(cliente_id: int, db: Session = Depends(get_db)):
+async def delete_cliente(cliente_id: int, db: AsyncSession = Depends(get_db)):
     """
     Remove um cliente.
     """
-    cliente = db.query(models.Cliente).filter(models.Cliente.id == cliente_id).first()
+    cliente = await db.get(models.Cliente, cliente_id)
     if cliente is None:
         raise HTTPException(status_code=404, detail="Cliente não encontrado")
     
-    db.delete(cliente)
-    db.commit() 
\ No newline at end of file
+    await db.delete(cliente)
+    await db.commit() 
\ No newline at end of file
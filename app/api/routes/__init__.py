@@ -1,2 +1,4 @@
 from .cliente import router as cliente_router
-from .calendar import router as calendar_router 
\ No newline at end of file
+from .calendar import router as calendar_router
+from .admin import router as admin_router
+from .metrics import router as metrics_router 
\ No newline at end of file
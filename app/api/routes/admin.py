@@ -0,0 +1,99 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Optional
+import json
+from app.core.database import pool_status
+from app.core.profiling import list_profiles, read_profile
+from app.core.startup import startup_report
+from app.services.cliente_service import ClienteService
+from app.services.event_cache import event_cache
+from app.services.cliente_cache import cliente_cache
+from app.services.credential_writer import credential_writer
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["admin"]
+)
+
+@router.get("/cache/events")
+async def event_cache_stats():
+    """
+    Contadores do cache de agendas (hits, misses, evictions...).
+    """
+    return event_cache.stats()
+
+@router.get("/cache/clientes")
+async def cliente_cache_stats():
+    """
+    Contadores do cache de clientes usado pelas rotas de calendário.
+    """
+    return cliente_cache.stats()
+
+@router.get("/credentials/write-behind")
+async def credential_writer_stats():
+    """
+    Fila de gravação das credenciais renovadas (pendentes, fundidas, gravadas).
+    """
+    return credential_writer.stats()
+
+@router.get("/clientes/expiring")
+async def expiring_clientes(
+    within: int = Query(600, ge=0, description="Segundos a partir de agora"),
+    limit: Optional[int] = Query(None, ge=1)
+):
+    """
+    Clientes cujo token expira nos próximos `within` segundos (ou já expirou),
+    do mais urgente ao menos urgente, como NDJSON.
+    """
+    before = datetime.now(timezone.utc) + timedelta(seconds=within)
+    return StreamingResponse(_expiring_lines(before, limit), media_type="application/x-ndjson")
+
+async def _expiring_lines(before: datetime, limit: Optional[int]) -> AsyncIterator[bytes]:
+    # list_expiring abre as próprias sessões: o corpo da resposta é gerado
+    # depois que o handler retorna
+    count = 0
+    expiring = ClienteService.list_expiring(before)
+    try:
+        async for email, token_expiry in expiring:
+            yield (json.dumps({"email": email, "token_expiry": token_expiry.isoformat()}) + "\n").encode()
+            count += 1
+            if limit is not None and count >= limit:
+                break
+    finally:
+        await expiring.aclose()
+
+@router.get("/db/pool")
+async def db_pool_stats():
+    """
+    Pools de conexão (primário, shards e réplicas): conexões em uso, overflow,
+    espera no checkout e rotatividade.
+    """
+    return pool_status()
+
+@router.get("/startup")
+async def startup_stats(limit: int = Query(25, ge=1, le=500)):
+    """
+    Inicialização deste worker: tempo até ficar pronto e importações mais
+    lentas.
+    """
+    return startup_report(limit)
+
+@router.get("/profiles")
+async def profiles(limit: int = Query(50, ge=1, le=1000)):
+    """
+    Perfis de requisições gravados (PROFILE_ENABLED), do mais recente ao
+    mais antigo.
+    """
+    return list_profiles(limit)
+
+@router.get("/profiles/{name}", response_class=PlainTextResponse)
+async def profile(name: str):
+    """
+    Pilhas colapsadas de um perfil (flamegraph.pl ou speedscope), com o peso
+    de cada pilha em microssegundos.
+    """
+    content = read_profile(name)
+    if content is None:
+        raise HTTPException(status_code=404, detail="Perfil não encontrado")
+    return content
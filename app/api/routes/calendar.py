@@ -1,22 +1,39 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
-from sqlalchemy.orm import Session
-from typing import List
-from datetime import datetime
-from app.core.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import AsyncGenerator, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+import asyncio
+import json
+from datetime import datetime, date, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from pydantic import ValidationError
+from app.core.config import settings
+from app.core.sharding import shards, get_cliente_db, get_cliente_read_db
 from app.api.schemas import calendar as schemas
-from app.services.google_calendar import GoogleCalendarService
+from app.services.google_calendar import (
+    GoogleCalendarService, get_service, invalidate_service, event_bounds, as_utc,
+    batch_error_message, batch_retry_after
+)
 from app.services.google_auth import GoogleAuthService
+from app.services.token_refresher import token_refresher
+from app.services.event_mirror import EventMirrorService
+from app.services.event_cache import event_cache
+from app.services.intervals import IntervalIndex
+from app.services.fanout import gather_bounded
+from app.services.cliente_cache import ClienteInfo, cliente_cache
+from app.services.credential_writer import credential_writer
+from app.services import free_slots
 from app.api.models import Cliente
 
 router = APIRouter(tags=["calendar"])
 
 @router.get("/calendar/authorize/{email}")
-async def authorize_google_calendar(email: str, db: Session = Depends(get_db)):
+async def authorize_google_calendar(email: str, db: AsyncSession = Depends(get_cliente_read_db)):
     """
     Inicia o processo de autorização do Google Calendar
     """
-    cliente = db.query(Cliente).filter(Cliente.email == email).first()
-    if not cliente:
+    if await cliente_cache.get(db, email) is None:
         raise HTTPException(status_code=404, detail="Cliente não encontrado")
     
     auth_url, state = GoogleAuthService.create_authorization_url()
@@ -32,13 +49,14 @@ async def oauth2callback(
     code: str,
     state: str,  # Adicionado parâmetro state
     email: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_cliente_db)
 ):
     """
     Callback para processar a resposta do Google OAuth2
     """
     try:
-        cliente = db.query(Cliente).filter(Cliente.email == email).first()
+        result = await db.execute(select(Cliente).where(Cliente.email == email))
+        cliente = result.scalars().first()
         if not cliente:
             raise HTTPException(status_code=404, detail="Cliente não encontrado")
         
@@ -47,8 +65,12 @@ async def oauth2callback(
         
         # Atualizar credenciais no banco
         cliente.credentials = credentials
+        cliente.token_expiry = GoogleAuthService.token_expiry(credentials)
         cliente.updated_at = datetime.utcnow()
-        db.commit()
+        await db.commit()
+        credential_writer.discard(email)
+        invalidate_service(email)
+        await cliente_cache.invalidate(email)
         
         return {"message": "Autorização concluída com sucesso"}
     except Exception as e:
@@ -57,89 +79,555 @@ async def oauth2callback(
             detail=f"Erro na autorização: {str(e)}"
         )
 
-async def get_calendar_service(email: str, db: Session = Depends(get_db)) -> GoogleCalendarService:
+async def get_cliente(email: str, db: AsyncSession = Depends(get_cliente_read_db)) -> ClienteInfo:
     """
-    Dependency para obter o serviço do Google Calendar com credenciais do banco
+    Dependency para obter o cliente pelo email (via cliente_cache)
     """
-    cliente = db.query(Cliente).filter(Cliente.email == email).first()
+    cliente = await cliente_cache.get(db, email)
     if not cliente:
         raise HTTPException(status_code=404, detail="Cliente não encontrado")
-    
+    return cliente
+
+async def get_calendar_service(email: str, cliente: ClienteInfo = Depends(get_cliente)) -> GoogleCalendarService:
+    """
+    Dependency para obter o serviço do Google Calendar com credenciais do banco
+    """
+    return await _service_for(cliente)
+
+async def _service_for(cliente: ClienteInfo) -> GoogleCalendarService:
     if not cliente.credentials:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Cliente não autorizado para Google Calendar"
         )
     
-    service = GoogleCalendarService(cliente.credentials)
+    # Normalmente o token já foi renovado em background; se ainda estiver
+    # expirado, renova aqui (uma única renovação em andamento por cliente)
+    credentials = cliente.credentials
+    if GoogleAuthService.needs_refresh(credentials):
+        credentials = await token_refresher.refresh(cliente.email, credentials)
     
-    # Atualizar credenciais se necessário
-    updated_credentials = service.get_updated_credentials()
-    if updated_credentials:
-        cliente.credentials = updated_credentials
-        cliente.updated_at = datetime.utcnow()
-        db.commit()
-    
-    return service
+    return get_service(cliente.email, credentials)
+
+@router.get("/calendar/{email}/events")
+async def list_events_range(
+    email: str,
+    start: date,
+    end: date,
+    format: str = Query("ndjson", pattern="^(ndjson|json)$"),
+    cliente: ClienteInfo = Depends(get_cliente),
+    service: GoogleCalendarService = Depends(get_calendar_service)
+):
+    """
+    Lista os eventos de um período (start e end inclusivos, YYYY-MM-DD).
+
+    Os eventos são enviados à medida que as páginas chegam do Google (ou do
+    espelho local), como NDJSON (padrão) ou como um array JSON em chunks.
+    """
+    if end < start:
+        raise HTTPException(status_code=400, detail="A data final deve ser igual ou posterior à inicial")
+    if (end - start).days + 1 > settings.CALENDAR_RANGE_MAX_DAYS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Período máximo de {settings.CALENDAR_RANGE_MAX_DAYS} dias"
+        )
+
+    time_min = datetime(start.year, start.month, start.day, tzinfo=timezone.utc)
+    time_max = datetime(end.year, end.month, end.day, tzinfo=timezone.utc) + timedelta(days=1)
+
+    if settings.CALENDAR_MIRROR_ENABLED:
+        pages = _mirror_pages(cliente, service, time_min, time_max)
+    else:
+        pages = service.iter_range(time_min, time_max)
+
+    # A primeira página é buscada antes de responder, para que erros do
+    # Google ainda virem um status HTTP adequado
+    first_page = await pages.__anext__()
+
+    if format == "json":
+        return StreamingResponse(_json_array(first_page, pages), media_type="application/json")
+    return StreamingResponse(_ndjson(first_page, pages), media_type="application/x-ndjson")
+
+async def _mirror_pages(
+    cliente: ClienteInfo, service: GoogleCalendarService, time_min: datetime, time_max: datetime
+) -> AsyncIterator[List[dict]]:
+    # Sessão própria: o corpo da resposta é gerado depois que o handler retorna
+    async with shards.session_for(cliente.email) as db:
+        if await EventMirrorService.ensure_fresh(db, cliente.id, service):
+            empty = True
+            async for page in EventMirrorService.iter_events(db, cliente.id, time_min, time_max):
+                empty = False
+                yield page
+            if empty:
+                yield []
+            return
+    async for page in service.iter_range(time_min, time_max):
+        yield page
+
+async def _ndjson(first_page: List[dict], pages: AsyncGenerator[List[dict], None]) -> AsyncIterator[bytes]:
+    # aclose no fim, também se o cliente desconectar no meio: libera já a
+    # sessão do espelho ou a requisição ao Google em andamento
+    try:
+        page = first_page
+        while True:
+            if page:
+                yield "".join(json.dumps(event, ensure_ascii=False) + "\n" for event in page).encode()
+            try:
+                page = await pages.__anext__()
+            except StopAsyncIteration:
+                return
+    finally:
+        await pages.aclose()
+
+async def _json_array(first_page: List[dict], pages: AsyncGenerator[List[dict], None]) -> AsyncIterator[bytes]:
+    try:
+        yield b"["
+        separator = ""
+        page = first_page
+        while True:
+            for event in page:
+                yield (separator + json.dumps(event, ensure_ascii=False)).encode()
+                separator = ","
+            try:
+                page = await pages.__anext__()
+            except StopAsyncIteration:
+                break
+        yield b"]"
+    finally:
+        await pages.aclose()
 
 @router.get("/calendar/{email}/events/{date}", response_model=List[schemas.EventResponse])
 async def list_events(
     email: str,
     date: str,
-    service: GoogleCalendarService = Depends(get_calendar_service)
+    cliente: ClienteInfo = Depends(get_cliente),
+    service: GoogleCalendarService = Depends(get_calendar_service),
+    db: AsyncSession = Depends(get_cliente_db)
 ):
     """
     Lista todos os eventos de uma data específica.
     """
     try:
         event_date = datetime.strptime(date, "%Y-%m-%d")
-        events = await service.list_events(event_date)
-        return events
     except ValueError:
         raise HTTPException(
             status_code=400,
             detail="Formato de data inválido. Use YYYY-MM-DD"
         )
 
+    if settings.CALENDAR_MIRROR_ENABLED and await EventMirrorService.ensure_fresh(db, cliente.id, service):
+        return await EventMirrorService.list_events(
+            db, cliente.id, event_date, event_date + timedelta(days=1)
+        )
+
+    if settings.EVENT_CACHE_ENABLED:
+        return await event_cache.get_or_fetch(
+            email,
+            event_date.date(),
+            event_date.date() + timedelta(days=1),
+            lambda: service.list_events(event_date)
+        )
+
+    events = await service.list_events(event_date)
+    return events
+
 @router.post("/calendar/{email}/events", response_model=schemas.EventResponse)
 async def create_event(
     email: str,
     event: schemas.EventCreate,
-    service: GoogleCalendarService = Depends(get_calendar_service)
+    cliente: ClienteInfo = Depends(get_cliente),
+    service: GoogleCalendarService = Depends(get_calendar_service),
+    db: AsyncSession = Depends(get_cliente_db)
 ):
     """
     Cria um novo evento no calendário.
     """
-    event_data = event.model_dump()
+    event_data = event.model_dump(mode='json')
     created_event = await service.create_event(event_data)
+    if settings.CALENDAR_MIRROR_ENABLED:
+        await EventMirrorService.store_event(db, cliente.id, created_event)
+    if settings.EVENT_CACHE_ENABLED:
+        await event_cache.invalidate_event(email, created_event)
     return created_event
 
+@router.post("/calendar/{email}/events:batchCreate", response_model=schemas.BatchResult)
+async def batch_create_events(
+    email: str,
+    request: schemas.BatchCreateRequest,
+    response: Response,
+    cliente: ClienteInfo = Depends(get_cliente),
+    service: GoogleCalendarService = Depends(get_calendar_service),
+    db: AsyncSession = Depends(get_cliente_db)
+):
+    """
+    Cria vários eventos usando requisições batch do Google.
+
+    Retorna o resultado de cada evento, na ordem recebida. Itens recusados
+    pelo limitador de chamadas ao Google vêm com status 429 e retry_after.
+    """
+    responses = await service.batch_create_events(
+        [event.model_dump(mode='json') for event in request.events]
+    )
+    created = [item.body for item in responses if item.status < 300]
+
+    if created and settings.CALENDAR_MIRROR_ENABLED:
+        await EventMirrorService.store_events(db, cliente.id, created)
+    if created and settings.EVENT_CACHE_ENABLED:
+        await event_cache.invalidate_events(email, created)
+
+    results = []
+    for index, item in enumerate(responses):
+        if item.status < 300:
+            results.append({"index": index, "status": item.status, "event_id": item.body.get('id'), "event": item.body})
+        else:
+            results.append(_batch_error(index, item))
+    _set_retry_after(response, responses)
+    return {"succeeded": len(created), "failed": len(results) - len(created), "results": results}
+
+@router.post("/calendar/{email}/events:batchDelete", response_model=schemas.BatchResult)
+async def batch_delete_events(
+    email: str,
+    request: schemas.BatchDeleteRequest,
+    response: Response,
+    cliente: ClienteInfo = Depends(get_cliente),
+    service: GoogleCalendarService = Depends(get_calendar_service),
+    db: AsyncSession = Depends(get_cliente_db)
+):
+    """
+    Remove vários eventos usando requisições batch do Google.
+
+    Retorna o resultado de cada remoção, na ordem recebida. Itens recusados
+    pelo limitador de chamadas ao Google vêm com status 429 e retry_after.
+    """
+    responses = await service.batch_delete_events(request.event_ids)
+    deleted = [
+        event_id for event_id, item in zip(request.event_ids, responses)
+        if item.status < 300
+    ]
+
+    if deleted and settings.CALENDAR_MIRROR_ENABLED:
+        await EventMirrorService.remove_events(db, cliente.id, deleted)
+    if deleted and settings.EVENT_CACHE_ENABLED:
+        await event_cache.invalidate_event_ids(email, deleted)
+
+    results = []
+    for index, (event_id, item) in enumerate(zip(request.event_ids, responses)):
+        if item.status < 300:
+            results.append({"index": index, "status": item.status, "event_id": event_id})
+        else:
+            results.append({**_batch_error(index, item), "event_id": event_id})
+    _set_retry_after(response, responses)
+    return {"succeeded": len(deleted), "failed": len(results) - len(deleted), "results": results}
+
+def _batch_error(index: int, item) -> dict:
+    error = (item.body or {}).get('error')
+    retry_after = error.get('retryAfter') if isinstance(error, dict) else None
+    return {"index": index, "status": item.status, "error": batch_error_message(item), "retry_after": retry_after}
+
+def _set_retry_after(response: Response, responses) -> None:
+    """Retry-After da resposta quando algum item foi recusado pelo limitador local"""
+    retry_after = batch_retry_after(responses)
+    if retry_after is not None:
+        response.headers["Retry-After"] = str(retry_after)
+
 @router.delete("/calendar/{email}/events/{event_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_event(
     email: str,
     event_id: str,
-    service: GoogleCalendarService = Depends(get_calendar_service)
+    cliente: ClienteInfo = Depends(get_cliente),
+    service: GoogleCalendarService = Depends(get_calendar_service),
+    db: AsyncSession = Depends(get_cliente_db)
 ):
     """
     Remove um evento do calendário.
     """
     await service.delete_event(event_id)
+    if settings.CALENDAR_MIRROR_ENABLED:
+        await EventMirrorService.remove_event(db, cliente.id, event_id)
+    if settings.EVENT_CACHE_ENABLED:
+        await event_cache.invalidate_event_id(email, event_id)
 
 @router.post("/calendar/{email}/check-conflicts", response_model=schemas.ConflictCheck)
 async def check_conflicts(
     email: str,
     event: schemas.EventCreate,
-    service: GoogleCalendarService = Depends(get_calendar_service)
+    cliente: ClienteInfo = Depends(get_cliente),
+    service: GoogleCalendarService = Depends(get_calendar_service),
+    db: AsyncSession = Depends(get_cliente_db)
 ):
     """
     Verifica conflitos de horário para um evento.
     """
-    conflicts = await service.check_conflicts(
-        event.start.dateTime,
-        event.end.dateTime
-    )
+    if settings.CALENDAR_MIRROR_ENABLED and await EventMirrorService.ensure_fresh(db, cliente.id, service):
+        conflicts = await EventMirrorService.list_events(
+            db, cliente.id, event.start.dateTime, event.end.dateTime
+        )
+    else:
+        conflicts = await service.check_conflicts(
+            event.start.dateTime,
+            event.end.dateTime
+        )
     
     return {
         "has_conflict": len(conflicts) > 0,
         "conflicting_events": conflicts
-    } 
\ No newline at end of file
+    } 
+
+@router.post("/calendar/{email}/check-conflicts:batch", response_model=schemas.ConflictCheckBatch)
+async def check_conflicts_batch(
+    email: str,
+    request: schemas.ConflictCheckBatchRequest,
+    cliente: ClienteInfo = Depends(get_cliente),
+    service: GoogleCalendarService = Depends(get_calendar_service),
+    db: AsyncSession = Depends(get_cliente_db)
+):
+    """
+    Verifica conflitos para vários horários candidatos de uma só vez.
+
+    Os eventos do período coberto pelos candidatos são buscados uma única vez
+    e indexados; cada candidato é respondido a partir do índice.
+    """
+    if not request.candidates:
+        return {"results": []}
+
+    time_min = min(as_utc(slot.start) for slot in request.candidates)
+    time_max = max(as_utc(slot.end) for slot in request.candidates)
+
+    if settings.CALENDAR_MIRROR_ENABLED and await EventMirrorService.ensure_fresh(db, cliente.id, service):
+        events = await EventMirrorService.list_events(db, cliente.id, time_min, time_max)
+    else:
+        events = await service.list_range(time_min, time_max)
+
+    index = IntervalIndex((*event_bounds(event), event) for event in events)
+    results = []
+    for slot in request.candidates:
+        conflicts = index.overlapping(as_utc(slot.start), as_utc(slot.end))
+        results.append({
+            "start": slot.start,
+            "end": slot.end,
+            "has_conflict": len(conflicts) > 0,
+            "conflicting_events": conflicts
+        })
+    return {"results": results}
+
+@router.post("/calendar/free-slots", response_model=schemas.FreeSlotResponse)
+async def find_free_slots(request: schemas.FreeSlotRequest):
+    """
+    Busca horários em que todos os clientes informados estão livres.
+
+    Os períodos ocupados de cada cliente são buscados em paralelo e combinados
+    respeitando o expediente (work_start/work_end, weekdays) no fuso timeZone.
+    """
+    time_min, time_max = as_utc(request.start), as_utc(request.end)
+    if time_max <= time_min:
+        raise HTTPException(status_code=400, detail="O fim do período deve ser posterior ao início")
+    try:
+        ZoneInfo(request.timeZone)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise HTTPException(status_code=400, detail=f"Fuso horário inválido: {request.timeZone}")
+
+    emails = list(dict.fromkeys(request.emails))
+    clientes = await cliente_cache.get_many(emails)
+    missing = [email for email in emails if email not in clientes]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Clientes não encontrados: {', '.join(missing)}")
+
+    async def busy_for(cliente: ClienteInfo):
+        service = await _service_for(cliente)
+        if settings.CALENDAR_MIRROR_ENABLED:
+            # Sessão própria: as buscas rodam em paralelo
+            async with shards.session_for(cliente.email) as session:
+                if await EventMirrorService.ensure_fresh(session, cliente.id, service):
+                    events = await EventMirrorService.list_events(session, cliente.id, time_min, time_max)
+                    return free_slots.intervals_to_arrays([
+                        event_bounds(event) for event in events if event.get('transparency') != 'transparent'
+                    ])
+        intervals = await service.free_busy(time_min, time_max)
+        return free_slots.intervals_to_arrays(intervals)
+
+    results = await gather_bounded(
+        clientes.values(),
+        busy_for,
+        limit=settings.CALENDAR_FANOUT_CONCURRENCY,
+        timeout=settings.CALENDAR_FANOUT_TIMEOUT
+    )
+    errors = {
+        cliente.email: str(outcome) or type(outcome).__name__
+        for cliente, outcome in results if isinstance(outcome, BaseException)
+    }
+    if errors:
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail={"message": "Falha ao consultar agendas", "errors": errors}
+        )
+
+    slots = free_slots.find_free_slots(
+        [outcome for _, outcome in results],
+        time_min,
+        time_max,
+        duration=timedelta(minutes=request.duration_minutes),
+        tz=request.timeZone,
+        work_start=request.work_start,
+        work_end=request.work_end,
+        weekdays=request.weekdays,
+        step=timedelta(minutes=request.step_minutes),
+        limit=request.limit
+    )
+    return {"slots": [{"start": start, "end": end} for start, end in slots]}
+
+@router.post("/calendar/agenda", response_model=schemas.AgendaResponse)
+async def get_agenda(request: schemas.AgendaRequest):
+    """
+    Agenda de vários clientes (emails e/ou um grupo de CALENDAR_GROUPS) no
+    período de start a end (inclusivos; end padrão = start, datas em UTC).
+
+    As agendas são buscadas em paralelo (CALENDAR_FANOUT_CONCURRENCY por vez,
+    CALENDAR_FANOUT_TIMEOUT por cliente). Falhas de um cliente não derrubam a
+    resposta: cada item traz os eventos ou o status e a mensagem do erro.
+    """
+    emails = list(request.emails)
+    if request.group is not None:
+        group = settings.CALENDAR_GROUPS.get(request.group)
+        if group is None:
+            raise HTTPException(status_code=404, detail=f"Grupo não encontrado: {request.group}")
+        emails.extend(group)
+    emails = list(dict.fromkeys(emails))
+    if not emails:
+        raise HTTPException(status_code=400, detail="Informe emails ou group")
+    if len(emails) > settings.CALENDAR_AGENDA_MAX_CLIENTES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Máximo de {settings.CALENDAR_AGENDA_MAX_CLIENTES} clientes por consulta"
+        )
+
+    start = request.start
+    end = request.end or start
+    if end < start:
+        raise HTTPException(status_code=400, detail="A data final deve ser igual ou posterior à inicial")
+    if (end - start).days + 1 > settings.CALENDAR_RANGE_MAX_DAYS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Período máximo de {settings.CALENDAR_RANGE_MAX_DAYS} dias"
+        )
+    time_min = datetime(start.year, start.month, start.day, tzinfo=timezone.utc)
+    time_max = datetime(end.year, end.month, end.day, tzinfo=timezone.utc) + timedelta(days=1)
+
+    # Uma consulta por shard para todos os clientes (via cliente_cache)
+    clientes = await cliente_cache.get_many(emails)
+
+    async def events_for(cliente: ClienteInfo) -> List[dict]:
+        service = await _service_for(cliente)
+        if settings.EVENT_CACHE_ENABLED:
+            return await event_cache.get_or_fetch(
+                cliente.email, start, end + timedelta(days=1),
+                lambda: service.list_range(time_min, time_max)
+            )
+        return await service.list_range(time_min, time_max)
+
+    if settings.CALENDAR_MIRROR_ENABLED:
+        outcomes = await _mirror_agenda(list(clientes.values()), time_min, time_max, events_for)
+    else:
+        fetched = await gather_bounded(
+            clientes.values(),
+            events_for,
+            limit=settings.CALENDAR_FANOUT_CONCURRENCY,
+            timeout=settings.CALENDAR_FANOUT_TIMEOUT
+        )
+        outcomes = {cliente.email: outcome for cliente, outcome in fetched}
+
+    results = []
+    for email in emails:
+        if email not in clientes:
+            results.append({"email": email, "status": 404, "error": "Cliente não encontrado"})
+            continue
+        outcome = outcomes[email]
+        if not isinstance(outcome, BaseException):
+            # Validado por cliente: um evento fora do esquema não derruba a resposta
+            try:
+                outcome = [schemas.EventResponse.model_validate(event) for event in outcome]
+            except ValidationError as e:
+                outcome = e
+        if isinstance(outcome, BaseException):
+            status_code, error = _agenda_error(outcome)
+            results.append({"email": email, "status": status_code, "error": error})
+        else:
+            results.append({"email": email, "status": 200, "events": outcome})
+    succeeded = sum(1 for item in results if item["status"] == 200)
+    return {"succeeded": succeeded, "failed": len(results) - succeeded, "results": results}
+
+async def _mirror_agenda(
+    clientes: List[ClienteInfo],
+    time_min: datetime,
+    time_max: datetime,
+    fallback: Callable[[ClienteInfo], Awaitable[List[dict]]]
+) -> Dict[str, Union[List[dict], BaseException]]:
+    """
+    Agenda a partir do espelho. O estado da sincronização e os eventos vêm de
+    uma consulta por shard; só as sincronizações usam uma conexão por
+    cliente, e no máximo DB_POOL_SIZE + DB_MAX_OVERFLOW por vez. Clientes
+    ainda sem sincronização completa são respondidos por fallback.
+    """
+    by_email = {cliente.email: cliente for cliente in clientes}
+    outcomes: Dict[str, Union[List[dict], BaseException]] = {}
+
+    async def per_shard(emails: List[str], query) -> Dict[str, object]:
+        """Executa query(db, ids) em cada shard; uma falha vale para os clientes do shard"""
+        partitions = shards.partition(emails)
+
+        async def run(index: int, ids: List[int]):
+            async with shards.sessionmakers()[index]() as db:
+                return await query(db, ids)
+
+        results = await asyncio.gather(
+            *(run(index, [by_email[email].id for email in group]) for index, group in partitions.items()),
+            return_exceptions=True
+        )
+        found = {}
+        for group, result in zip(partitions.values(), results):
+            for email in group:
+                if isinstance(result, BaseException):
+                    outcomes[email] = result
+                else:
+                    found[email] = result
+        return found
+
+    pending = await per_shard(list(by_email), EventMirrorService.sync_pending)
+
+    async def refresh(cliente: ClienteInfo) -> Optional[List[dict]]:
+        """None se o espelho do cliente pode responder; senão, os eventos de fallback"""
+        service = await _service_for(cliente)
+        unsynced, stale = pending[cliente.email]
+        engine = shards.engines()[shards.index_for(cliente.email)]
+        if await EventMirrorService.refresh(engine, cliente.id, service, cliente.id in unsynced, cliente.id in stale):
+            return None
+        return await fallback(cliente)
+
+    fetched = await gather_bounded(
+        [by_email[email] for email in pending],
+        refresh,
+        limit=min(settings.CALENDAR_FANOUT_CONCURRENCY, settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW),
+        timeout=settings.CALENDAR_FANOUT_TIMEOUT
+    )
+    ready = []
+    for cliente, outcome in fetched:
+        if outcome is None:
+            ready.append(cliente.email)
+        else:
+            outcomes[cliente.email] = outcome
+
+    loaded = await per_shard(
+        ready, lambda db, ids: EventMirrorService.list_events_many(db, ids, time_min, time_max)
+    )
+    for email, events in loaded.items():
+        outcomes[email] = events[by_email[email].id]
+    return outcomes
+
+def _agenda_error(error: BaseException) -> Tuple[int, str]:
+    """Status e mensagem de uma falha ao buscar a agenda de um cliente"""
+    if isinstance(error, HTTPException):
+        return error.status_code, str(error.detail)
+    if isinstance(error, ValidationError):
+        return status.HTTP_502_BAD_GATEWAY, f"Evento em formato inesperado: {error.errors()[0]['msg']}"
+    if isinstance(error, asyncio.TimeoutError):
+        return status.HTTP_504_GATEWAY_TIMEOUT, f"Tempo esgotado ({settings.CALENDAR_FANOUT_TIMEOUT:g}s)"
+    return status.HTTP_502_BAD_GATEWAY, str(error) or type(error).__name__
\ No newline at end of file
@@ -1,50 +1,139 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
-from app.core.database import get_db
-from app.api.schemas.cliente import ClienteCreate, ClienteResponse, ClienteUpdate
-from app.services.cliente_service import ClienteService
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import AsyncIterator, List, Optional
+import json
+from app.core.sharding import get_cliente_db, get_cliente_read_db
+from app.api.schemas.cliente import (
+    ClienteCreate, ClienteResponse, ClienteUpdate, ClienteImportResult,
+    ClienteLookupRequest, ClienteLookupResponse
+)
+from app.core.config import settings
+from app.services.cliente_service import ClienteService, parse_import
 
 router = APIRouter(
     prefix="/clientes",
     tags=["clientes"]
 )
 
+IMPORT_FORMATS = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "application/json": "ndjson"
+}
+
+@router.post("/import", response_model=ClienteImportResult)
+async def import_clientes(request: Request):
+    """
+    Cria ou atualiza clientes em massa a partir de NDJSON ou CSV.
+
+    O formato vem do Content-Type (application/x-ndjson ou text/csv). A
+    resposta traz o resultado de cada linha: created, updated, skipped ou error.
+    """
+    media_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    format = IMPORT_FORMATS.get(media_type)
+    if format is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Use Content-Type application/x-ndjson ou text/csv"
+        )
+    content = await request.body()
+    return await ClienteService.import_clientes(rows=parse_import(content, format))
+
+@router.post("/lookup", response_model=ClienteLookupResponse)
+async def lookup_clientes(request: ClienteLookupRequest):
+    """
+    Busca vários clientes pelo email em uma única consulta (uma por shard).
+
+    Emails sem cadastro são listados em `not_found`, na ordem do pedido.
+    """
+    emails = list(dict.fromkeys(request.emails))
+    if len(emails) > settings.CLIENTE_LOOKUP_MAX_EMAILS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Máximo de {settings.CLIENTE_LOOKUP_MAX_EMAILS} emails por consulta"
+        )
+    found = await ClienteService.get_clientes_by_emails(emails=emails)
+    return ClienteLookupResponse(
+        clientes=[found[email] for email in emails if email in found],
+        not_found=[email for email in emails if email not in found]
+    )
+
 @router.post("/{email}", response_model=ClienteResponse, status_code=status.HTTP_201_CREATED)
 async def create_cliente(
     email: str,
     cliente: ClienteCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_cliente_db)
 ):
+    # A sessão é a do shard do email do caminho
+    if cliente.email != email:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="O email do corpo deve ser o mesmo do caminho"
+        )
     return await ClienteService.create_cliente(db=db, cliente=cliente)
 
+@router.get("/export")
+async def export_clientes():
+    """
+    Exporta todos os clientes como NDJSON, sem as credenciais.
+
+    As linhas são lidas do banco em lotes e enviadas à medida que chegam.
+    """
+    return StreamingResponse(_export_lines(), media_type="application/x-ndjson")
+
+async def _export_lines() -> AsyncIterator[bytes]:
+    # export_clientes abre as próprias sessões: o corpo da resposta é gerado
+    # depois que o handler retorna
+    lines = []
+    async for row in ClienteService.export_clientes():
+        lines.append(json.dumps(row, default=_isoformat, ensure_ascii=False) + "\n")
+        if len(lines) >= 500:
+            yield "".join(lines).encode()
+            lines = []
+    if lines:
+        yield "".join(lines).encode()
+
+def _isoformat(value):
+    return value.isoformat()
+
 @router.get("/{email}", response_model=ClienteResponse)
 async def get_cliente(
     email: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_cliente_read_db)
 ):
     return await ClienteService.get_cliente_by_email(db=db, email=email)
 
 @router.get("/", response_model=List[ClienteResponse])
 async def list_clientes(
-    skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db)
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000)
 ):
-    return await ClienteService.list_clientes(db=db, skip=skip, limit=limit)
+    """
+    Lista os clientes em ordem de email.
+
+    Quando há mais resultados, o cabeçalho X-Next-Cursor traz o valor a ser
+    passado em `cursor` para obter a próxima página.
+    """
+    clientes, next_cursor = await ClienteService.list_clientes(cursor=cursor, limit=limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return clientes
 
 @router.put("/{email}", response_model=ClienteResponse)
 async def update_cliente(
     email: str,
     cliente: ClienteUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_cliente_db)
 ):
     return await ClienteService.update_cliente(db=db, email=email, cliente=cliente)
 
 @router.delete("/{email}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_cliente(
     email: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_cliente_db)
 ):
     await ClienteService.delete_cliente(db=db, email=email)
     return None 
\ No newline at end of file
@@ -1,2 +1,12 @@
-from .calendar import EventTime, EventCreate, EventResponse, ConflictCheck
-from .cliente import ClienteBase, ClienteCreate, ClienteUpdate, ClienteResponse, ClienteInDB 
\ No newline at end of file
+from .calendar import (
+    EventTime, EventCreate, EventResponse, ConflictCheck,
+    TimeSlot, ConflictCheckBatchRequest, SlotConflicts, ConflictCheckBatch,
+    FreeSlotRequest, FreeSlot, FreeSlotResponse,
+    BatchCreateRequest, BatchDeleteRequest, BatchItemResult, BatchResult,
+    AgendaRequest, AgendaItem, AgendaResponse
+)
+from .cliente import (
+    ClienteBase, ClienteCreate, ClienteUpdate, ClienteResponse, ClienteInDB,
+    ClienteLookupRequest, ClienteLookupResponse,
+    ClienteImportRow, ClienteImportItem, ClienteImportResult
+) 
\ No newline at end of file
@@ -1,11 +1,25 @@
-from pydantic import BaseModel, ConfigDict
-from typing import Optional, List, Dict
-from datetime import datetime
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+from typing import Any, Optional, List, Dict
+from datetime import date, datetime, time
 
 class EventTime(BaseModel):
     dateTime: datetime
     timeZone: str = "America/Sao_Paulo"
 
+class EventResponseTime(BaseModel):
+    """Início ou fim de um evento do Google: dateTime, ou date nos eventos de dia inteiro"""
+    dateTime: Optional[datetime] = None
+    day: Optional[date] = Field(default=None, alias="date")
+    timeZone: str = "America/Sao_Paulo"
+
+    model_config = ConfigDict(populate_by_name=True)
+
+    @model_validator(mode="after")
+    def _date_or_datetime(self) -> "EventResponseTime":
+        if self.dateTime is None and self.day is None:
+            raise ValueError("Informe dateTime ou date")
+        return self
+
 class EventCreate(BaseModel):
     summary: str
     description: Optional[str] = None
@@ -33,15 +47,111 @@ class EventCreate(BaseModel):
 
 class EventResponse(BaseModel):
     id: str
-    summary: str
+    # Eventos sem título não trazem summary; participantes têm campos booleanos
+    # (organizer, self, optional) e numéricos (additionalGuests)
+    summary: Optional[str] = None
     description: Optional[str] = None
-    start: EventTime
-    end: EventTime
-    attendees: Optional[List[Dict[str, str]]] = None
+    start: EventResponseTime
+    end: EventResponseTime
+    attendees: Optional[List[Dict[str, Any]]] = None
     htmlLink: str
     
     model_config = ConfigDict(from_attributes=True)
 
 class ConflictCheck(BaseModel):
     has_conflict: bool
-    conflicting_events: List[EventResponse] = [] 
\ No newline at end of file
+    conflicting_events: List[EventResponse] = [] 
+
+class TimeSlot(BaseModel):
+    start: datetime
+    end: datetime
+
+class ConflictCheckBatchRequest(BaseModel):
+    candidates: List[TimeSlot]
+
+    model_config = ConfigDict(json_schema_extra={
+        "example": {
+            "candidates": [
+                {"start": "2024-01-20T10:00:00", "end": "2024-01-20T11:00:00"},
+                {"start": "2024-01-20T14:00:00", "end": "2024-01-20T15:00:00"}
+            ]
+        }
+    })
+
+class SlotConflicts(ConflictCheck):
+    start: datetime
+    end: datetime
+
+class ConflictCheckBatch(BaseModel):
+    results: List[SlotConflicts]
+
+class FreeSlotRequest(BaseModel):
+    emails: List[str] = Field(min_length=1)
+    start: datetime
+    end: datetime
+    duration_minutes: int = Field(default=30, gt=0)
+    step_minutes: int = Field(default=15, gt=0)
+    timeZone: str = "America/Sao_Paulo"
+    work_start: time = time(9, 0)
+    work_end: time = time(18, 0)
+    weekdays: List[int] = [0, 1, 2, 3, 4]
+    limit: int = Field(default=20, gt=0, le=1000)
+
+    model_config = ConfigDict(json_schema_extra={
+        "example": {
+            "emails": ["a@exemplo.com", "b@exemplo.com", "c@exemplo.com"],
+            "start": "2024-01-22T00:00:00-03:00",
+            "end": "2024-02-05T00:00:00-03:00",
+            "duration_minutes": 30
+        }
+    })
+
+class FreeSlot(BaseModel):
+    start: datetime
+    end: datetime
+
+class FreeSlotResponse(BaseModel):
+    slots: List[FreeSlot]
+
+class BatchCreateRequest(BaseModel):
+    events: List[EventCreate] = Field(min_length=1, max_length=1000)
+
+class BatchDeleteRequest(BaseModel):
+    event_ids: List[str] = Field(min_length=1, max_length=1000)
+
+class BatchItemResult(BaseModel):
+    index: int
+    status: int
+    event_id: Optional[str] = None
+    event: Optional[EventResponse] = None
+    error: Optional[str] = None
+    retry_after: Optional[int] = None
+
+class BatchResult(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[BatchItemResult]
+
+class AgendaRequest(BaseModel):
+    emails: List[str] = []
+    group: Optional[str] = None
+    start: date
+    end: Optional[date] = None
+
+    model_config = ConfigDict(json_schema_extra={
+        "example": {
+            "group": "recepcao",
+            "start": "2024-01-22"
+        }
+    })
+
+class AgendaItem(BaseModel):
+    email: str
+    status: int
+    events: Optional[List[EventResponse]] = None
+    error: Optional[str] = None
+
+class AgendaResponse(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[AgendaItem]
\ No newline at end of file
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional, Dict, Any
+from pydantic import BaseModel, EmailStr, Field
+from typing import Optional, Dict, Any, List
 from datetime import datetime
 
 class ClienteBase(BaseModel):
@@ -22,4 +22,26 @@ class ClienteResponse(ClienteBase):
         from_attributes = True
 
 class ClienteInDB(ClienteResponse):
-    pass 
\ No newline at end of file
+    pass
+
+class ClienteLookupRequest(BaseModel):
+    emails: List[str] = Field(min_length=1)
+
+class ClienteLookupResponse(BaseModel):
+    clientes: List[ClienteResponse]
+    not_found: List[str]
+
+class ClienteImportRow(ClienteBase):
+    expiry: Optional[str] = None
+
+class ClienteImportItem(BaseModel):
+    line: int
+    email: Optional[str] = None
+    status: str
+    error: Optional[str] = None
+
+class ClienteImportResult(BaseModel):
+    created: int
+    updated: int
+    failed: int
+    results: List[ClienteImportItem]
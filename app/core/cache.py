@@ -0,0 +1,563 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+class LRUCache:
+    """
+    Cache em memória com limite de tamanho (LRU) e TTL opcional.
+
+    Não usa locks: é acessado apenas a partir do event loop.
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple[Any, Optional[float]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING:
+            self.misses += 1
+            return default
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Lê sem alterar a ordem LRU nem os contadores"""
+        entry = self._data.get(key, _MISSING)
+        return default if entry is _MISSING else entry[0]
+
+    def touch(self, key: Hashable) -> None:
+        """Marca a chave como usada agora (ordem LRU), sem alterar os contadores"""
+        if key in self._data:
+            self._data.move_to_end(key)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[0]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
+
+
+# Caches compartilhados entre workers
+#
+# Cada processo mantém seus LRUCache locais; o backend abaixo guarda uma
+# segunda camada visível a todos os workers e distribui as invalidações, para
+# que uma escrita em um worker derrube as cópias locais dos demais.
+
+InvalidationHandler = Callable[[str], None]
+
+_handlers: Dict[str, List[InvalidationHandler]] = defaultdict(list)
+
+def register_invalidation_handler(namespace: str, handler: InvalidationHandler) -> None:
+    """Chamado com a chave invalidada sempre que algum worker invalida `namespace`"""
+    _handlers[namespace].append(handler)
+
+def version_time(version: Optional[str]) -> Optional[float]:
+    """Momento (time.time()) em que a versão foi criada por bump"""
+    if not version:
+        return None
+    try:
+        return float(version.partition(":")[0])
+    except ValueError:
+        return None
+
+
+class CacheBackend:
+    """
+    Armazenamento chave -> valor JSON com TTL, mais um canal de invalidação.
+
+    Subclasses implementam _get_many, _set, _delete, _publish e, quando as
+    mensagens vêm de fora do processo, _listen.
+
+    Cada chave pode ter uma versão, trocada por bump a cada escrita na
+    origem. Quem preenche o cache a partir do banco lê a versão antes da
+    consulta e grava com set_if_version: se outro worker escreveu nesse
+    meio-tempo, a linha lida está velha e não entra no cache.
+    """
+
+    # Por quanto tempo a versão de uma chave é lembrada depois do último bump
+    VERSION_TTL = 86400
+
+    def __init__(self):
+        # Identifica as mensagens deste backend: quem invalida já limpou a
+        # própria cópia local e ignora o eco
+        self.origin = uuid.uuid4().hex
+        self._listener: Optional[asyncio.Task] = None
+
+    async def get(self, key: str) -> Any:
+        return (await self.get_many([key])).get(key)
+
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        keys = list(keys)
+        if not keys:
+            return {}
+        raw = await self._get_many(keys)
+        return {key: json.loads(value) for key, value in raw.items()}
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        await self._set(key, json.dumps(value, default=str), ttl)
+
+    async def delete(self, *keys: str) -> None:
+        if keys:
+            await self._delete(list(keys))
+
+    async def invalidate(self, namespace: str, key: str) -> None:
+        """Avisa os outros workers que `key` mudou"""
+        await self._publish(json.dumps([self.origin, namespace, key]))
+
+    async def invalidate_many(self, namespace: str, keys: Iterable[str]) -> None:
+        """Como invalidate, com uma única mensagem para todas as chaves"""
+        keys = list(keys)
+        if keys:
+            await self._publish(json.dumps([self.origin, namespace, keys]))
+
+    async def versions(self, keys: Iterable[str]) -> Dict[str, Optional[str]]:
+        """Versão atual de cada chave (None se nunca houve bump ou se expirou)"""
+        keys = list(keys)
+        if not keys:
+            return {}
+        found = await self._get_versions(keys)
+        return {key: found.get(key) for key in keys}
+
+    async def set_if_version(self, key: str, value: Any, ttl: Optional[float], version: Optional[str]) -> bool:
+        """Grava `value` só se a versão da chave ainda for `version`; retorna se gravou"""
+        return await self._set_if_version(key, json.dumps(value, default=str), ttl, version)
+
+    async def bump(self, key: str) -> str:
+        """Remove a entrada e troca a versão da chave; retorna a nova versão"""
+        version = self._new_version()
+        await self._bump(key, version)
+        return version
+
+    async def bump_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        """Como bump para várias chaves de uma vez; retorna chave -> nova versão"""
+        versions = {key: self._new_version() for key in keys}
+        if versions:
+            await self._bump_many(versions)
+        return versions
+
+    @staticmethod
+    def _new_version() -> str:
+        return f"{time.time():.6f}:{uuid.uuid4().hex[:12]}"
+
+    def _receive(self, message: str) -> None:
+        try:
+            origin, namespace, keys = json.loads(message)
+        except (TypeError, ValueError):
+            logger.warning("Mensagem de invalidação inválida: %r", message)
+            return
+        if origin == self.origin:
+            return
+        # invalidate_many manda a lista de chaves em uma só mensagem
+        for key in keys if isinstance(keys, list) else [keys]:
+            for handler in _handlers.get(namespace, ()):
+                try:
+                    handler(key)
+                except Exception:
+                    logger.exception("Erro ao invalidar %s:%s", namespace, key)
+
+    async def start(self) -> None:
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen_forever())
+
+    async def close(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    async def _listen_forever(self) -> None:
+        while True:
+            try:
+                await self._listen()
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Canal de invalidação interrompido; reconectando")
+                await asyncio.sleep(1)
+
+    async def _listen(self) -> None:
+        pass
+
+    async def _get_many(self, keys: List[str]) -> Dict[str, str]:
+        raise NotImplementedError
+
+    async def _set(self, key: str, value: str, ttl: Optional[float]) -> None:
+        raise NotImplementedError
+
+    async def _delete(self, keys: List[str]) -> None:
+        raise NotImplementedError
+
+    async def _publish(self, message: str) -> None:
+        raise NotImplementedError
+
+    async def _get_versions(self, keys: List[str]) -> Dict[str, str]:
+        raise NotImplementedError
+
+    async def _set_if_version(self, key: str, value: str, ttl: Optional[float], version: Optional[str]) -> bool:
+        raise NotImplementedError
+
+    async def _bump(self, key: str, version: str) -> None:
+        raise NotImplementedError
+
+    async def _bump_many(self, versions: Dict[str, str]) -> None:
+        for key, version in versions.items():
+            await self._bump(key, version)
+
+class MemoryCacheBackend(CacheBackend):
+    """
+    Backend dentro do processo (padrão), adequado a um único worker.
+
+    Em testes, instâncias criadas com `shared_with` compartilham os dados e
+    recebem as invalidações umas das outras, simulando workers distintos.
+    """
+
+    def __init__(self, maxsize: int = 100000, shared_with: Optional["MemoryCacheBackend"] = None):
+        super().__init__()
+        if shared_with is not None:
+            self._data = shared_with._data
+            self._versions = shared_with._versions
+            self._peers = shared_with._peers
+        else:
+            self._data = LRUCache(maxsize)
+            self._versions = LRUCache(maxsize, ttl=self.VERSION_TTL)
+            self._peers: List[MemoryCacheBackend] = []
+        self._peers.append(self)
+
+    async def _get_many(self, keys: List[str]) -> Dict[str, str]:
+        found = {}
+        for key in keys:
+            value = self._data.get(key)
+            if value is not None:
+                found[key] = value
+        return found
+
+    async def _set(self, key: str, value: str, ttl: Optional[float]) -> None:
+        self._data.set(key, value, ttl)
+
+    async def _delete(self, keys: List[str]) -> None:
+        for key in keys:
+            self._data.pop(key)
+
+    async def _publish(self, message: str) -> None:
+        for peer in self._peers:
+            peer._receive(message)
+
+    async def _get_versions(self, keys: List[str]) -> Dict[str, str]:
+        found = {}
+        for key in keys:
+            version = self._versions.get(key)
+            if version is not None:
+                found[key] = version
+        return found
+
+    async def _set_if_version(self, key: str, value: str, ttl: Optional[float], version: Optional[str]) -> bool:
+        # Sem await entre a checagem e a gravação: atômico dentro do processo
+        if self._versions.get(key) != version:
+            return False
+        self._data.set(key, value, ttl)
+        return True
+
+    async def _bump(self, key: str, version: str) -> None:
+        self._versions.set(key, version)
+        self._data.pop(key)
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    Backend em um arquivo SQLite local, compartilhado pelos workers da mesma
+    máquina. As invalidações vão para uma tabela de log que cada worker lê a
+    cada CACHE_INVALIDATION_POLL_INTERVAL segundos.
+    """
+
+    def __init__(self, path: str, poll_interval: float = 1.0):
+        super().__init__()
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        # O arquivo só deve ser legível pelo usuário dos workers
+        os.close(os.open(path, os.O_CREAT | os.O_RDWR, 0o600))
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entry "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_version "
+            "(key TEXT PRIMARY KEY, version TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_invalidation "
+            "(id INTEGER PRIMARY KEY AUTOINCREMENT, message TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._last_id = self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM cache_invalidation").fetchone()[0]
+
+    def _run(self, sql: str, params: Iterable = ()) -> list:
+        with self._lock:
+            return self._conn.execute(sql, tuple(params)).fetchall()
+
+    def _run_count(self, sql: str, params: Iterable = ()) -> int:
+        with self._lock:
+            return self._conn.execute(sql, tuple(params)).rowcount
+
+    async def _get_many(self, keys: List[str]) -> Dict[str, str]:
+        placeholders = ",".join("?" * len(keys))
+        rows = await asyncio.to_thread(
+            self._run,
+            f"SELECT key, value FROM cache_entry WHERE key IN ({placeholders}) "
+            "AND (expires_at IS NULL OR expires_at > ?)",
+            [*keys, time.time()]
+        )
+        return dict(rows)
+
+    async def _set(self, key: str, value: str, ttl: Optional[float]) -> None:
+        expires_at = time.time() + ttl if ttl is not None else None
+        await asyncio.to_thread(
+            self._run,
+            "INSERT OR REPLACE INTO cache_entry (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, expires_at)
+        )
+
+    async def _delete(self, keys: List[str]) -> None:
+        placeholders = ",".join("?" * len(keys))
+        await asyncio.to_thread(self._run, f"DELETE FROM cache_entry WHERE key IN ({placeholders})", keys)
+
+    async def _publish(self, message: str) -> None:
+        await asyncio.to_thread(
+            self._run,
+            "INSERT INTO cache_invalidation (message, created_at) VALUES (?, ?)",
+            (message, time.time())
+        )
+
+    async def _get_versions(self, keys: List[str]) -> Dict[str, str]:
+        placeholders = ",".join("?" * len(keys))
+        rows = await asyncio.to_thread(
+            self._run,
+            f"SELECT key, version FROM cache_version WHERE key IN ({placeholders}) AND expires_at > ?",
+            [*keys, time.time()]
+        )
+        return dict(rows)
+
+    async def _set_if_version(self, key: str, value: str, ttl: Optional[float], version: Optional[str]) -> bool:
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else None
+        # Checagem e gravação em um único comando (IS compara também NULL)
+        count = await asyncio.to_thread(
+            self._run_count,
+            "INSERT OR REPLACE INTO cache_entry (key, value, expires_at) SELECT ?, ?, ? "
+            "WHERE (SELECT version FROM cache_version WHERE key = ? AND expires_at > ?) IS ?",
+            (key, value, expires_at, key, now, version)
+        )
+        return count > 0
+
+    async def _bump(self, key: str, version: str) -> None:
+        # A versão muda antes de a entrada sair: um set_if_version concorrente
+        # ou vê a versão nova (e desiste) ou grava antes da remoção
+        await asyncio.to_thread(
+            self._run,
+            "INSERT OR REPLACE INTO cache_version (key, version, expires_at) VALUES (?, ?, ?)",
+            (key, version, time.time() + self.VERSION_TTL)
+        )
+        await asyncio.to_thread(self._run, "DELETE FROM cache_entry WHERE key = ?", (key,))
+
+    async def _bump_many(self, versions: Dict[str, str]) -> None:
+        await asyncio.to_thread(self._bump_many_sync, versions)
+
+    def _bump_many_sync(self, versions: Dict[str, str]) -> None:
+        expires_at = time.time() + self.VERSION_TTL
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO cache_version (key, version, expires_at) VALUES (?, ?, ?)",
+                [(key, version, expires_at) for key, version in versions.items()]
+            )
+            self._conn.executemany("DELETE FROM cache_entry WHERE key = ?", [(key,) for key in versions])
+
+    async def _poll(self) -> None:
+        rows = await asyncio.to_thread(
+            self._run,
+            "SELECT id, message FROM cache_invalidation WHERE id > ? ORDER BY id",
+            (self._last_id,)
+        )
+        for row_id, message in rows:
+            self._last_id = max(self._last_id, row_id)
+            self._receive(message)
+
+    async def _listen(self) -> None:
+        while True:
+            await self._poll()
+            # Limpeza: entradas vencidas e invalidações que todos já leram
+            now = time.time()
+            await asyncio.to_thread(self._run, "DELETE FROM cache_entry WHERE expires_at <= ?", (now,))
+            await asyncio.to_thread(self._run, "DELETE FROM cache_version WHERE expires_at <= ?", (now,))
+            await asyncio.to_thread(self._run, "DELETE FROM cache_invalidation WHERE created_at < ?", (now - 300,))
+            await asyncio.sleep(self.poll_interval)
+
+    async def close(self) -> None:
+        await super().close()
+        with self._lock:
+            self._conn.close()
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Backend em Redis (ou servidor compatível). As invalidações usam pub/sub.
+
+    Requer o pacote `redis`, importado apenas quando este backend é usado.
+    """
+
+    def __init__(self, url: str, prefix: str = ""):
+        super().__init__()
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("CACHE_BACKEND=redis requer o pacote 'redis'") from e
+        self.prefix = prefix
+        self.channel = f"{prefix}invalidate"
+        self._redis = redis.from_url(url)
+
+    async def _get_many(self, keys: List[str]) -> Dict[str, str]:
+        values = await self._redis.mget([self.prefix + key for key in keys])
+        return {key: value for key, value in zip(keys, values) if value is not None}
+
+    async def _set(self, key: str, value: str, ttl: Optional[float]) -> None:
+        await self._redis.set(self.prefix + key, value, px=int(ttl * 1000) if ttl is not None else None)
+
+    async def _delete(self, keys: List[str]) -> None:
+        await self._redis.delete(*(self.prefix + key for key in keys))
+
+    async def _publish(self, message: str) -> None:
+        await self._redis.publish(self.channel, message)
+
+    def _version_key(self, key: str) -> str:
+        return f"{self.prefix}version:{key}"
+
+    async def _get_versions(self, keys: List[str]) -> Dict[str, str]:
+        values = await self._redis.mget([self._version_key(key) for key in keys])
+        return {key: value.decode() for key, value in zip(keys, values) if value is not None}
+
+    async def _set_if_version(self, key: str, value: str, ttl: Optional[float], version: Optional[str]) -> bool:
+        from redis.exceptions import WatchError
+        version_key = self._version_key(key)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            try:
+                # WATCH: o EXEC falha se a versão mudar entre o GET e o SET
+                await pipe.watch(version_key)
+                current = await pipe.get(version_key)
+                if (current.decode() if current is not None else None) != version:
+                    return False
+                pipe.multi()
+                pipe.set(self.prefix + key, value, px=int(ttl * 1000) if ttl is not None else None)
+                await pipe.execute()
+            except WatchError:
+                return False
+        return True
+
+    async def _bump(self, key: str, version: str) -> None:
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.set(self._version_key(key), version, ex=self.VERSION_TTL)
+            pipe.delete(self.prefix + key)
+            await pipe.execute()
+
+    async def _bump_many(self, versions: Dict[str, str]) -> None:
+        # Uma ida ao servidor para todas as chaves
+        async with self._redis.pipeline(transaction=True) as pipe:
+            for key, version in versions.items():
+                pipe.set(self._version_key(key), version, ex=self.VERSION_TTL)
+            pipe.delete(*(self.prefix + key for key in versions))
+            await pipe.execute()
+
+    async def _listen(self) -> None:
+        pubsub = self._redis.pubsub()
+        await pubsub.subscribe(self.channel)
+        try:
+            async for message in pubsub.listen():
+                if message.get("type") == "message":
+                    data = message["data"]
+                    self._receive(data.decode() if isinstance(data, bytes) else data)
+        finally:
+            await pubsub.aclose()
+
+    async def close(self) -> None:
+        await super().close()
+        await self._redis.aclose()
+
+_backend: Optional[CacheBackend] = None
+
+def get_cache_backend() -> CacheBackend:
+    """Backend configurado em CACHE_BACKEND (memory, sqlite ou redis), criado no primeiro uso"""
+    global _backend
+    if _backend is None:
+        if settings.CACHE_BACKEND == "redis":
+            _backend = RedisCacheBackend(settings.CACHE_REDIS_URL, prefix=settings.CACHE_KEY_PREFIX)
+        elif settings.CACHE_BACKEND == "sqlite":
+            _backend = SQLiteCacheBackend(
+                settings.CACHE_SQLITE_PATH, poll_interval=settings.CACHE_INVALIDATION_POLL_INTERVAL
+            )
+        elif settings.CACHE_BACKEND == "memory":
+            _backend = MemoryCacheBackend()
+        else:
+            raise ValueError(f"CACHE_BACKEND desconhecido: {settings.CACHE_BACKEND}")
+    return _backend
+
+async def close_cache_backend() -> None:
+    global _backend
+    if _backend is not None:
+        await _backend.close()
+        _backend = None
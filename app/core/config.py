@@ -2,7 +2,7 @@ from pydantic_settings import BaseSettings
 from functools import lru_cache
 from urllib.parse import quote_plus
 import os
-from typing import List
+from typing import Dict, List
 import json
 
 class Settings(BaseSettings):
@@ -15,6 +15,18 @@ class Settings(BaseSettings):
     DB_POOL_SIZE: int = 5
     DB_MAX_OVERFLOW: int = 10
     DB_POOL_RECYCLE: int = 3600
+    # Segundos de espera por uma conexão livre antes de TimeoutError
+    DB_POOL_TIMEOUT: float = 30.0
+    # Sharding por hash do email: lista de URLs (asyncpg), uma por shard.
+    # Vazia: um único banco (DATABASE_URL)
+    DB_SHARD_URLS: List[str] = []
+    # Réplicas de leitura do banco principal (sem sharding) ou de cada shard,
+    # na mesma ordem de DB_SHARD_URLS. Vazias: tudo vai para o primário
+    DB_REPLICA_URLS: List[str] = []
+    DB_SHARD_REPLICA_URLS: List[List[str]] = []
+    # Após uma escrita em um cliente, suas leituras vão ao primário por este
+    # tempo (segundos), cobrindo o atraso de replicação
+    DB_READ_YOUR_WRITES_WINDOW: float = 5.0
 
     # API settings
     API_VERSION: str = "1.0.0"
@@ -45,10 +57,118 @@ class Settings(BaseSettings):
         "GOOGLE_CALENDAR_REDIRECT_URI", 
         "http://localhost:8000/api/v1/calendar/oauth2callback"
     )
+    GOOGLE_CALENDAR_API_URL: str = "https://www.googleapis.com/calendar/v3"
+    GOOGLE_CALENDAR_BATCH_URL: str = "https://www.googleapis.com/batch/calendar/v3"
+    # O Google aceita até 1000 chamadas por batch, mas recomenda no máximo 50
+    GOOGLE_BATCH_MAX_SIZE: int = 50
+    GOOGLE_BATCH_CONCURRENCY: int = 4
+    GOOGLE_BATCH_MAX_RETRIES: int = 3
+    GOOGLE_BATCH_RETRY_BACKOFF: float = 0.5
+
+    # Limitador de chamadas ao Google (token bucket por worker): chamadas por
+    # segundo e rajada do projeto e de cada cliente. Configurar um pouco abaixo
+    # da cota dividida pelo número de workers; taxa 0 desliga aquele limite
+    GOOGLE_RATE_LIMIT_ENABLED: bool = True
+    GOOGLE_PROJECT_RATE: float = 100.0
+    GOOGLE_PROJECT_BURST: float = 200.0
+    GOOGLE_USER_RATE: float = 5.0
+    GOOGLE_USER_BURST: float = 20.0
+    # Espera máxima no limitador antes de recusar a chamada com 429
+    GOOGLE_RATE_LIMIT_MAX_WAIT: float = 10.0
+    GOOGLE_RATE_LIMIT_MAX_USERS: int = 10000
+
+    # Novas tentativas (limite de taxa, 5xx e falhas de rede), com backoff
+    # exponencial e jitter; o Retry-After do Google tem precedência
+    GOOGLE_MAX_RETRIES: int = 3
+    GOOGLE_RETRY_BACKOFF: float = 0.5
+    GOOGLE_RETRY_MAX_BACKOFF: float = 32.0
+
+    # Cliente HTTP compartilhado (Google APIs)
+    GOOGLE_HTTP2: bool = True
+    GOOGLE_HTTP_MAX_CONNECTIONS: int = 100
+    GOOGLE_HTTP_MAX_KEEPALIVE: int = 20
+    GOOGLE_HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    GOOGLE_HTTP_TIMEOUT: float = 10.0
+    GOOGLE_HTTP_CONNECT_TIMEOUT: float = 5.0
+
+    # Instâncias de GoogleCalendarService reaproveitadas por cliente
+    CALENDAR_SERVICE_CACHE_SIZE: int = 1024
+
+    # Renovação proativa de tokens OAuth (segundos)
+    TOKEN_REFRESH_ENABLED: bool = True
+    TOKEN_REFRESH_INTERVAL: int = 60
+    TOKEN_REFRESH_MARGIN: int = 300
+    TOKEN_REFRESH_CONCURRENCY: int = 10
+
+    # Backend compartilhado pelos workers: memory, sqlite ou redis (requer o pacote redis)
+    CACHE_BACKEND: str = "memory"
+    CACHE_SQLITE_PATH: str = os.path.join(os.path.expanduser("~"), ".cache", "secretaria", "cache.sqlite3")
+    CACHE_REDIS_URL: str = "redis://localhost:6379/0"
+    CACHE_KEY_PREFIX: str = "secretaria:"
+    CACHE_INVALIDATION_POLL_INTERVAL: float = 1.0
+    # Chave Fernet (cryptography) para cifrar as credenciais OAuth no backend
+    # compartilhado. Sem ela, credenciais nunca saem do cache local do worker
+    CACHE_ENCRYPTION_KEY: str = ""
+
+    # Cache de email -> (id, credenciais) usado pelas rotas de calendário
+    CLIENTE_CACHE_ENABLED: bool = True
+    CLIENTE_CACHE_TTL: int = 30
+    CLIENTE_CACHE_MAX_ENTRIES: int = 10000
+
+    # Gravação write-behind das credenciais renovadas
+    CREDENTIAL_WRITE_BEHIND: bool = True
+    CREDENTIAL_WRITE_INTERVAL: float = 1.0
+    CREDENTIAL_WRITE_BATCH_SIZE: int = 500
+
+    # Espelho local de eventos (sincronização incremental com syncToken)
+    CALENDAR_MIRROR_ENABLED: bool = False
+    CALENDAR_MIRROR_MAX_STALENESS: int = 60
+
+    # Cache de agendas em memória (alternativa ao espelho)
+    EVENT_CACHE_ENABLED: bool = False
+    EVENT_CACHE_TTL: int = 60
+    EVENT_CACHE_MAX_ENTRIES: int = 10000
+    EVENT_CACHE_STALE_WHILE_REVALIDATE: bool = False
+    EVENT_CACHE_STALE_TTL: int = 300
+
+    # Consultas que abrangem vários clientes (busca concorrente)
+    CALENDAR_FANOUT_CONCURRENCY: int = 20
+    CALENDAR_FANOUT_TIMEOUT: float = 15.0
+
+    # Agenda de vários clientes (/calendar/agenda): grupos nomeados de emails
+    # (JSON, ex.: {"recepcao": ["a@x.com", "b@x.com"]}) e máximo por consulta
+    CALENDAR_GROUPS: Dict[str, List[str]] = {}
+    CALENDAR_AGENDA_MAX_CLIENTES: int = 500
+
+    # Maior período aceito na listagem por intervalo (dias)
+    CALENDAR_RANGE_MAX_DAYS: int = 366
+
+    # Criar tabelas e aplicar migrações na inicialização de cada worker. Em
+    # produção, desligar e rodar python -m app.scripts.migrate no deploy
+    DB_AUTO_MIGRATE: bool = True
+
+    # Métricas Prometheus em /metrics (latência por rota, banco, Google, caches)
+    METRICS_ENABLED: bool = True
+
+    # Perfis de requisições (pilhas colapsadas em PROFILE_DIR). Desligado, o
+    # middleware nem é instalado. Com PROFILE_TOKEN definido, o cabeçalho
+    # PROFILE_HEADER precisa trazer esse valor
+    PROFILE_ENABLED: bool = False
+    PROFILE_HEADER: str = "X-Profile"
+    PROFILE_TOKEN: str = ""
+    PROFILE_SAMPLE_RATE: float = 0.0
+    PROFILE_INTERVAL: float = 0.001
+    PROFILE_DIR: str = "/tmp/secretaria-profiles"
+    PROFILE_MAX_FILES: int = 200
+
+    # Importação em massa de clientes (linhas por INSERT ... ON CONFLICT)
+    CLIENTE_IMPORT_BATCH_SIZE: int = 1000
+    # Máximo de emails por consulta em /clientes/lookup
+    CLIENTE_LOOKUP_MAX_EMAILS: int = 5000
 
     @property
     def DATABASE_URL(self) -> str:
-        return f"postgresql://{quote_plus(self.DB_USER)}:{quote_plus(self.DB_PASSWORD)}@{quote_plus(self.DB_HOST)}:{self.DB_PORT}/{quote_plus(self.DB_NAME)}"
+        return f"postgresql+asyncpg://{quote_plus(self.DB_USER)}:{quote_plus(self.DB_PASSWORD)}@{quote_plus(self.DB_HOST)}:{self.DB_PORT}/{quote_plus(self.DB_NAME)}"
 
     class Config:
         env_file = ".env"
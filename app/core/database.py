@@ -1,27 +1,129 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+import time
+from typing import Dict, List, Optional
+from sqlalchemy import event, exc
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession, AsyncEngine
+from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from .config import settings
 
 # Criar Base aqui em vez de config.py
 Base = declarative_base()
 
-engine = create_engine(
-    settings.DATABASE_URL,
-    pool_pre_ping=True,
-    pool_size=5,
-    max_overflow=10,
-    pool_recycle=3600,
-    connect_args={
-        'client_encoding': 'utf8',
-        'options': '-c timezone=UTC'
-    }
-)
-
-SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
-
-def get_db():
-    db = SessionLocal()
-    try:
+class PoolStats:
+    """
+    Contadores de um pool de conexões: espera no checkout, uso do overflow e
+    rotatividade (conexões abertas, fechadas e invalidadas).
+
+    A espera inclui a abertura de conexões novas; overflow_checkouts conta os
+    checkouts feitos enquanto havia conexões além de DB_POOL_SIZE.
+    """
+
+    def __init__(self, label: str):
+        self.label = label
+        self.engine: Optional[AsyncEngine] = None
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.overflow_checkouts = 0
+        self.connects = 0
+        self.closes = 0
+        self.invalidations = 0
+        self.timeouts = 0
+
+    def record_wait(self, seconds: float) -> None:
+        self.checkouts += 1
+        self.wait_total += seconds
+        self.wait_max = max(self.wait_max, seconds)
+
+    def stats(self) -> dict:
+        pool = self.engine.sync_engine.pool
+        return {
+            "label": self.label,
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "checkouts": self.checkouts,
+            "overflow_checkouts": self.overflow_checkouts,
+            "wait_avg": self.wait_total / self.checkouts if self.checkouts else 0.0,
+            "wait_max": self.wait_max,
+            "timeouts": self.timeouts,
+            "connects": self.connects,
+            "closes": self.closes,
+            "invalidations": self.invalidations
+        }
+
+# Pools criados por make_engine, pelo rótulo (primary, shard0, shard0-replica1...)
+pool_stats: Dict[str, PoolStats] = {}
+
+def _instrumented_pool(stats: PoolStats) -> type:
+    # Classe por engine: Pool.recreate() (após dispose) usa self.__class__,
+    # então os contadores sobrevivem à recriação do pool
+    class InstrumentedPool(AsyncAdaptedQueuePool):
+        _stats = stats
+
+        def _do_get(self):
+            start = time.perf_counter()
+            try:
+                record = super()._do_get()
+            except exc.TimeoutError:
+                self._stats.timeouts += 1
+                raise
+            self._stats.record_wait(time.perf_counter() - start)
+            if self.overflow() > 0:
+                self._stats.overflow_checkouts += 1
+            return record
+
+    return InstrumentedPool
+
+def make_engine(url: str, label: str = "primary") -> AsyncEngine:
+    stats = pool_stats[label] = PoolStats(label)
+    engine = create_async_engine(
+        url,
+        poolclass=_instrumented_pool(stats),
+        pool_pre_ping=True,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        connect_args={
+            'server_settings': {'timezone': 'UTC'}
+        }
+    )
+    stats.engine = engine
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        stats.connects += 1
+
+    @event.listens_for(engine.sync_engine, "close")
+    def _close(dbapi_connection, connection_record):
+        stats.closes += 1
+
+    @event.listens_for(engine.sync_engine, "invalidate")
+    def _invalidate(dbapi_connection, connection_record, exception):
+        stats.invalidations += 1
+
+    return engine
+
+def pool_status() -> List[dict]:
+    """Estado e contadores de todos os pools criados por make_engine"""
+    return [stats.stats() for stats in pool_stats.values()]
+
+def make_sessionmaker(bind: AsyncEngine) -> async_sessionmaker:
+    # expire_on_commit=False evita recarregar atributos após o commit,
+    # o que exigiria I/O implícito (não suportado em AsyncSession)
+    return async_sessionmaker(
+        bind=bind,
+        class_=AsyncSession,
+        autoflush=False,
+        expire_on_commit=False
+    )
+
+engine = make_engine(settings.DATABASE_URL)
+
+AsyncSessionLocal = make_sessionmaker(engine)
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close() 
\ No newline at end of file
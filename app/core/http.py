@@ -0,0 +1,30 @@
+import httpx
+from typing import Optional
+from .config import settings
+
+# Cliente único por processo: mantém o pool de conexões (keep-alive e
+# multiplexação HTTP/2) entre requisições em vez de abrir um TLS por chamada
+_client: Optional[httpx.AsyncClient] = None
+
+def get_http_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=settings.GOOGLE_HTTP2,
+            limits=httpx.Limits(
+                max_connections=settings.GOOGLE_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.GOOGLE_HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=settings.GOOGLE_HTTP_KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(
+                settings.GOOGLE_HTTP_TIMEOUT,
+                connect=settings.GOOGLE_HTTP_CONNECT_TIMEOUT
+            )
+        )
+    return _client
+
+async def close_http_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
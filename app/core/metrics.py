@@ -0,0 +1,209 @@
+import functools
+import inspect
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+from prometheus_client import Counter, Histogram, REGISTRY
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from . import database
+
+# Limites em segundos: de chamadas ao cache/banco (ms) até agendas lentas no Google
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Duração das requisições, até o fim do corpo da resposta",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS
+)
+REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries", "Consultas ao banco por requisição",
+    ["route"], buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+)
+REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_seconds", "Tempo em consultas ao banco por requisição",
+    ["route"], buckets=LATENCY_BUCKETS
+)
+DB_QUERIES = Counter("db_queries_total", "Consultas executadas no banco")
+DB_QUERY_SECONDS = Counter("db_query_seconds_total", "Tempo total das consultas ao banco")
+GOOGLE_LATENCY = Histogram(
+    "google_api_request_duration_seconds", "Chamadas às APIs do Google",
+    ["operation", "status"], buckets=LATENCY_BUCKETS
+)
+GOOGLE_RETRIES = Counter("google_api_retries_total", "Novas tentativas de chamadas ao Google", ["operation"])
+GOOGLE_RATE_LIMITED = Counter(
+    "google_api_rate_limited_total", "Respostas de limite de taxa do Google (429/403)", ["operation", "scope"]
+)
+GOOGLE_THROTTLED = Counter(
+    "google_api_throttled_total", "Chamadas atrasadas ou recusadas pelo limitador local", ["scope", "result"]
+)
+GOOGLE_THROTTLE_WAIT = Histogram(
+    "google_api_throttle_wait_seconds", "Espera no limitador local antes de chamar o Google",
+    ["scope"], buckets=LATENCY_BUCKETS
+)
+TOKEN_REFRESHES = Counter("token_refresh_total", "Renovações de token OAuth", ["result"])
+SECTION_LATENCY = Histogram(
+    "section_duration_seconds", "Trechos medidos com timed()",
+    ["section"], buckets=LATENCY_BUCKETS
+)
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+# Contadores da requisição atual; as tarefas filhas herdam o mesmo objeto
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    DB_QUERIES.inc()
+    DB_QUERY_SECONDS.inc(elapsed)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+
+def observe_google_call(operation: str, status: str, seconds: float) -> None:
+    GOOGLE_LATENCY.labels(operation, status).observe(seconds)
+
+class timed:
+    """
+    Mede um trecho em section_duration_seconds{section=...}.
+
+    Serve como gerenciador de contexto (with timed("x"): ...) e como
+    decorador de funções síncronas ou assíncronas (@timed("x")).
+    """
+
+    def __init__(self, section: str):
+        self._histogram = SECTION_LATENCY.labels(section)
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._histogram.observe(time.perf_counter() - self._start)
+        return False
+
+    def __call__(self, function: Callable) -> Callable:
+        histogram = self._histogram
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await function(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - start)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+        return wrapper
+
+# Caches que aparecem em /metrics: nome -> função que retorna stats()
+_cache_stats: Dict[str, Callable[[], dict]] = {}
+
+def register_cache_stats(name: str, stats: Callable[[], dict]) -> None:
+    """Expõe os contadores de um cache (formato de LRUCache.stats) em /metrics"""
+    _cache_stats[name] = stats
+
+class _StatsCollector:
+    """Lê os contadores de caches e pools no momento da coleta"""
+
+    def collect(self):
+        hits = CounterMetricFamily("cache_hits", "Acertos do cache", labels=["cache"])
+        misses = CounterMetricFamily("cache_misses", "Faltas do cache", labels=["cache"])
+        ratio = GaugeMetricFamily("cache_hit_ratio", "Acertos / consultas desde o início", labels=["cache"])
+        size = GaugeMetricFamily("cache_entries", "Entradas no cache", labels=["cache"])
+        for name, stats in _cache_stats.items():
+            values = stats()
+            hits.add_metric([name], values["hits"])
+            misses.add_metric([name], values["misses"])
+            ratio.add_metric([name], values["hit_ratio"])
+            size.add_metric([name], values["size"])
+        yield from (hits, misses, ratio, size)
+
+        in_use = GaugeMetricFamily("db_pool_checked_out", "Conexões em uso", labels=["pool"])
+        overflow = GaugeMetricFamily("db_pool_overflow", "Conexões além de DB_POOL_SIZE", labels=["pool"])
+        checkouts = CounterMetricFamily("db_pool_checkouts", "Checkouts do pool", labels=["pool"])
+        wait = GaugeMetricFamily("db_pool_wait_max_seconds", "Maior espera por uma conexão", labels=["pool"])
+        connects = CounterMetricFamily("db_pool_connects", "Conexões abertas", labels=["pool"])
+        closes = CounterMetricFamily("db_pool_closes", "Conexões fechadas", labels=["pool"])
+        invalidations = CounterMetricFamily("db_pool_invalidations", "Conexões invalidadas", labels=["pool"])
+        timeouts = CounterMetricFamily("db_pool_timeouts", "Esperas que estouraram DB_POOL_TIMEOUT", labels=["pool"])
+        for pool in database.pool_status():
+            label = [pool["label"]]
+            in_use.add_metric(label, pool["checked_out"])
+            overflow.add_metric(label, pool["overflow"])
+            checkouts.add_metric(label, pool["checkouts"])
+            wait.add_metric(label, pool["wait_max"])
+            connects.add_metric(label, pool["connects"])
+            closes.add_metric(label, pool["closes"])
+            invalidations.add_metric(label, pool["invalidations"])
+            timeouts.add_metric(label, pool["timeouts"])
+        yield from (in_use, overflow, checkouts, wait, connects, closes, invalidations, timeouts)
+
+REGISTRY.register(_StatsCollector())
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI: latência por rota (até o último byte, inclusive em
+    respostas em streaming) e consultas ao banco por requisição.
+
+    A rota é o caminho declarado (/api/v1/clientes/{email}), não a URL, para
+    manter a cardinalidade baixa; requisições sem rota ficam em "unmatched".
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._routes: Optional[Dict[Callable, str]] = None
+
+    def _route(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        if self._routes is None:
+            # As rotas já estão todas registradas quando chega a 1ª requisição
+            app = scope["app"]
+            self._routes = {route.endpoint: route.path for route in app.routes if hasattr(route, "endpoint")}
+        return self._routes.get(endpoint, "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_stats.reset(token)
+            route = self._route(scope)
+            REQUEST_LATENCY.labels(scope["method"], route, str(status_code)).observe(time.perf_counter() - start)
+            REQUEST_DB_QUERIES.labels(route).observe(stats.queries)
+            REQUEST_DB_SECONDS.labels(route).observe(stats.db_seconds)
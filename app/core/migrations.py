@@ -0,0 +1,119 @@
+import logging
+from typing import Awaitable, Callable, List, Tuple
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from app.core.database import Base
+# Registra as tabelas em Base.metadata
+from app.api import models  # noqa: F401
+
+logger = logging.getLogger(__name__)
+
+# Advisory lock que impede dois workers de migrarem ao mesmo tempo
+_MIGRATION_LOCK_KEY = 0x5EC7_0002
+
+BACKFILL_BATCH_SIZE = 5000
+
+Migration = Callable[[AsyncConnection], Awaitable[None]]
+
+async def _create_index_concurrently(conn: AsyncConnection, name: str, definition: str) -> None:
+    """
+    CREATE INDEX CONCURRENTLY name definition, reconstruindo o índice se um
+    build anterior falhou: o PostgreSQL deixa o índice marcado INVALID (não
+    usado em consultas) e o IF NOT EXISTS o daria como pronto.
+    """
+    valid = await conn.scalar(
+        text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"), {"name": name}
+    )
+    if valid is False:
+        logger.warning("Índice %s inválido (build interrompido); reconstruindo", name)
+        await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    await conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} {definition}"))
+
+async def _cliente_token_expiry(conn: AsyncConnection) -> None:
+    """Coluna cliente.token_expiry indexada, preenchida a partir de credentials->>'expiry'"""
+    await conn.execute(text("ALTER TABLE cliente ADD COLUMN IF NOT EXISTS token_expiry TIMESTAMPTZ"))
+    # CONCURRENTLY: não bloqueia escritas na tabela enquanto o índice é criado
+    await _create_index_concurrently(conn, "ix_cliente_token_expiry", "ON cliente (token_expiry)")
+
+    # Backfill em lotes por id, cada um em sua própria transação (autocommit).
+    # Valores que não parecem uma data ISO ficam NULL em vez de abortar o lote.
+    after = 0
+    total = 0
+    while True:
+        last = await conn.scalar(
+            text("SELECT max(id) FROM (SELECT id FROM cliente WHERE id > :after ORDER BY id LIMIT :size) AS batch"),
+            {"after": after, "size": BACKFILL_BATCH_SIZE}
+        )
+        if last is None:
+            break
+        result = await conn.execute(text("""
+            UPDATE cliente
+            SET token_expiry = (credentials->>'expiry')::timestamptz
+            WHERE id > :after AND id <= :last
+              AND token_expiry IS NULL
+              AND credentials->>'expiry' ~ '^\\d{4}-\\d{2}-\\d{2}[T ]\\d{2}:\\d{2}'
+        """), {"after": after, "last": last})
+        total += result.rowcount
+        after = last
+    logger.info("token_expiry preenchido em %d clientes", total)
+
+# (versão, migração), em ordem. Cada migração deve ser idempotente.
+MIGRATIONS: List[Tuple[str, Migration]] = [
+    ("0001_cliente_token_expiry", _cliente_token_expiry),
+]
+
+async def run_migrations(engine: AsyncEngine) -> List[str]:
+    """
+    Aplica as migrações pendentes e retorna as versões aplicadas.
+
+    Roda em autocommit (CREATE INDEX CONCURRENTLY não aceita transação) e
+    sob um advisory lock; as versões aplicadas ficam em schema_migration.
+    """
+    applied = []
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migration ("
+            "version VARCHAR(255) PRIMARY KEY, applied_at TIMESTAMPTZ NOT NULL DEFAULT now())"
+        ))
+        await conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": _MIGRATION_LOCK_KEY})
+        try:
+            done = set((await conn.execute(text("SELECT version FROM schema_migration"))).scalars())
+            for version, migration in MIGRATIONS:
+                if version in done:
+                    continue
+                logger.info("Aplicando migração %s", version)
+                await migration(conn)
+                await conn.execute(text("INSERT INTO schema_migration (version) VALUES (:version)"), {"version": version})
+                applied.append(version)
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _MIGRATION_LOCK_KEY})
+    return applied
+
+async def pending_migrations(engine: AsyncEngine) -> List[str]:
+    """
+    Versões ainda não aplicadas (todas, se schema_migration não existir).
+
+    Fora do PostgreSQL as migrações não rodam (ver migrate), então não há
+    nada pendente.
+    """
+    if engine.dialect.name != "postgresql":
+        return []
+    async with engine.connect() as conn:
+        exists = await conn.scalar(text("SELECT to_regclass('schema_migration') IS NOT NULL"))
+        done = set((await conn.execute(text("SELECT version FROM schema_migration"))).scalars()) if exists else set()
+    return [version for version, _ in MIGRATIONS if version not in done]
+
+async def migrate(engine: AsyncEngine) -> List[str]:
+    """
+    Cria as tabelas que faltam e aplica as migrações pendentes.
+
+    É o passo de esquema do deploy (python -m app.scripts.migrate); com
+    DB_AUTO_MIGRATE o lifespan também o executa. As migrações usam recursos
+    do PostgreSQL, então em outros bancos só as tabelas são criadas.
+    """
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    if engine.dialect.name != "postgresql":
+        return []
+    return await run_migrations(engine)
@@ -0,0 +1,186 @@
+import asyncio
+import gc
+import hmac
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Optional
+from .config import settings
+
+# Nome de perfil aceito pelas rotas de admin (sem barras: nada fora do diretório)
+PROFILE_NAME = re.compile(r"^[\w.-]+$")
+
+_ASYNC_GENERATOR_AWAITABLES = {"async_generator_asend", "async_generator_athrow"}
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}.{getattr(code, 'co_qualname', code.co_name)}"
+
+class _Sampler(threading.Thread):
+    """
+    Amostra, a cada `interval` segundos, onde está a tarefa da requisição.
+
+    Se a tarefa está executando no event loop, registra a pilha da thread do
+    loop; se está suspensa, registra a cadeia de awaits da corrotina (o que
+    ela está esperando: Google, banco...). Cada amostra pesa o tempo desde a
+    anterior, então o perfil é de tempo de relógio da requisição.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, task: asyncio.Task, root, interval: float):
+        super().__init__(name="request-profiler", daemon=True)
+        self.loop = loop
+        self.task = task
+        self.root = root
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.samples: Dict[str, float] = defaultdict(float)
+        self.count = 0
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        last = time.perf_counter()
+        while not self._stop_event.wait(self.interval):
+            now = time.perf_counter()
+            stack = self._sample()
+            if stack:
+                self.samples[stack] += now - last
+                self.count += 1
+            last = now
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+    def _sample(self) -> Optional[str]:
+        if asyncio.current_task(self.loop) is self.task:
+            frame = sys._current_frames().get(self.thread_id)
+            frames = []
+            while frame is not None:
+                frames.append(frame)
+                if frame is self.root:
+                    break
+                frame = frame.f_back
+            return ";".join(_frame_name(frame) for frame in reversed(frames))
+
+        names = []
+        recording = False
+        awaited = self.task.get_coro()
+        while awaited is not None:
+            if type(awaited).__name__ in _ASYNC_GENERATOR_AWAITABLES:
+                # "async for" espera um objeto sem frame; o gerador está nas referências dele
+                awaited = next((ref for ref in gc.get_referents(awaited) if hasattr(ref, "ag_frame")), awaited)
+            frame = getattr(awaited, "cr_frame", None) or getattr(awaited, "gi_frame", None) or getattr(awaited, "ag_frame", None)
+            if frame is None:
+                names.append(f"[await {type(awaited).__name__}]")
+                break
+            recording = recording or frame is self.root
+            if recording:
+                names.append(_frame_name(frame))
+            awaited = getattr(awaited, "cr_await", None) or getattr(awaited, "gi_yieldfrom", None) or getattr(awaited, "ag_await", None)
+        return ";".join(names) if recording else None
+
+def list_profiles(limit: int = 50) -> List[dict]:
+    """Metadados dos perfis gravados, do mais recente ao mais antigo"""
+    directory = settings.PROFILE_DIR
+    if not os.path.isdir(directory):
+        return []
+    names = sorted((name for name in os.listdir(directory) if name.endswith(".json")), reverse=True)
+    profiles = []
+    for name in names[:limit]:
+        try:
+            with open(os.path.join(directory, name)) as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return profiles
+
+def read_profile(name: str) -> Optional[str]:
+    """Conteúdo (pilhas colapsadas) de um perfil, ou None se não existir"""
+    if not PROFILE_NAME.match(name):
+        return None
+    path = os.path.join(settings.PROFILE_DIR, f"{name}.collapsed")
+    try:
+        with open(path) as f:
+            return f.read()
+    except OSError:
+        return None
+
+def _write_profile(name: str, samples: Dict[str, float], meta: dict) -> None:
+    directory = settings.PROFILE_DIR
+    os.makedirs(directory, exist_ok=True)
+    # Formato "colapsado" (flamegraph.pl, speedscope): pilha e peso em µs
+    with open(os.path.join(directory, f"{name}.collapsed"), "w") as f:
+        for stack, seconds in sorted(samples.items()):
+            f.write(f"{stack} {max(1, round(seconds * 1_000_000))}\n")
+    with open(os.path.join(directory, f"{name}.json"), "w") as f:
+        json.dump(meta, f)
+
+    # Rotação: mantém só os PROFILE_MAX_FILES perfis mais recentes
+    names = sorted(entry[:-len(".json")] for entry in os.listdir(directory) if entry.endswith(".json"))
+    for old in names[:-settings.PROFILE_MAX_FILES]:
+        for suffix in (".json", ".collapsed"):
+            try:
+                os.remove(os.path.join(directory, old + suffix))
+            except OSError:
+                pass
+
+class ProfilingMiddleware:
+    """
+    Middleware ASGI que perfila requisições escolhidas: as que trazem o
+    cabeçalho PROFILE_HEADER (com o valor de PROFILE_TOKEN, se definido) e
+    uma fração PROFILE_SAMPLE_RATE das demais.
+
+    O perfil vai para PROFILE_DIR e o nome volta no cabeçalho X-Profile-Id.
+    Requisições não escolhidas pagam só a checagem do cabeçalho e do sorteio;
+    com PROFILE_ENABLED desligado o middleware nem é instalado.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._header = settings.PROFILE_HEADER.lower().encode()
+
+    def _selected(self, scope) -> bool:
+        for name, value in scope["headers"]:
+            if name == self._header:
+                return not settings.PROFILE_TOKEN or hmac.compare_digest(value, settings.PROFILE_TOKEN.encode())
+        return settings.PROFILE_SAMPLE_RATE > 0 and random.random() < settings.PROFILE_SAMPLE_RATE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._selected(scope):
+            await self.app(scope, receive, send)
+            return
+
+        name = f"{time.time_ns() // 1_000_000}-{uuid.uuid4().hex[:8]}"
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", name.encode())]}
+            await send(message)
+
+        sampler = _Sampler(asyncio.get_running_loop(), asyncio.current_task(), sys._getframe(), settings.PROFILE_INTERVAL)
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            sampler.stop()
+            meta = {
+                "name": name,
+                "method": scope["method"],
+                "path": scope["path"],
+                "query": scope.get("query_string", b"").decode(errors="replace"),
+                "status": status_code,
+                "duration": time.perf_counter() - start,
+                "samples": sampler.count,
+                "created_at": time.time()
+            }
+            await asyncio.to_thread(_write_profile, name, dict(sampler.samples), meta)
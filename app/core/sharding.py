@@ -0,0 +1,204 @@
+import hashlib
+import heapq
+import itertools
+import time
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Optional, Sequence, TypeVar
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from . import database
+from .cache import LRUCache
+from .config import settings
+
+T = TypeVar("T")
+
+def shard_index(email: str, count: int) -> int:
+    """Shard do cliente: hash estável do email (igual em todos os processos)"""
+    digest = hashlib.blake2b(email.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % count
+
+class ShardRouter:
+    """
+    Distribui os clientes entre os bancos de DB_SHARD_URLS pelo hash do email.
+
+    Cada cliente vive inteiro em um shard (cliente, espelho de eventos e
+    estado de sincronização); os ids são sequenciais por shard. Sem
+    DB_SHARD_URLS há um único shard, o banco de DATABASE_URL, e o código
+    que usa o roteador funciona igual nos dois casos.
+
+    Leituras podem ir para réplicas (DB_REPLICA_URLS/DB_SHARD_REPLICA_URLS),
+    em rodízio. Quem escreve em um cliente chama note_write; por
+    DB_READ_YOUR_WRITES_WINDOW segundos as leituras desse cliente (e as
+    listagens do seu shard) voltam ao primário.
+    """
+
+    def __init__(
+        self, urls: Optional[Sequence[str]] = None, replica_urls: Optional[Sequence[Sequence[str]]] = None
+    ):
+        self._urls = list(urls) if urls is not None else None
+        self._replica_urls = [list(group) for group in replica_urls] if replica_urls is not None else None
+        self._engines: Optional[List[AsyncEngine]] = None
+        self._sessionmakers: Optional[List[async_sessionmaker]] = None
+        self._replica_engines: Optional[List[List[AsyncEngine]]] = None
+        self._replica_sessionmakers: Optional[List[List[async_sessionmaker]]] = None
+        self._rotation: Dict[int, itertools.count] = {}
+        self._recent_writes = LRUCache(maxsize=100000, ttl=settings.DB_READ_YOUR_WRITES_WINDOW)
+        self._shard_writes: Dict[int, float] = {}
+
+    @property
+    def urls(self) -> List[str]:
+        return self._urls if self._urls is not None else list(settings.DB_SHARD_URLS)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.urls)
+
+    @property
+    def replica_urls(self) -> List[List[str]]:
+        """Réplicas de cada shard (listas vazias para shards sem réplica)"""
+        if self._replica_urls is not None:
+            groups = self._replica_urls
+        elif self.enabled:
+            groups = settings.DB_SHARD_REPLICA_URLS
+        else:
+            groups = [settings.DB_REPLICA_URLS]
+        return [list(groups[index]) if index < len(groups) else [] for index in range(self.count)]
+
+    def _build(self) -> None:
+        if self._sessionmakers is None:
+            self._engines = [database.make_engine(url, f"shard{index}") for index, url in enumerate(self.urls)]
+            self._sessionmakers = [database.make_sessionmaker(engine) for engine in self._engines]
+
+    def _build_replicas(self) -> None:
+        if self._replica_sessionmakers is None:
+            prefix = "shard{}-" if self.enabled else ""
+            self._replica_engines = [
+                [
+                    database.make_engine(url, f"{prefix.format(index)}replica{number}")
+                    for number, url in enumerate(group)
+                ]
+                for index, group in enumerate(self.replica_urls)
+            ]
+            self._replica_sessionmakers = [
+                [database.make_sessionmaker(engine) for engine in group] for group in self._replica_engines
+            ]
+
+    def engines(self) -> List[AsyncEngine]:
+        if not self.enabled:
+            return [database.engine]
+        self._build()
+        return self._engines
+
+    def sessionmakers(self) -> List[async_sessionmaker]:
+        if not self.enabled:
+            return [database.AsyncSessionLocal]
+        self._build()
+        return self._sessionmakers
+
+    @property
+    def count(self) -> int:
+        return len(self.urls) if self.enabled else 1
+
+    def index_for(self, email: str) -> int:
+        return shard_index(email, self.count) if self.enabled else 0
+
+    def session_for(self, email: str) -> AsyncSession:
+        return self.sessionmakers()[self.index_for(email)]()
+
+    def note_write(self, email: str) -> None:
+        """Registra uma escrita no cliente: suas leituras vão ao primário por um tempo"""
+        self._recent_writes.set(email, True)
+        self._shard_writes[self.index_for(email)] = time.monotonic()
+
+    def read_sessionmaker(self, index: int, emails: Optional[Iterable[str]] = None) -> async_sessionmaker:
+        """
+        Sessões de leitura no shard `index`: uma réplica, ou o primário se o
+        shard não tem réplicas ou se houve escrita recente (em algum dos
+        clientes `emails` ou, sem emails, em qualquer cliente do shard).
+        """
+        self._build_replicas()
+        replicas = self._replica_sessionmakers[index]
+        if not replicas:
+            return self.sessionmakers()[index]
+        if emails is not None:
+            recent = any(self._recent_writes.get(email) is not None for email in emails)
+        else:
+            written_at = self._shard_writes.get(index)
+            recent = written_at is not None and time.monotonic() - written_at < settings.DB_READ_YOUR_WRITES_WINDOW
+        if recent:
+            return self.sessionmakers()[index]
+        rotation = self._rotation.setdefault(index, itertools.count())
+        return replicas[next(rotation) % len(replicas)]
+
+    def read_sessionmakers(self) -> List[async_sessionmaker]:
+        """Um sessionmaker de leitura por shard, para consultas que percorrem todos"""
+        return [self.read_sessionmaker(index) for index in range(self.count)]
+
+    def read_session_for(self, email: str) -> AsyncSession:
+        index = self.index_for(email)
+        return self.read_sessionmaker(index, [email])()
+
+    def all_engines(self) -> List[AsyncEngine]:
+        """Primários e réplicas"""
+        self._build_replicas()
+        return self.engines() + [engine for group in self._replica_engines for engine in group]
+
+    def partition(self, emails: Iterable[str]) -> Dict[int, List[str]]:
+        """Agrupa os emails por shard"""
+        groups: Dict[int, List[str]] = {}
+        for email in emails:
+            groups.setdefault(self.index_for(email), []).append(email)
+        return groups
+
+    async def dispose(self) -> None:
+        for engine in (self._engines or []) + [
+            engine for group in self._replica_engines or [] for engine in group
+        ]:
+            await engine.dispose()
+        self._engines = self._sessionmakers = None
+        self._replica_engines = self._replica_sessionmakers = None
+
+shards = ShardRouter()
+
+async def get_cliente_db(email: str):
+    """Dependency: sessão no shard do cliente `email` (parâmetro de caminho)"""
+    async with shards.session_for(email) as db:
+        yield db
+
+async def get_cliente_read_db(email: str):
+    """Dependency: como get_cliente_db, mas para rotas só de leitura (pode usar réplica)"""
+    async with shards.read_session_for(email) as db:
+        yield db
+
+async def merge_sorted(iterators: List[AsyncIterator[T]], key: Callable[[T], object]) -> AsyncIterator[T]:
+    """
+    Junta iteradores já ordenados por `key` em um só, também ordenado
+    (k-way merge). Lê um item por vez de cada iterador.
+    """
+    _END = object()
+
+    async def next_item(iterator: AsyncIterator[T]):
+        try:
+            return await iterator.__anext__()
+        except StopAsyncIteration:
+            return _END
+
+    try:
+        heap = []
+        for index, iterator in enumerate(iterators):
+            item = await next_item(iterator)
+            if item is not _END:
+                heap.append((key(item), index, item))
+        heapq.heapify(heap)
+        while heap:
+            _, index, item = heap[0]
+            yield item
+            following = await next_item(iterators[index])
+            if following is _END:
+                heapq.heappop(heap)
+            else:
+                heapq.heapreplace(heap, (key(following), index, following))
+    finally:
+        # Quem consome pode parar antes do fim: fecha os iteradores (e as sessões)
+        for iterator in iterators:
+            aclose = getattr(iterator, "aclose", None)
+            if aclose is not None:
+                await aclose()
@@ -0,0 +1,106 @@
+"""
+Relatório de inicialização do worker: tempo de importação por módulo e tempo
+até ficar pronto.
+
+Precisa ser o primeiro import de app.main: a partir daí, cada módulo
+importado tem o exec_module cronometrado (tempo acumulado, com os módulos que
+ele importa, como em python -X importtime). A medição termina em
+mark_ready(), chamado no fim da inicialização do lifespan.
+"""
+import logging
+import sys
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_started = time.perf_counter()
+_lifespan_started: Optional[float] = None
+_ready: Optional[float] = None
+# módulo -> tempo acumulado de importação (s)
+_import_times: Dict[str, float] = {}
+
+class _ImportTimer:
+    """Finder que só embrulha o loader dos outros finders de sys.meta_path"""
+
+    def __init__(self):
+        self._finding = False
+
+    def find_spec(self, name, path, target=None):
+        if self._finding:
+            return None
+        self._finding = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(name, path, target)
+                if spec is not None:
+                    break
+            else:
+                return None
+        finally:
+            self._finding = False
+
+        loader = spec.loader
+        # Importadores de módulos embutidos/congelados são a própria classe
+        if loader is not None and not isinstance(loader, type) and hasattr(loader, "exec_module"):
+            exec_module = loader.exec_module
+
+            def timed_exec_module(module):
+                start = time.perf_counter()
+                try:
+                    exec_module(module)
+                finally:
+                    _import_times[name] = time.perf_counter() - start
+                    # o loader pode ser reaproveitado (reload): volta ao original
+                    loader.exec_module = exec_module
+
+            loader.exec_module = timed_exec_module
+        return spec
+
+_timer = _ImportTimer()
+sys.meta_path.insert(0, _timer)
+
+def mark_lifespan_start() -> None:
+    global _lifespan_started
+    _lifespan_started = time.perf_counter()
+
+def mark_ready() -> None:
+    """Encerra a medição (remove o finder) e registra o relatório no log"""
+    global _ready
+    if _ready is not None:
+        return
+    _ready = time.perf_counter()
+    if _timer in sys.meta_path:
+        sys.meta_path.remove(_timer)
+    report = startup_report()
+    logger.info(
+        "Worker pronto em %.3fs (importação %.3fs, lifespan %.3fs); importações mais lentas: %s",
+        report["ready_seconds"], report["import_seconds"], report["lifespan_seconds"] or 0.0,
+        ", ".join(f"{item['module']} {item['seconds']:.3f}s" for item in report["slowest_imports"][:10])
+    )
+
+def startup_report(limit: int = 25) -> dict:
+    """
+    Tempos de inicialização, em segundos, a partir da importação de app.main.
+
+    import_seconds vai da importação de app.main até o início do lifespan
+    (importações e montagem da aplicação). Módulos carregados antes de
+    app.main, como os do servidor, não aparecem nas listas.
+    """
+    end = _lifespan_started or _ready or time.perf_counter()
+    slowest = sorted(_import_times.items(), key=lambda item: item[1], reverse=True)[:limit]
+    roots = {name.partition(".")[0] for name in _import_times}
+    return {
+        "ready": _ready is not None,
+        "ready_seconds": (_ready - _started) if _ready is not None else None,
+        "import_seconds": end - _started,
+        "lifespan_seconds": (_ready - _lifespan_started) if _ready is not None and _lifespan_started is not None else None,
+        "imported_modules": len(_import_times),
+        "slowest_imports": [{"module": name, "seconds": seconds} for name, seconds in slowest],
+        "packages": sorted(
+            ({"package": root, "seconds": _import_times[root]} for root in roots if root in _import_times),
+            key=lambda item: item["seconds"], reverse=True
+        )[:limit]
+    }
@@ -1,13 +1,48 @@
+# Primeiro import: cronometra as importações seguintes (relatório de startup)
+from app.core import startup
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.core.database import Base, engine
+from app.core.database import engine
+from app.core.sharding import shards
 from app.core.config import settings
-from app.api.routes import cliente_router, calendar_router
+from app.core.http import close_http_client
+from app.core.cache import get_cache_backend, close_cache_backend
+from app.core.migrations import migrate
+from app.core.metrics import MetricsMiddleware
+from app.core.profiling import ProfilingMiddleware
+from app.services.token_refresher import token_refresher
+from app.services.credential_writer import credential_writer
+from app.api.routes import cliente_router, calendar_router, admin_router, metrics_router
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup.mark_lifespan_start()
+    # Criar tabelas e migrar (em cada shard). Desligado, o esquema fica a
+    # cargo de python -m app.scripts.migrate e o worker não toca no banco aqui
+    if settings.DB_AUTO_MIGRATE:
+        for shard_engine in shards.engines():
+            await migrate(shard_engine)
+    # Canal de invalidação entre workers
+    await get_cache_backend().start()
+    credential_writer.start()
+    if settings.TOKEN_REFRESH_ENABLED:
+        token_refresher.start()
+    startup.mark_ready()
+    yield
+    await token_refresher.stop()
+    # Grava as credenciais renovadas que ainda estão na fila
+    await credential_writer.stop()
+    await close_cache_backend()
+    await close_http_client()
+    await shards.dispose()
+    await engine.dispose()
 
 # Criar aplicação FastAPI
 app = FastAPI(
     title=settings.PROJECT_NAME,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan
 )
 
 # Configurar CORS
@@ -19,12 +54,20 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Criar tabelas
-Base.metadata.create_all(bind=engine)
+# Perfis de requisições escolhidas por cabeçalho ou sorteio (/admin/profiles)
+if settings.PROFILE_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
+# Latência por rota e consultas ao banco por requisição (/metrics)
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
 
 # Incluir rotas
 app.include_router(cliente_router, prefix=settings.API_V1_STR)
 app.include_router(calendar_router, prefix=settings.API_V1_STR)
+app.include_router(admin_router, prefix=settings.API_V1_STR)
+if settings.METRICS_ENABLED:
+    app.include_router(metrics_router)
 
 if __name__ == "__main__":
     import uvicorn
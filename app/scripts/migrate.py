@@ -0,0 +1,42 @@
+"""
+Cria as tabelas e aplica as migrações pendentes em todos os shards.
+
+Uso:
+    python -m app.scripts.migrate [--check]
+
+É o passo de esquema do deploy: roda uma vez, antes de subir os workers com
+DB_AUTO_MIGRATE=false, para que a inicialização deles não abra conexões nem
+espere o advisory lock das migrações. Com --check nada é alterado; a saída
+lista as migrações pendentes e o código de saída é 1 se houver alguma.
+"""
+import argparse
+import asyncio
+import sys
+from app.core import database
+from app.core.migrations import migrate, pending_migrations
+from app.core.sharding import shards
+
+async def run(check: bool = False) -> int:
+    pending_total = 0
+    try:
+        for index, engine in enumerate(shards.engines()):
+            if check:
+                pending = await pending_migrations(engine)
+                pending_total += len(pending)
+                print(f"shard {index}: {', '.join(pending) if pending else 'em dia'}")
+            else:
+                applied = await migrate(engine)
+                print(f"shard {index}: {', '.join(applied) if applied else 'nenhuma migração pendente'}")
+    finally:
+        await shards.dispose()
+        await database.engine.dispose()
+    return 1 if pending_total else 0
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Cria as tabelas e aplica as migrações em todos os shards")
+    parser.add_argument("--check", action="store_true", help="Só lista as migrações pendentes")
+    args = parser.parse_args()
+    return asyncio.run(run(args.check))
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""
+Move os clientes para o shard correto depois de uma mudança em DB_SHARD_URLS.
+
+Uso:
+    python -m app.scripts.rebalance_shards --old URL [URL ...] [--dry-run]
+
+--old recebe a lista de shards anterior, na ordem antiga; o destino é a
+configuração atual (DB_SHARD_URLS). Cada cliente fora do lugar é gravado no
+novo shard e removido do antigo, em lotes; o espelho de eventos do shard de
+origem é apagado em cascata e recriado na próxima sincronização. Pode ser
+executado de novo se for interrompido.
+"""
+import argparse
+import asyncio
+from collections import Counter
+from typing import List
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.postgresql import insert
+from app.api.models import Cliente
+from app.core.config import settings
+from app.core.sharding import ShardRouter, shards
+
+_COLUMNS = ("email", "credentials", "expiry", "token_expiry", "created_at", "updated_at")
+
+_table = Cliente.__table__
+
+def _upsert_statement():
+    stmt = insert(_table)
+    return stmt.on_conflict_do_update(
+        index_elements=[_table.c.email],
+        set_={column: stmt.excluded[column] for column in _COLUMNS if column != "email"}
+    )
+
+async def rebalance(old_urls: List[str], batch_size: int = 1000, dry_run: bool = False) -> Counter:
+    """Retorna quantos clientes foram (ou seriam) movidos, por (origem, destino)"""
+    old = ShardRouter(old_urls)
+    new_urls = shards.urls or [settings.DATABASE_URL]
+    moved: Counter = Counter()
+    try:
+        for source, source_url in enumerate(old.urls):
+            makers = old.sessionmakers()
+            after = ""
+            while True:
+                async with makers[source]() as db:
+                    result = await db.execute(
+                        select(*(_table.c[column] for column in _COLUMNS))
+                        .where(_table.c.email > after)
+                        .order_by(_table.c.email)
+                        .limit(batch_size)
+                    )
+                    rows = [dict(row._mapping) for row in result]
+                if not rows:
+                    break
+                after = rows[-1]["email"]
+
+                targets = {}
+                for row in rows:
+                    target = shards.index_for(row["email"])
+                    if new_urls[target] != source_url:
+                        targets.setdefault(target, []).append(row)
+                for target, group in targets.items():
+                    moved[(source, target)] += len(group)
+                    if dry_run:
+                        continue
+                    # Grava no destino antes de remover da origem: uma falha no
+                    # meio deixa o cliente duplicado, nunca perdido
+                    async with shards.sessionmakers()[target]() as db:
+                        await db.execute(_upsert_statement(), group)
+                        await db.commit()
+                    async with makers[source]() as db:
+                        await db.execute(delete(Cliente).where(Cliente.email.in_([row["email"] for row in group])))
+                        await db.commit()
+    finally:
+        await old.dispose()
+        await shards.dispose()
+    return moved
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Redistribui os clientes entre os shards de DB_SHARD_URLS")
+    parser.add_argument("--old", nargs="+", required=True, help="URLs dos shards antigos, na ordem anterior")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true", help="Só conta os clientes que seriam movidos")
+    args = parser.parse_args()
+
+    moved = asyncio.run(rebalance(args.old, args.batch_size, args.dry_run))
+    for (source, target), count in sorted(moved.items()):
+        print(f"shard {source} -> {target}: {count}")
+    print(f"total: {sum(moved.values())}{' (dry-run)' if args.dry_run else ''}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+import asyncio
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, NamedTuple, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.api.models import Cliente
+from app.core.cache import LRUCache, get_cache_backend, register_invalidation_handler, version_time
+from app.core.config import settings
+from app.core.metrics import register_cache_stats
+from app.core.sharding import shards
+from app.services.credential_writer import credential_writer
+
+class ClienteInfo(NamedTuple):
+    """O que as rotas de calendário precisam de um cliente, sem a linha ORM"""
+    id: int
+    email: str
+    credentials: Optional[dict]
+    expiry: Optional[str]
+
+_COLUMNS = (Cliente.id, Cliente.email, Cliente.credentials, Cliente.expiry)
+
+_fernet = None
+
+def _cipher():
+    """Fernet de CACHE_ENCRYPTION_KEY, ou None se não configurada"""
+    global _fernet
+    if not settings.CACHE_ENCRYPTION_KEY:
+        return None
+    if _fernet is None:
+        try:
+            from cryptography.fernet import Fernet
+        except ImportError as e:
+            raise RuntimeError("CACHE_ENCRYPTION_KEY requer o pacote 'cryptography'") from e
+        _fernet = Fernet(settings.CACHE_ENCRYPTION_KEY.encode())
+    return _fernet
+
+class ClienteCache:
+    """
+    Cache de email -> (id, credenciais, expiry) em duas camadas: um LRU no
+    processo e o backend compartilhado (app.core.cache) entre os workers.
+
+    As entradas valem por CLIENTE_CACHE_TTL segundos. Toda escrita em um
+    cliente (ClienteService, oauth2callback, renovação de token) deve chamar
+    invalidate, que também derruba as cópias locais dos outros workers;
+    leituras que começaram antes da invalidação não repovoam o cache local
+    nem, pela versão da chave no backend, o compartilhado.
+
+    As credenciais só vão ao backend compartilhado cifradas com
+    CACHE_ENCRYPTION_KEY; sem a chave, clientes com credenciais ficam apenas
+    no cache local de cada worker.
+    """
+
+    NAMESPACE = "cliente"
+
+    def __init__(self):
+        self._entries = LRUCache(maxsize=settings.CLIENTE_CACHE_MAX_ENTRIES, ttl=settings.CLIENTE_CACHE_TTL)
+        # Incrementada a cada invalidação: leituras iniciadas antes dela não
+        # repovoam o cache. Só existe para emails com leitura em andamento
+        self._generation: Dict[str, int] = {}
+        self._loading: Dict[str, int] = {}
+        self.invalidations = 0
+        self.shared_hits = 0
+        register_invalidation_handler(self.NAMESPACE, self._drop_local)
+        register_cache_stats(self.NAMESPACE, self.stats)
+
+    def _key(self, email: str) -> str:
+        return f"{self.NAMESPACE}:{email}"
+
+    async def get(self, db: AsyncSession, email: str) -> Optional[ClienteInfo]:
+        """Dados do cliente, ou None se não existir; `db` é uma sessão no shard do cliente"""
+        return (await self._lookup([email], lambda missing: self._load(db, missing))).get(email)
+
+    async def get_many(self, emails: Iterable[str]) -> Dict[str, ClienteInfo]:
+        """Como get para vários emails; os que faltam no cache vêm em uma consulta por shard"""
+        return await self._lookup(list(dict.fromkeys(emails)), self._load_sharded)
+
+    async def _lookup(
+        self, emails: List[str], load: Callable[[List[str]], Awaitable[Dict[str, ClienteInfo]]]
+    ) -> Dict[str, ClienteInfo]:
+        if not settings.CLIENTE_CACHE_ENABLED:
+            return await load(emails)
+
+        found: Dict[str, ClienteInfo] = {}
+        missing = []
+        for email in emails:
+            info = self._entries.get(email)
+            if info is not None:
+                found[email] = info
+            else:
+                missing.append(email)
+        if not missing:
+            return found
+
+        # Gerações só existem enquanto há leitura do email em andamento
+        generations = {}
+        for email in missing:
+            generations[email] = self._generation.setdefault(email, 0)
+            self._loading[email] = self._loading.get(email, 0) + 1
+        try:
+            backend = get_cache_backend()
+            shared = await backend.get_many([self._key(email) for email in missing])
+            for data in shared.values():
+                info = self._from_shared(data)
+                if info is None:
+                    continue
+                found[info.email] = info
+                self.shared_hits += 1
+                self._store_local(info, generations[info.email])
+
+            missing = [email for email in missing if email not in found]
+            if missing:
+                # Versões lidas antes do banco: uma escrita de outro worker depois
+                # daqui impede que a linha lida (já velha) vá ao backend
+                versions = await backend.versions([self._key(email) for email in missing])
+                recent = set()
+                for email in missing:
+                    written_at = version_time(versions[self._key(email)])
+                    if written_at is not None and time.time() - written_at < settings.DB_READ_YOUR_WRITES_WINDOW:
+                        # Escrita recente em outro worker: a réplica pode não tê-la.
+                        # As próximas leituras vão ao primário e esta (talvez de uma
+                        # sessão já aberta na réplica) não vai ao backend
+                        shards.note_write(email)
+                        recent.add(email)
+                for info in (await load(missing)).values():
+                    found[info.email] = info
+                    if not self._store_local(info, generations[info.email]) or info.email in recent:
+                        continue
+                    data = self._to_shared(info)
+                    if data is not None:
+                        key = self._key(info.email)
+                        await backend.set_if_version(key, data, settings.CLIENTE_CACHE_TTL, versions[key])
+            return found
+        finally:
+            for email in generations:
+                self._loading[email] -= 1
+                if not self._loading[email]:
+                    del self._loading[email]
+                    del self._generation[email]
+
+    def _to_shared(self, info: ClienteInfo) -> Optional[Dict[str, Any]]:
+        """Valor gravado no backend, ou None se o cliente não pode ir para lá"""
+        data = info._asdict()
+        if info.credentials is None:
+            return data
+        cipher = _cipher()
+        if cipher is None:
+            return None
+        data["credentials"] = cipher.encrypt(json.dumps(info.credentials).encode()).decode()
+        return data
+
+    def _from_shared(self, data: Dict[str, Any]) -> Optional[ClienteInfo]:
+        credentials = data.get("credentials")
+        if isinstance(credentials, str):
+            cipher = _cipher()
+            if cipher is None:
+                return None
+            from cryptography.fernet import InvalidToken
+            try:
+                data = {**data, "credentials": json.loads(cipher.decrypt(credentials.encode()))}
+            except InvalidToken:
+                # Cifrado com outra chave (rotação): vale como falta
+                return None
+        return ClienteInfo(**data)
+
+    async def _load(self, db: AsyncSession, emails: List[str]) -> Dict[str, ClienteInfo]:
+        result = await db.execute(select(*_COLUMNS).where(Cliente.email.in_(emails)))
+        found = {}
+        for row in result:
+            info = ClienteInfo(*row)
+            # Credenciais renovadas que ainda estão na fila de gravação
+            pending = credential_writer.pending(info.email)
+            found[info.email] = info._replace(credentials=pending) if pending else info
+        return found
+
+    async def _load_sharded(self, emails: List[str]) -> Dict[str, ClienteInfo]:
+        async def load(index: int, group: List[str]) -> Dict[str, ClienteInfo]:
+            async with shards.read_sessionmaker(index, group)() as db:
+                return await self._load(db, group)
+
+        found: Dict[str, ClienteInfo] = {}
+        for part in await asyncio.gather(*(
+            load(index, group) for index, group in shards.partition(emails).items()
+        )):
+            found.update(part)
+        return found
+
+    def _store_local(self, info: ClienteInfo, generation: int) -> bool:
+        if self._generation.get(info.email) != generation:
+            return False
+        self._entries.set(info.email, info)
+        return True
+
+    async def invalidate(self, email: str) -> None:
+        """Remove o cliente deste worker e do backend, e avisa os demais workers"""
+        self._drop_local(email)
+        if settings.CLIENTE_CACHE_ENABLED:
+            backend = get_cache_backend()
+            await backend.bump(self._key(email))
+            await backend.invalidate(self.NAMESPACE, email)
+
+    async def invalidate_many(self, emails: Iterable[str]) -> None:
+        """Como invalidate, com um bump e um aviso para todos os emails"""
+        emails = list(emails)
+        for email in emails:
+            self._drop_local(email)
+        if settings.CLIENTE_CACHE_ENABLED and emails:
+            backend = get_cache_backend()
+            await backend.bump_many([self._key(email) for email in emails])
+            await backend.invalidate_many(self.NAMESPACE, emails)
+
+    async def update_credentials(self, email: str, credentials: dict) -> None:
+        """Troca as credenciais em cache (write-through) e avisa os demais workers"""
+        info = self._entries.peek(email)
+        self._drop_local(email)
+        if not settings.CLIENTE_CACHE_ENABLED:
+            return
+        backend = get_cache_backend()
+        version = await backend.bump(self._key(email))
+        if info is not None:
+            info = info._replace(credentials=credentials)
+            self._entries.set(email, info)
+            data = self._to_shared(info)
+            if data is not None:
+                await backend.set_if_version(self._key(email), data, settings.CLIENTE_CACHE_TTL, version)
+        await backend.invalidate(self.NAMESPACE, email)
+
+    def _drop_local(self, email: str) -> None:
+        # Toda escrita em um cliente passa por aqui (também as avisadas por
+        # outros workers): as próximas leituras dele evitam as réplicas
+        shards.note_write(email)
+        if email in self._generation:
+            self._generation[email] += 1
+        if self._entries.pop(email) is not None:
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        for email in list(self._generation):
+            self._generation[email] += 1
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {**self._entries.stats(), "shared_hits": self.shared_hits, "invalidations": self.invalidations}
+
+cliente_cache = ClienteCache()
@@ -1,32 +1,243 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select, func, literal_column, any_, bindparam, String
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import ValidationError
 from app.api.models import Cliente
-from app.api.schemas.cliente import ClienteCreate, ClienteUpdate
+from app.api.schemas.cliente import (
+    ClienteCreate, ClienteUpdate, ClienteImportRow, ClienteImportItem, ClienteImportResult
+)
+from app.core.config import settings
+from app.core.metrics import timed
+from app.core.sharding import shards, merge_sorted
+from app.services.google_calendar import invalidate_service
+from app.services.google_auth import GoogleAuthService
+from app.services.cliente_cache import cliente_cache
+from app.services.credential_writer import credential_writer
 from fastapi import HTTPException, status
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+import asyncio
+import base64
+import heapq
+import binascii
+import csv
+import io
+import json
+
+# Colunas exportadas: tudo menos o JSON de credenciais
+EXPORT_COLUMNS = (Cliente.id, Cliente.email, Cliente.expiry, Cliente.created_at, Cliente.updated_at)
+
+def encode_cursor(value: Any) -> str:
+    """Cursor opaco com a chave do último item da página"""
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Any:
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor inválido"
+        )
+
+def parse_import(content: bytes, format: str) -> Iterator[Tuple[int, Union[dict, str]]]:
+    """
+    Lê um arquivo de importação em NDJSON ou CSV.
+
+    Gera (linha, dados) para cada registro, ou (linha, mensagem) quando a
+    linha não pôde ser lida. No CSV a primeira linha é o cabeçalho (email,
+    credentials, expiry) e credentials é um JSON.
+    """
+    text = content.decode("utf-8-sig", errors="replace")
+    if format == "csv":
+        reader = csv.DictReader(io.StringIO(text))
+        for row in reader:
+            line = reader.line_num
+            data = {key: value for key, value in row.items() if key and value not in (None, "")}
+            if "credentials" in data:
+                try:
+                    data["credentials"] = json.loads(data["credentials"])
+                except ValueError:
+                    yield line, "credentials não é um JSON válido"
+                    continue
+            yield line, data
+        return
+
+    for line, raw in enumerate(text.splitlines(), start=1):
+        if not raw.strip():
+            continue
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            yield line, "JSON inválido"
+            continue
+        if not isinstance(data, dict):
+            yield line, "Cada linha deve ser um objeto JSON"
+            continue
+        yield line, data
+
+def _upsert_statement(fields: Tuple[str, ...]):
+    # Sobre a Table, e não a entidade, para não passar pelo bulk insert do ORM
+    table = Cliente.__table__
+    stmt = insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.email],
+        set_={
+            **{field: stmt.excluded[field] for field in fields},
+            "updated_at": func.current_timestamp()
+        }
+    ).returning(table.c.email, literal_column("xmax = 0").label("inserted"))
+
+# Um único parâmetro array: o texto da consulta não depende de quantos emails há
+_LOOKUP_QUERY = select(Cliente).where(
+    Cliente.email == any_(bindparam("emails", type_=ARRAY(String)))
+)
+
+async def _stream_rows(maker, query) -> AsyncIterator[Any]:
+    async with maker() as db:
+        result = await db.stream(query)
+        async for row in result:
+            yield row
 
 class ClienteService:
     @staticmethod
-    async def create_cliente(db: Session, cliente: ClienteCreate) -> Cliente:
+    async def create_cliente(db: AsyncSession, cliente: ClienteCreate) -> Cliente:
         db_cliente = Cliente(
             email=cliente.email,
-            credentials=cliente.credentials
+            credentials=cliente.credentials,
+            token_expiry=GoogleAuthService.token_expiry(cliente.credentials)
         )
         try:
             db.add(db_cliente)
-            db.commit()
-            db.refresh(db_cliente)
+            await db.commit()
+            await db.refresh(db_cliente)
+            # Réplicas podem ainda não ter o cliente novo
+            shards.note_write(db_cliente.email)
             return db_cliente
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Erro ao criar cliente: {str(e)}"
             )
 
     @staticmethod
-    async def get_cliente_by_email(db: Session, email: str) -> Cliente:
-        cliente = db.query(Cliente).filter(Cliente.email == email).first()
+    async def import_clientes(rows: Iterable[Tuple[int, Union[dict, str]]]) -> ClienteImportResult:
+        """
+        Cria ou atualiza clientes em massa, em lotes de CLIENTE_IMPORT_BATCH_SIZE.
+
+        Cada lote é gravado com INSERT ... ON CONFLICT (email) DO UPDATE de
+        vários registros por comando, em uma transação por shard. Na
+        atualização, campos ausentes na linha mantêm o valor atual.
+        """
+        results: List[ClienteImportItem] = []
+        batch: List[Tuple[int, ClienteImportRow]] = []
+        for line, data in rows:
+            if isinstance(data, str):
+                results.append(ClienteImportItem(line=line, status="error", error=data))
+                continue
+            try:
+                batch.append((line, ClienteImportRow.model_validate(data)))
+            except ValidationError as e:
+                error = e.errors()[0]
+                results.append(ClienteImportItem(
+                    line=line,
+                    email=data.get("email") if isinstance(data.get("email"), str) else None,
+                    status="error",
+                    error=f"{'.'.join(map(str, error['loc']))}: {error['msg']}"
+                ))
+                continue
+            if len(batch) >= settings.CLIENTE_IMPORT_BATCH_SIZE:
+                results.extend(await ClienteService._upsert_batch(batch))
+                batch = []
+        if batch:
+            results.extend(await ClienteService._upsert_batch(batch))
+
+        results.sort(key=lambda item: item.line)
+        return ClienteImportResult(
+            created=sum(item.status == "created" for item in results),
+            updated=sum(item.status == "updated" for item in results),
+            failed=sum(item.status == "error" for item in results),
+            results=results
+        )
+
+    @staticmethod
+    async def _upsert_batch(batch: List[Tuple[int, ClienteImportRow]]) -> List[ClienteImportItem]:
+        # Um INSERT ... ON CONFLICT não pode alterar a mesma linha duas vezes:
+        # dentro do lote vale a última ocorrência de cada email
+        latest = {}
+        results = []
+        for line, row in batch:
+            if row.email in latest:
+                results.append(ClienteImportItem(
+                    line=latest[row.email][0],
+                    email=row.email,
+                    status="skipped",
+                    error="Email repetido no arquivo; vale a última ocorrência"
+                ))
+            latest[row.email] = (line, row)
+
+        partitions = shards.partition(latest)
+        outcomes = await asyncio.gather(*(
+            ClienteService._upsert_shard(index, [latest[email][1] for email in emails])
+            for index, emails in partitions.items()
+        ))
+        updated = []
+        for emails, outcome in zip(partitions.values(), outcomes):
+            for email in emails:
+                line = latest[email][0]
+                if isinstance(outcome, SQLAlchemyError):
+                    results.append(ClienteImportItem(
+                        line=line, email=email, status="error",
+                        error=f"Erro ao importar: {outcome.__class__.__name__}"
+                    ))
+                    continue
+                if outcome.get(email):
+                    shards.note_write(email)
+                else:
+                    credential_writer.discard(email)
+                    invalidate_service(email)
+                    updated.append(email)
+                results.append(ClienteImportItem(
+                    line=line, email=email, status="created" if outcome.get(email) else "updated"
+                ))
+        await cliente_cache.invalidate_many(updated)
+        return results
+
+    @staticmethod
+    @timed("cliente.import_shard")
+    async def _upsert_shard(index: int, rows: List[ClienteImportRow]) -> Union[Dict[str, bool], SQLAlchemyError]:
+        """Grava as linhas de um shard; retorna email -> criado, ou o erro"""
+        # Linhas agrupadas pelos campos informados: cada grupo usa um comando
+        # fixo (compilado uma vez e reaproveitado pelo cache do SQLAlchemy),
+        # executado em lotes de vários VALUES pelo "insertmanyvalues"
+        groups = {}
+        for row in rows:
+            fields = tuple(sorted(row.model_fields_set - {"email"}))
+            params = row.model_dump(include={"email", *fields})
+            if "credentials" in fields:
+                fields += ("token_expiry",)
+                params["token_expiry"] = GoogleAuthService.token_expiry(row.credentials)
+            groups.setdefault(fields, []).append(params)
+
+        async with shards.sessionmakers()[index]() as db:
+            try:
+                inserted = {}
+                for fields, params in groups.items():
+                    result = await db.execute(_upsert_statement(fields), params)
+                    inserted.update(result.tuples().all())
+                await db.commit()
+                return inserted
+            except SQLAlchemyError as e:
+                await db.rollback()
+                return e
+
+    @staticmethod
+    async def get_cliente_by_email(db: AsyncSession, email: str) -> Cliente:
+        result = await db.execute(select(Cliente).where(Cliente.email == email))
+        cliente = result.scalars().first()
         if not cliente:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -35,37 +246,145 @@ class ClienteService:
         return cliente
 
     @staticmethod
-    async def list_clientes(db: Session, skip: int = 0, limit: int = 100) -> List[Cliente]:
-        return db.query(Cliente).offset(skip).limit(limit).all()
+    async def get_clientes_by_emails(emails: List[str]) -> Dict[str, Cliente]:
+        """
+        Busca vários clientes com uma consulta por shard (em paralelo); emails
+        ausentes ficam fora do dicionário.
+        """
+        async def lookup(index: int, group: List[str]) -> List[Cliente]:
+            async with shards.read_sessionmaker(index, group)() as db:
+                result = await db.execute(_LOOKUP_QUERY, {"emails": group})
+                return list(result.scalars())
+
+        found = await asyncio.gather(*(
+            lookup(index, group) for index, group in shards.partition(emails).items()
+        ))
+        return {cliente.email: cliente for clientes in found for cliente in clientes}
+
+    @staticmethod
+    async def list_clientes(cursor: Optional[str] = None, limit: int = 100) -> Tuple[List[Cliente], Optional[str]]:
+        """
+        Lista os clientes em ordem de email, paginando por chave.
+
+        Retorna a página e o cursor da próxima (None na última). Cada página
+        é uma busca no índice único de email, qualquer que seja a
+        profundidade; com sharding, cada shard devolve até limit + 1 clientes
+        e as listas são intercaladas por email.
+        """
+        query = select(Cliente).order_by(Cliente.email).limit(limit + 1)
+        if cursor:
+            after = decode_cursor(cursor)
+            if not isinstance(after, str):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Cursor inválido"
+                )
+            query = query.where(Cliente.email > after)
+
+        async def page(maker) -> List[Cliente]:
+            async with maker() as db:
+                return list((await db.execute(query)).scalars().all())
+
+        pages = await asyncio.gather(*(page(maker) for maker in shards.read_sessionmakers()))
+        clientes = list(heapq.merge(*pages, key=lambda cliente: cliente.email))[:limit + 1]
+        if len(clientes) <= limit:
+            return clientes, None
+        clientes = clientes[:limit]
+        return clientes, encode_cursor(clientes[-1].email)
 
     @staticmethod
-    async def update_cliente(db: Session, email: str, cliente: ClienteUpdate) -> Cliente:
+    async def list_expiring(before: datetime, batch_size: int = 1000) -> AsyncIterator[Tuple[str, datetime]]:
+        """
+        Percorre (email, token_expiry) dos clientes cujo token expira antes de
+        `before`, do mais urgente ao menos urgente.
+
+        É uma varredura de intervalo no índice de token_expiry de cada shard;
+        clientes sem expiração conhecida (NULL) não aparecem.
+        """
+        query = (
+            select(Cliente.email, Cliente.token_expiry)
+            .where(Cliente.token_expiry < before)
+            .order_by(Cliente.token_expiry)
+            .execution_options(yield_per=batch_size)
+        )
+        rows = merge_sorted(
+            [_stream_rows(maker, query) for maker in shards.read_sessionmakers()],
+            key=lambda row: row[1]
+        )
+        try:
+            async for email, token_expiry in rows:
+                yield email, token_expiry
+        finally:
+            await rows.aclose()
+
+    @staticmethod
+    async def export_clientes(batch_size: int = 1000) -> AsyncIterator[dict]:
+        """
+        Percorre todos os clientes em ordem de email com um cursor no servidor
+        por shard, intercalando os shards por email.
+
+        Só as colunas de EXPORT_COLUMNS são lidas; as credenciais ficam de fora.
+        """
+        query = (
+            select(*EXPORT_COLUMNS)
+            .order_by(Cliente.email)
+            .execution_options(yield_per=batch_size)
+        )
+        rows = merge_sorted(
+            [_stream_rows(maker, query) for maker in shards.read_sessionmakers()],
+            key=lambda row: row.email
+        )
+        try:
+            async for row in rows:
+                yield dict(row._mapping)
+        finally:
+            await rows.aclose()
+
+    @staticmethod
+    async def update_cliente(db: AsyncSession, email: str, cliente: ClienteUpdate) -> Cliente:
         db_cliente = await ClienteService.get_cliente_by_email(db, email)
         
         update_data = cliente.model_dump(exclude_unset=True)
+        if "email" in update_data and shards.index_for(update_data["email"]) != shards.index_for(email):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="O novo email pertence a outro shard; recrie o cliente com o novo email"
+            )
         for field, value in update_data.items():
             setattr(db_cliente, field, value)
+        if 'credentials' in update_data:
+            db_cliente.token_expiry = GoogleAuthService.token_expiry(db_cliente.credentials)
         
         db_cliente.updated_at = datetime.utcnow()
         try:
-            db.commit()
-            db.refresh(db_cliente)
+            await db.commit()
+            # Uma renovação ainda na fila não pode sobrescrever esta alteração;
+            # só depois do commit, para não perdê-la se ele falhar
+            credential_writer.discard(email)
+            await db.refresh(db_cliente)
+            invalidate_service(email)
+            await cliente_cache.invalidate(email)
+            if db_cliente.email != email:
+                shards.note_write(db_cliente.email)
             return db_cliente
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Erro ao atualizar cliente: {str(e)}"
             )
 
     @staticmethod
-    async def delete_cliente(db: Session, email: str) -> None:
+    async def delete_cliente(db: AsyncSession, email: str) -> None:
         db_cliente = await ClienteService.get_cliente_by_email(db, email)
         try:
-            db.delete(db_cliente)
-            db.commit()
+            await db.delete(db_cliente)
+            await db.commit()
+            credential_writer.discard(email)
+            invalidate_service(email)
+            await cliente_cache.invalidate(email)
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Erro ao deletar cliente: {str(e)}"
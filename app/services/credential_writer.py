@@ -0,0 +1,193 @@
+import asyncio
+import logging
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+from sqlalchemy import update, bindparam, func, String
+from app.api.models import Cliente
+from app.core.config import settings
+from app.core.metrics import timed
+from app.core.sharding import shards
+from app.services.google_auth import GoogleAuthService
+
+logger = logging.getLogger(__name__)
+
+_table = Cliente.__table__
+
+# Executado como executemany: um único comando para o lote inteiro. Só grava
+# se o banco ainda tem o token de onde a renovação partiu: se o cliente foi
+# reautorizado ou alterado entretanto (em qualquer worker), a linha não casa
+# e as credenciais renovadas, já obsoletas, são descartadas
+_UPDATE_CREDENTIALS = (
+    update(_table)
+    .where(
+        _table.c.email == bindparam("b_email"),
+        func.coalesce(_table.c.credentials["token"].as_string(), "")
+        == bindparam("b_base_token", type_=String)
+    )
+    .values(
+        credentials=bindparam("b_credentials", type_=_table.c.credentials.type),
+        token_expiry=bindparam("b_token_expiry", type_=_table.c.token_expiry.type),
+        updated_at=func.current_timestamp()
+    )
+)
+
+class _PendingWrite(NamedTuple):
+    credentials: dict
+    # Token que o banco tem enquanto esta gravação não acontece
+    base_token: str
+
+class CredentialWriter:
+    """
+    Fila write-behind para credenciais renovadas.
+
+    A renovação entrega as novas credenciais com submit e segue sem esperar o
+    banco. Atualizações do mesmo cliente se fundem (vale a última) e são
+    gravadas em lote a cada CREDENTIAL_WRITE_INTERVAL segundos, ou antes
+    quando a fila chega a CREDENTIAL_WRITE_BATCH_SIZE clientes. stop() grava
+    o que restar.
+
+    pending() só enxerga a fila deste processo: outro worker lê do banco as
+    credenciais anteriores até o flush. Com CACHE_ENCRYPTION_KEY configurada,
+    cliente_cache.update_credentials publica as novas no cache compartilhado e
+    os demais workers as recebem por lá.
+    """
+
+    def __init__(self):
+        self._pending: Dict[str, _PendingWrite] = {}
+        # Lote sendo gravado: continua visível em pending() até o commit
+        self._writing: Dict[str, _PendingWrite] = {}
+        # Descartados durante a gravação do lote: não voltam para a fila
+        self._discarded: Set[str] = set()
+        self._wake = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.submitted = 0
+        self.coalesced = 0
+        self.written = 0
+        self.flushes = 0
+        self.failures = 0
+
+    def submit(self, email: str, credentials: dict, previous: Optional[dict] = None) -> None:
+        """Enfileira credentials, renovadas a partir de previous"""
+        self.submitted += 1
+        queued = self._pending.get(email)
+        if queued is not None:
+            # O banco ainda tem o token anterior à primeira renovação da fila
+            self.coalesced += 1
+            base_token = queued.base_token
+        else:
+            base_token = ((previous or {}).get("token")) or ""
+        self._pending[email] = _PendingWrite(credentials, base_token)
+        if len(self._pending) >= settings.CREDENTIAL_WRITE_BATCH_SIZE:
+            self._wake.set()
+
+    def pending(self, email: str) -> Optional[dict]:
+        """Credenciais ainda não gravadas no banco, se houver"""
+        queued = self._pending.get(email) or self._writing.get(email)
+        return queued.credentials if queued else None
+
+    def discard(self, email: str) -> None:
+        """Descarta a gravação pendente: o cliente foi alterado por outro caminho"""
+        self._pending.pop(email, None)
+        if self._writing.pop(email, None) is not None:
+            # O UPDATE já enviado não casa com o novo token; só falta não
+            # recolocá-lo na fila se o lote falhar
+            self._discarded.add(email)
+
+    async def flush(self) -> int:
+        """Grava a fila agora. Retorna quantos clientes foram atualizados"""
+        async with self._lock:
+            if not self._pending:
+                return 0
+            self._writing, self._pending = self._pending, {}
+            batch = dict(self._writing)
+            try:
+                partitions = shards.partition(batch)
+                outcomes = await asyncio.gather(
+                    *(self._write(index, [(email, batch[email]) for email in emails]) for index, emails in partitions.items()),
+                    return_exceptions=True
+                )
+                written = 0
+                for emails, outcome in zip(partitions.values(), outcomes):
+                    if isinstance(outcome, BaseException):
+                        self.failures += 1
+                        logger.error(
+                            "Falha ao gravar %d credenciais; nova tentativa no próximo ciclo",
+                            len(emails), exc_info=outcome
+                        )
+                        self._requeue(emails, batch)
+                    else:
+                        written += len(emails)
+            except asyncio.CancelledError:
+                # Não se sabe o que chegou ao banco; regravar é seguro, porque o
+                # UPDATE de um lote já gravado não casa mais com o token base
+                self._requeue(list(batch), batch)
+                raise
+            finally:
+                self._writing = {}
+                self._discarded = set()
+            self.flushes += 1
+            self.written += written
+            return written
+
+    def _requeue(self, emails: List[str], batch: Dict[str, _PendingWrite]) -> None:
+        """Devolve à fila as gravações de um lote que não foi gravado"""
+        for email in emails:
+            if email in self._discarded:
+                continue
+            newer = self._pending.get(email)
+            if newer is None:
+                self._pending[email] = batch[email]
+            else:
+                # Mantém o que chegou depois do início do flush, que é mais
+                # novo, mas o banco continua com o token antigo
+                self._pending[email] = newer._replace(base_token=batch[email].base_token)
+
+    @timed("credentials.write")
+    async def _write(self, index: int, writes: List[Tuple[str, _PendingWrite]]) -> None:
+        async with shards.sessionmakers()[index]() as db:
+            await db.execute(_UPDATE_CREDENTIALS, [
+                {
+                    "b_email": email,
+                    "b_base_token": write.base_token,
+                    "b_credentials": write.credentials,
+                    "b_token_expiry": GoogleAuthService.token_expiry(write.credentials)
+                }
+                for email, write in writes
+            ])
+            await db.commit()
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), settings.CREDENTIAL_WRITE_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            # Sem cancelar: um flush em andamento termina antes de o loop sair
+            self._stopping = True
+            self._wake.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+            "written": self.written,
+            "flushes": self.flushes,
+            "failures": self.failures
+        }
+
+credential_writer = CredentialWriter()
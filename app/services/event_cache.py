@@ -0,0 +1,203 @@
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Awaitable, Callable, Dict, List, Set, Tuple
+from app.core.cache import LRUCache, get_cache_backend, register_invalidation_handler
+from app.core.metrics import register_cache_stats
+from app.core.config import settings
+from app.services.google_calendar import event_bounds
+
+logger = logging.getLogger(__name__)
+
+# (email, primeiro dia, dia seguinte ao último)
+CacheKey = Tuple[str, date, date]
+
+class EventCache:
+    """
+    Cache em memória das agendas retornadas por list_events.
+
+    As entradas valem por EVENT_CACHE_TTL segundos. Com
+    EVENT_CACHE_STALE_WHILE_REVALIDATE, uma entrada vencida (até
+    EVENT_CACHE_STALE_TTL segundos além do TTL) é devolvida imediatamente
+    enquanto uma atualização roda em background.
+
+    As agendas ficam só no processo, mas as invalidações são repassadas aos
+    outros workers pelo backend compartilhado; lá elas derrubam todas as
+    entradas do cliente.
+
+    A idade das entradas é verificada aqui, não pelo LRUCache: por isso as
+    leituras usam peek e os acertos, acertos vencidos e faltas são contados
+    nesta classe.
+    """
+
+    NAMESPACE = "events"
+
+    def __init__(self):
+        self._entries = LRUCache(maxsize=settings.EVENT_CACHE_MAX_ENTRIES)
+        self._keys_by_email: Dict[str, Set[CacheKey]] = defaultdict(set)
+        # Incrementada a cada invalidação: resultados buscados antes dela são
+        # descartados. Só existe enquanto há busca do cliente em andamento
+        self._generation: Dict[str, int] = {}
+        self._fetching: Dict[str, int] = defaultdict(int)
+        self._loading: Dict[CacheKey, asyncio.Task] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.refreshes = 0
+        register_invalidation_handler(self.NAMESPACE, self._drop_email)
+        register_cache_stats(self.NAMESPACE, self.stats)
+
+    async def get_or_fetch(
+        self,
+        email: str,
+        start: date,
+        end: date,
+        fetch: Callable[[], Awaitable[List[dict]]]
+    ) -> List[dict]:
+        key = (email, start, end)
+        entry = self._entries.peek(key)
+        if entry is not None:
+            events, fetched_at = entry
+            age = time.monotonic() - fetched_at
+            if age < settings.EVENT_CACHE_TTL:
+                self.hits += 1
+                self._entries.touch(key)
+                return events
+            if (
+                settings.EVENT_CACHE_STALE_WHILE_REVALIDATE
+                and age < settings.EVENT_CACHE_TTL + settings.EVENT_CACHE_STALE_TTL
+            ):
+                self.stale_hits += 1
+                if key not in self._loading:
+                    self.refreshes += 1
+                    self._load(key, fetch)
+                return events
+            # Velha demais até para servir vencida
+            self._entries.pop(key)
+            self._keys_by_email.get(email, set()).discard(key)
+            self.expirations += 1
+        self.misses += 1
+        # Requisições simultâneas pela mesma chave compartilham uma única busca
+        return await asyncio.shield(self._load(key, fetch))
+
+    def _load(self, key: CacheKey, fetch: Callable[[], Awaitable[List[dict]]]) -> asyncio.Task:
+        task = self._loading.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch(key, fetch))
+            self._loading[key] = task
+            task.add_done_callback(lambda t: self._on_loaded(key, t))
+        return task
+
+    async def _fetch(self, key: CacheKey, fetch: Callable[[], Awaitable[List[dict]]]) -> List[dict]:
+        email = key[0]
+        generation = self._generation.setdefault(email, 0)
+        self._fetching[email] += 1
+        try:
+            events = await fetch()
+        finally:
+            self._fetching[email] -= 1
+            current = self._generation[email]
+            if not self._fetching[email]:
+                del self._fetching[email]
+                del self._generation[email]
+        if current == generation:
+            self._entries.set(key, (events, time.monotonic()))
+            keys = self._keys_by_email[email]
+            # descarta chaves já removidas pelo LRU
+            keys.intersection_update([k for k in keys if k in self._entries])
+            keys.add(key)
+            if len(self._keys_by_email) > len(self._entries):
+                self._prune_keys()
+        return events
+
+    def _prune_keys(self) -> None:
+        """Remove do índice por cliente as chaves que o LRU já descartou"""
+        for email, keys in list(self._keys_by_email.items()):
+            keys.intersection_update([k for k in keys if k in self._entries])
+            if not keys:
+                del self._keys_by_email[email]
+
+    def _on_loaded(self, key: CacheKey, task: asyncio.Task) -> None:
+        if self._loading.get(key) is task:
+            del self._loading[key]
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Falha ao buscar agenda %s: %s", key, task.exception())
+
+    def _bump_generation(self, email: str) -> None:
+        if email in self._generation:
+            self._generation[email] += 1
+        # Buscas iniciadas antes da escrita não devem ser reaproveitadas
+        for key in [k for k in self._loading if k[0] == email]:
+            del self._loading[key]
+
+    async def invalidate_days(self, email: str, first_day: date, last_day: date) -> None:
+        """Remove as entradas do cliente que cobrem algum dia em [first_day, last_day]"""
+        self._invalidate_days(email, first_day, last_day)
+        await get_cache_backend().invalidate(self.NAMESPACE, email)
+
+    def _invalidate_days(self, email: str, first_day: date, last_day: date) -> None:
+        self._bump_generation(email)
+        keys = self._keys_by_email.get(email, set())
+        for key in [k for k in keys if k[1] <= last_day and k[2] > first_day]:
+            self._entries.pop(key)
+            keys.discard(key)
+            self.invalidations += 1
+        if not keys:
+            self._keys_by_email.pop(email, None)
+
+    async def invalidate_event(self, email: str, event: dict) -> None:
+        """Invalida os dias ocupados por um evento criado ou alterado"""
+        await self.invalidate_events(email, [event])
+
+    async def invalidate_events(self, email: str, events: List[dict]) -> None:
+        for event in events:
+            start, end = event_bounds(event)
+            last = max(end - timedelta(microseconds=1), start)
+            self._invalidate_days(email, start.date(), last.date())
+        # Uma única mensagem para os outros workers, qualquer que seja o lote
+        await get_cache_backend().invalidate(self.NAMESPACE, email)
+
+    async def invalidate_event_id(self, email: str, event_id: str) -> None:
+        """Invalida as entradas do cliente que contêm o evento removido"""
+        await self.invalidate_event_ids(email, [event_id])
+
+    async def invalidate_event_ids(self, email: str, event_ids: List[str]) -> None:
+        for event_id in event_ids:
+            self._invalidate_event_id(email, event_id)
+        await get_cache_backend().invalidate(self.NAMESPACE, email)
+
+    def _invalidate_event_id(self, email: str, event_id: str) -> None:
+        self._bump_generation(email)
+        keys = self._keys_by_email.get(email, set())
+        for key in list(keys):
+            entry = self._entries.peek(key)
+            if entry is None:
+                keys.discard(key)
+            elif any(event.get('id') == event_id for event in entry[0]):
+                self._entries.pop(key)
+                keys.discard(key)
+                self.invalidations += 1
+        if not keys:
+            self._keys_by_email.pop(email, None)
+
+    def _drop_email(self, email: str) -> None:
+        self._invalidate_days(email, date.min, date.max)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            **self._entries.stats(),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "expirations": self.expirations,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "refreshes": self.refreshes
+        }
+
+event_cache = EventCache()
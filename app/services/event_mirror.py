@@ -0,0 +1,238 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, List, Set, Tuple
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from app.api.models import CalendarEvent, CalendarSyncState
+from app.core.config import settings
+from app.core.metrics import timed
+from app.services.google_calendar import GoogleCalendarService, SyncTokenExpired, event_bounds, as_utc
+
+logger = logging.getLogger(__name__)
+
+# Sincronizações em andamento por cliente (uma por vez). Os ids são
+# sequenciais por shard, então a chave inclui o banco da sessão.
+_inflight: Dict[Tuple[AsyncEngine, int], asyncio.Task] = {}
+# Chaves de _inflight cuja tarefa é uma sincronização completa
+_full_inflight: Set[Tuple[AsyncEngine, int]] = set()
+
+class EventMirrorService:
+    """
+    Mantém uma cópia local dos eventos de cada cliente, atualizada com a
+    sincronização incremental do Google (syncToken), e responde consultas
+    por período a partir do índice (cliente_id, start, end).
+
+    A sincronização completa (a primeira, ou depois de um syncToken expirado)
+    traz o histórico inteiro da agenda e roda sempre em background; até ela
+    terminar, ensure_fresh retorna False e as consultas vão direto ao Google.
+    """
+
+    @staticmethod
+    @timed("mirror.sync")
+    async def sync(db: AsyncSession, cliente_id: int, service: GoogleCalendarService, full: bool = True) -> bool:
+        """
+        Aplica as alterações desde o último syncToken. Com full=False, um
+        syncToken expirado só marca o cliente como não sincronizado e retorna
+        False, sem fazer a sincronização completa.
+        """
+        state = await db.get(CalendarSyncState, cliente_id)
+        if state is None:
+            state = CalendarSyncState(cliente_id=cliente_id)
+            db.add(state)
+
+        try:
+            items, next_token = await service.list_changes(state.sync_token)
+        except SyncTokenExpired:
+            state.sync_token = None
+            if not full:
+                await db.commit()
+                return False
+            items, next_token = await service.list_changes()
+
+        if state.sync_token is None:
+            # Sincronização completa: substitui o espelho inteiro
+            await db.execute(delete(CalendarEvent).where(CalendarEvent.cliente_id == cliente_id))
+
+        await EventMirrorService._apply(db, cliente_id, items)
+        state.sync_token = next_token
+        state.synced_at = datetime.now(timezone.utc)
+        await db.commit()
+        return True
+
+    @staticmethod
+    async def ensure_fresh(db: AsyncSession, cliente_id: int, service: GoogleCalendarService) -> bool:
+        """
+        Sincroniza o cliente se o espelho estiver mais velho que
+        CALENDAR_MIRROR_MAX_STALENESS. Retorna False se o espelho ainda não
+        pode responder (sincronização completa em background).
+        """
+        unsynced, stale = await EventMirrorService.sync_pending(db, [cliente_id])
+        return await EventMirrorService.refresh(db.bind, cliente_id, service, cliente_id in unsynced, cliente_id in stale)
+
+    @staticmethod
+    async def sync_pending(db: AsyncSession, cliente_ids: List[int]) -> Tuple[Set[int], Set[int]]:
+        """
+        Entre os clientes (do shard de db), os que ainda não têm sincronização
+        completa e os sincronizados há mais de CALENDAR_MIRROR_MAX_STALENESS segundos
+        """
+        oldest = datetime.now(timezone.utc) - timedelta(seconds=settings.CALENDAR_MIRROR_MAX_STALENESS)
+        result = await db.execute(
+            select(CalendarSyncState.cliente_id, CalendarSyncState.sync_token, CalendarSyncState.synced_at)
+            .where(CalendarSyncState.cliente_id.in_(cliente_ids))
+        )
+        unsynced, stale = set(cliente_ids), set()
+        for cliente_id, sync_token, synced_at in result:
+            if sync_token is None:
+                continue
+            unsynced.discard(cliente_id)
+            if synced_at is None or as_utc(synced_at) <= oldest:
+                stale.add(cliente_id)
+        return unsynced, stale
+
+    @staticmethod
+    async def refresh(
+        bind: AsyncEngine, cliente_id: int, service: GoogleCalendarService, unsynced: bool, stale: bool
+    ) -> bool:
+        """Atualiza o espelho conforme sync_pending. Retorna False se ele ainda não pode responder"""
+        if (bind, cliente_id) in _full_inflight:
+            # Sincronização completa em background: não aguardá-la aqui
+            return False
+        if stale and not unsynced:
+            unsynced = not await asyncio.shield(EventMirrorService._sync_task(bind, cliente_id, service, full=False))
+        if unsynced:
+            EventMirrorService._sync_task(bind, cliente_id, service)
+            return False
+        return True
+
+    @staticmethod
+    def _sync_task(bind: AsyncEngine, cliente_id: int, service: GoogleCalendarService, full: bool = True) -> asyncio.Task:
+        """Tarefa de sincronização do cliente, compartilhada com a que já estiver em andamento"""
+        key = (bind, cliente_id)
+        task = _inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(EventMirrorService._sync(bind, cliente_id, service, full))
+            _inflight[key] = task
+            task.add_done_callback(lambda _: _inflight.pop(key, None))
+            if full:
+                _full_inflight.add(key)
+                task.add_done_callback(lambda _: _full_inflight.discard(key))
+                # Ninguém aguarda a sincronização completa: a falha só aparece no log
+                task.add_done_callback(_log_failure)
+        return task
+
+    @staticmethod
+    async def _sync(bind: AsyncEngine, cliente_id: int, service: GoogleCalendarService, full: bool) -> bool:
+        # Sessão própria (no mesmo shard): a tarefa é compartilhada entre
+        # requisições concorrentes
+        async with AsyncSession(bind=bind, autoflush=False, expire_on_commit=False) as db:
+            return await EventMirrorService.sync(db, cliente_id, service, full)
+
+    @staticmethod
+    async def list_events(db: AsyncSession, cliente_id: int, time_min: datetime, time_max: datetime) -> List[dict]:
+        """Eventos que se sobrepõem a [time_min, time_max), ordenados pelo início"""
+        result = await db.execute(
+            select(CalendarEvent.data)
+            .where(
+                CalendarEvent.cliente_id == cliente_id,
+                CalendarEvent.start < as_utc(time_max),
+                CalendarEvent.end > as_utc(time_min)
+            )
+            .order_by(CalendarEvent.start)
+        )
+        return result.scalars().all()
+
+    @staticmethod
+    async def list_events_many(
+        db: AsyncSession, cliente_ids: List[int], time_min: datetime, time_max: datetime
+    ) -> Dict[int, List[dict]]:
+        """Como list_events, para vários clientes do mesmo shard numa única consulta"""
+        result = await db.execute(
+            select(CalendarEvent.cliente_id, CalendarEvent.data)
+            .where(
+                CalendarEvent.cliente_id.in_(cliente_ids),
+                CalendarEvent.start < as_utc(time_max),
+                CalendarEvent.end > as_utc(time_min)
+            )
+            .order_by(CalendarEvent.cliente_id, CalendarEvent.start)
+        )
+        events: Dict[int, List[dict]] = {cliente_id: [] for cliente_id in cliente_ids}
+        for cliente_id, data in result:
+            events[cliente_id].append(data)
+        return events
+
+    @staticmethod
+    async def iter_events(
+        db: AsyncSession, cliente_id: int, time_min: datetime, time_max: datetime, batch_size: int = 500
+    ) -> AsyncIterator[List[dict]]:
+        """Como list_events, mas lê o resultado em lotes com cursor no servidor"""
+        result = await db.stream(
+            select(CalendarEvent.data)
+            .where(
+                CalendarEvent.cliente_id == cliente_id,
+                CalendarEvent.start < as_utc(time_max),
+                CalendarEvent.end > as_utc(time_min)
+            )
+            .order_by(CalendarEvent.start)
+            .execution_options(yield_per=batch_size)
+        )
+        async for partition in result.scalars().partitions():
+            yield partition
+
+    @staticmethod
+    async def store_event(db: AsyncSession, cliente_id: int, event: dict) -> None:
+        """Grava no espelho um evento criado pela API (write-through)"""
+        await EventMirrorService.store_events(db, cliente_id, [event])
+
+    @staticmethod
+    async def store_events(db: AsyncSession, cliente_id: int, events: List[dict]) -> None:
+        await EventMirrorService._apply(db, cliente_id, events)
+        await db.commit()
+
+    @staticmethod
+    async def remove_event(db: AsyncSession, cliente_id: int, google_id: str) -> None:
+        await EventMirrorService.remove_events(db, cliente_id, [google_id])
+
+    @staticmethod
+    async def remove_events(db: AsyncSession, cliente_id: int, google_ids: List[str]) -> None:
+        await db.execute(
+            delete(CalendarEvent).where(
+                CalendarEvent.cliente_id == cliente_id,
+                CalendarEvent.google_id.in_(google_ids)
+            )
+        )
+        await db.commit()
+
+    @staticmethod
+    async def _apply(db: AsyncSession, cliente_id: int, items: List[dict]) -> None:
+        if not items:
+            return
+
+        ids = [item['id'] for item in items]
+        result = await db.execute(
+            select(CalendarEvent).where(
+                CalendarEvent.cliente_id == cliente_id,
+                CalendarEvent.google_id.in_(ids)
+            )
+        )
+        existing = {event.google_id: event for event in result.scalars()}
+
+        for item in items:
+            event = existing.get(item['id'])
+            if item.get('status') == 'cancelled':
+                if event is not None:
+                    await db.delete(event)
+                continue
+
+            start, end = event_bounds(item)
+            if event is None:
+                event = CalendarEvent(cliente_id=cliente_id, google_id=item['id'])
+                db.add(event)
+                existing[item['id']] = event
+            event.start = start
+            event.end = end
+            event.data = item
+
+def _log_failure(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning("Falha na sincronização completa do espelho: %s", task.exception())
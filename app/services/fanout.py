@@ -0,0 +1,30 @@
+import asyncio
+from typing import Awaitable, Callable, Iterable, List, Optional, Tuple, TypeVar, Union
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+async def gather_bounded(
+    items: Iterable[T],
+    fn: Callable[[T], Awaitable[R]],
+    limit: int,
+    timeout: Optional[float] = None
+) -> List[Tuple[T, Union[R, BaseException]]]:
+    """
+    Executa `fn` para cada item com no máximo `limit` chamadas simultâneas.
+
+    Cada chamada tem seu próprio `timeout`. Falhas não interrompem as demais:
+    o resultado de cada item é o valor retornado ou a exceção lançada.
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(item: T) -> Union[R, BaseException]:
+        async with semaphore:
+            try:
+                return await asyncio.wait_for(fn(item), timeout)
+            except Exception as e:
+                return e
+
+    items = list(items)
+    results = await asyncio.gather(*(run(item) for item in items))
+    return list(zip(items, results))
@@ -0,0 +1,139 @@
+from datetime import datetime, time, timedelta, timezone
+from typing import Iterable, List, Sequence, Tuple
+from zoneinfo import ZoneInfo
+import numpy as np
+from app.core.metrics import timed
+
+# Intervalos são representados como segundos desde a época (UTC), int64
+
+def to_epoch(value: datetime) -> int:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+def from_epoch(value: int) -> datetime:
+    return datetime.fromtimestamp(int(value), tz=timezone.utc)
+
+def intervals_to_arrays(intervals: Iterable[Tuple[datetime, datetime]]) -> Tuple[np.ndarray, np.ndarray]:
+    pairs = [(to_epoch(start), to_epoch(end)) for start, end in intervals]
+    if not pairs:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    array = np.asarray(pairs, dtype=np.int64)
+    return array[:, 0], array[:, 1]
+
+def merge_intervals(starts: np.ndarray, ends: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """União de intervalos [start, end): ordena e funde os que se tocam ou se sobrepõem"""
+    if starts.size == 0:
+        return starts, ends
+    order = np.argsort(starts, kind="stable")
+    starts, ends = starts[order], ends[order]
+    running_end = np.maximum.accumulate(ends)
+    # Um novo bloco começa quando o início passa do maior fim visto até ali
+    new_block = np.empty(starts.size, dtype=bool)
+    new_block[0] = True
+    new_block[1:] = starts[1:] > running_end[:-1]
+    first = np.flatnonzero(new_block)
+    last = np.append(first[1:] - 1, starts.size - 1)
+    return starts[first], running_end[last]
+
+def subtract_intervals(
+    starts: np.ndarray, ends: np.ndarray,
+    busy_starts: np.ndarray, busy_ends: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Partes de [starts, ends) (disjuntos) que não estão ocupadas"""
+    if starts.size == 0 or busy_starts.size == 0:
+        return starts, ends
+    busy_starts, busy_ends = merge_intervals(busy_starts, busy_ends)
+
+    # Varredura: +1/-1 para janelas e ocupações; livre onde janela=1 e ocupação=0
+    points = np.concatenate([starts, ends, busy_starts, busy_ends])
+    window_delta = np.concatenate([
+        np.ones(starts.size, np.int64), -np.ones(ends.size, np.int64),
+        np.zeros(busy_starts.size * 2, np.int64)
+    ])
+    busy_delta = np.concatenate([
+        np.zeros(starts.size * 2, np.int64),
+        np.ones(busy_starts.size, np.int64), -np.ones(busy_ends.size, np.int64)
+    ])
+    order = np.argsort(points, kind="stable")
+    points = points[order]
+    windows = np.cumsum(window_delta[order])
+    busy = np.cumsum(busy_delta[order])
+
+    free = (windows > 0) & (busy == 0)
+    # Segmento i vai de points[i] a points[i + 1]
+    free_starts = points[:-1][free[:-1]]
+    free_ends = points[1:][free[:-1]]
+    keep = free_ends > free_starts
+    return merge_intervals(free_starts[keep], free_ends[keep])
+
+def working_windows(
+    range_start: datetime,
+    range_end: datetime,
+    tz: str,
+    work_start: time,
+    work_end: time,
+    weekdays: Sequence[int]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Janelas de expediente no fuso `tz`, recortadas ao período pedido"""
+    zone = ZoneInfo(tz)
+    first_day = range_start.astimezone(zone).date() if range_start.tzinfo else range_start.date()
+    last_day = range_end.astimezone(zone).date() if range_end.tzinfo else range_end.date()
+
+    days = [first_day + timedelta(days=n) for n in range((last_day - first_day).days + 1)]
+    days = [day for day in days if day.weekday() in weekdays]
+    # Conversão dia a dia para respeitar mudanças de horário de verão
+    starts = np.array([to_epoch(datetime.combine(day, work_start, zone)) for day in days], dtype=np.int64)
+    ends = np.array([to_epoch(datetime.combine(day, work_end, zone)) for day in days], dtype=np.int64)
+
+    starts = np.maximum(starts, to_epoch(range_start))
+    ends = np.minimum(ends, to_epoch(range_end))
+    keep = ends > starts
+    return starts[keep], ends[keep]
+
+@timed("free_slots.find")
+def find_free_slots(
+    busy: Sequence[Tuple[np.ndarray, np.ndarray]],
+    range_start: datetime,
+    range_end: datetime,
+    duration: timedelta,
+    tz: str,
+    work_start: time,
+    work_end: time,
+    weekdays: Sequence[int],
+    step: timedelta,
+    limit: int
+) -> List[Tuple[datetime, datetime]]:
+    """
+    Primeiros horários de `duration` livres para todos os calendários.
+
+    `busy` traz os intervalos ocupados de cada calendário. Os inícios são
+    alinhados a múltiplos de `step` e o resultado vem ordenado do mais cedo
+    para o mais tarde.
+    """
+    window_starts, window_ends = working_windows(range_start, range_end, tz, work_start, work_end, weekdays)
+    if busy:
+        busy_starts = np.concatenate([starts for starts, _ in busy])
+        busy_ends = np.concatenate([ends for _, ends in busy])
+    else:
+        busy_starts = busy_ends = np.empty(0, dtype=np.int64)
+    free_starts, free_ends = subtract_intervals(window_starts, window_ends, busy_starts, busy_ends)
+
+    duration_s = int(duration.total_seconds())
+    step_s = int(step.total_seconds())
+    # Primeiro início alinhado ao passo dentro de cada intervalo livre
+    aligned = -(-free_starts // step_s) * step_s
+    counts = np.where(
+        free_ends - aligned >= duration_s,
+        (free_ends - aligned - duration_s) // step_s + 1,
+        0
+    )
+    total = int(counts.sum())
+    if total == 0:
+        return []
+
+    # Expande cada intervalo livre em seus horários candidatos
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    slot_starts = np.repeat(aligned, counts) + offsets * step_s
+    slot_starts = slot_starts[:limit]
+    return [(from_epoch(start), from_epoch(start + duration_s)) for start in slot_starts]
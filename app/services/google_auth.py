@@ -1,27 +1,28 @@
-from google_auth_oauthlib.flow import Flow
-from google.oauth2.credentials import Credentials
-from fastapi import HTTPException
+from fastapi import HTTPException, status
+import asyncio
+import httpx
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Optional
 from app.core.config import settings
+from app.core.http import get_http_client
+from app.core.metrics import GOOGLE_RETRIES, observe_google_call
+from app.services.google_quota import google_limiter, retry_after, backoff_delay
 import json
+import time
+
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
 
 SCOPES = ['https://www.googleapis.com/auth/calendar']
+TOKEN_URI = "https://oauth2.googleapis.com/token"
+# Respostas do endpoint de token que valem nova tentativa
+RETRIABLE_TOKEN_STATUS = {429, 500, 502, 503, 504}
 
 class GoogleAuthService:
     @staticmethod
     def create_authorization_url() -> tuple[str, str]:
         """Cria URL de autorização e state"""
-        flow = Flow.from_client_config(
-            {
-                "web": {
-                    "client_id": settings.GOOGLE_CALENDAR_CLIENT_ID,
-                    "client_secret": settings.GOOGLE_CALENDAR_CLIENT_SECRET,
-                    "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                    "token_uri": "https://oauth2.googleapis.com/token",
-                    "redirect_uri": settings.GOOGLE_CALENDAR_REDIRECT_URI,
-                }
-            },
-            scopes=SCOPES
-        )
+        flow = _flow()
         
         authorization_url, state = flow.authorization_url(
             access_type='offline',
@@ -33,18 +34,7 @@ class GoogleAuthService:
     @staticmethod
     def get_credentials_from_code(code: str) -> dict:
         """Obtém credenciais a partir do código de autorização"""
-        flow = Flow.from_client_config(
-            {
-                "web": {
-                    "client_id": settings.GOOGLE_CALENDAR_CLIENT_ID,
-                    "client_secret": settings.GOOGLE_CALENDAR_CLIENT_SECRET,
-                    "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                    "token_uri": "https://oauth2.googleapis.com/token",
-                    "redirect_uri": settings.GOOGLE_CALENDAR_REDIRECT_URI,
-                }
-            },
-            scopes=SCOPES
-        )
+        flow = _flow()
         
         flow.fetch_token(code=code)
         credentials = flow.credentials
@@ -55,11 +45,12 @@ class GoogleAuthService:
             "token_uri": credentials.token_uri,
             "client_id": credentials.client_id,
             "client_secret": credentials.client_secret,
-            "scopes": credentials.scopes
+            "scopes": credentials.scopes,
+            "expiry": _format_expiry(credentials.expiry)
         }
 
     @staticmethod
-    def credentials_to_dict(credentials: Credentials) -> dict:
+    def credentials_to_dict(credentials: "Credentials") -> dict:
         """Converte objeto Credentials para dicionário"""
         return {
             'token': credentials.token,
@@ -67,5 +58,114 @@ class GoogleAuthService:
             'token_uri': credentials.token_uri,
             'client_id': credentials.client_id,
             'client_secret': credentials.client_secret,
-            'scopes': credentials.scopes
-        } 
\ No newline at end of file
+            'scopes': credentials.scopes,
+            'expiry': _format_expiry(credentials.expiry)
+        }
+
+    @staticmethod
+    def get_expiry(credentials: dict) -> Optional[datetime]:
+        """Retorna a expiração do access token (UTC) ou None se desconhecida"""
+        value = credentials.get('expiry')
+        if not value:
+            return None
+        expiry = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if expiry.tzinfo is None:
+            expiry = expiry.replace(tzinfo=timezone.utc)
+        return expiry
+
+    @staticmethod
+    def token_expiry(credentials: Optional[dict]) -> Optional[datetime]:
+        """Valor da coluna Cliente.token_expiry: como get_expiry, mas None se inválida"""
+        if not credentials:
+            return None
+        try:
+            return GoogleAuthService.get_expiry(credentials)
+        except (TypeError, ValueError, AttributeError):
+            return None
+
+    @staticmethod
+    def needs_refresh(credentials: dict, margin: float = 0) -> bool:
+        """Indica se o token expira nos próximos `margin` segundos"""
+        if not credentials.get('refresh_token'):
+            return False
+        expiry = GoogleAuthService.get_expiry(credentials)
+        if expiry is None:
+            return True
+        return expiry - timedelta(seconds=margin) <= datetime.now(timezone.utc)
+
+    @staticmethod
+    async def refresh_credentials(credentials: dict) -> dict:
+        """
+        Renova o access token usando o refresh token (sem bloquear o loop).
+
+        Passa pelo limitador do projeto e repete a chamada, com backoff, em
+        limites de taxa, 5xx e falhas de rede (até GOOGLE_MAX_RETRIES vezes).
+        """
+        attempt = 0
+        while True:
+            await google_limiter.acquire(None)
+            start = time.perf_counter()
+            try:
+                response = await get_http_client().post(
+                    credentials.get('token_uri') or TOKEN_URI,
+                    data={
+                        'grant_type': 'refresh_token',
+                        'refresh_token': credentials.get('refresh_token'),
+                        'client_id': credentials.get('client_id'),
+                        'client_secret': credentials.get('client_secret')
+                    }
+                )
+            except httpx.HTTPError:
+                observe_google_call('token.refresh', 'error', time.perf_counter() - start)
+                if attempt >= settings.GOOGLE_MAX_RETRIES:
+                    raise
+                delay = backoff_delay(attempt)
+            else:
+                observe_google_call('token.refresh', str(response.status_code), time.perf_counter() - start)
+                if response.status_code not in RETRIABLE_TOKEN_STATUS or attempt >= settings.GOOGLE_MAX_RETRIES:
+                    break
+                delay = backoff_delay(attempt, retry_after=retry_after(response))
+            GOOGLE_RETRIES.labels('token.refresh').inc()
+            attempt += 1
+            await asyncio.sleep(delay)
+
+        if response.is_error:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail=f"Falha ao renovar token do Google: {response.text}"
+            )
+
+        payload = response.json()
+        expiry = datetime.now(timezone.utc) + timedelta(seconds=payload.get('expires_in', 3600))
+        return {
+            **credentials,
+            'token': payload['access_token'],
+            # O Google só devolve um novo refresh token em casos específicos
+            'refresh_token': payload.get('refresh_token', credentials.get('refresh_token')),
+            'expiry': _format_expiry(expiry)
+        }
+
+def _flow():
+    # Import tardio: google_auth_oauthlib (e requests/oauthlib) só é carregado
+    # no fluxo de autorização, não na inicialização de todo worker
+    from google_auth_oauthlib.flow import Flow
+    return Flow.from_client_config(
+        {
+            "web": {
+                "client_id": settings.GOOGLE_CALENDAR_CLIENT_ID,
+                "client_secret": settings.GOOGLE_CALENDAR_CLIENT_SECRET,
+                "auth_uri": "https://accounts.google.com/o/oauth2/auth",
+                "token_uri": "https://oauth2.googleapis.com/token",
+                "redirect_uri": settings.GOOGLE_CALENDAR_REDIRECT_URI,
+            }
+        },
+        scopes=SCOPES
+    )
+
+def _format_expiry(expiry: Optional[datetime]) -> Optional[str]:
+    """Serializa a expiração em ISO 8601 UTC, como o google-auth"""
+    if expiry is None:
+        return None
+    if expiry.tzinfo is not None:
+        expiry = expiry.astimezone(timezone.utc).replace(tzinfo=None)
+    return expiry.isoformat() + 'Z' 
\ No newline at end of file
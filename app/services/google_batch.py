@@ -0,0 +1,81 @@
+import json
+import uuid
+from email.parser import BytesParser
+from email.policy import HTTP
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+class BatchRequest(NamedTuple):
+    method: str
+    path: str
+    body: Optional[dict] = None
+
+class BatchResponse(NamedTuple):
+    status: int
+    body: Optional[dict]
+
+def encode_batch(requests: List[BatchRequest], headers: Dict[str, str]) -> Tuple[str, bytes]:
+    """
+    Monta o corpo multipart/mixed de uma requisição batch do Google.
+
+    Retorna o Content-Type (com o boundary) e o corpo. Cada parte recebe o
+    Content-ID <item-N>, onde N é a posição em `requests`.
+    """
+    boundary = f"batch_{uuid.uuid4().hex}"
+    lines = []
+    for index, request in enumerate(requests):
+        lines += [
+            f"--{boundary}",
+            "Content-Type: application/http",
+            f"Content-ID: <item-{index}>",
+            "",
+            f"{request.method} {request.path} HTTP/1.1",
+        ]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        if request.body is not None:
+            lines += ["Content-Type: application/json", "", json.dumps(request.body)]
+        else:
+            lines += [""]
+        lines.append("")
+    lines.append(f"--{boundary}--")
+    return f"multipart/mixed; boundary={boundary}", "\r\n".join(lines).encode()
+
+def decode_batch(content_type: str, content: bytes, size: int) -> List[Optional[BatchResponse]]:
+    """
+    Separa a resposta multipart/mixed em respostas individuais.
+
+    A lista tem `size` posições, na ordem das requisições; posições sem
+    resposta correspondente ficam None.
+    """
+    message = BytesParser(policy=HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode() + content
+    )
+    responses: List[Optional[BatchResponse]] = [None] * size
+    if not message.is_multipart():
+        return responses
+
+    for part in message.iter_parts():
+        content_id = (part.get("Content-ID") or "").strip("<>")
+        # O Google responde com Content-ID <response-item-N>
+        try:
+            index = int(content_id.rsplit("-", 1)[1])
+        except (IndexError, ValueError):
+            continue
+        if not 0 <= index < size:
+            continue
+        responses[index] = _parse_http_response(part.get_payload(decode=True) or b"")
+    return responses
+
+def _parse_http_response(raw: bytes) -> BatchResponse:
+    raw = raw.replace(b"\r\n", b"\n")
+    head, _, body = raw.partition(b"\n\n")
+    status_line = head.split(b"\n", 1)[0].decode()
+    try:
+        status = int(status_line.split()[1])
+    except (IndexError, ValueError):
+        status = 502
+    body = body.strip()
+    try:
+        payload = json.loads(body) if body else None
+    except ValueError:
+        payload = {"error": {"message": body.decode(errors="replace")}}
+    return BatchResponse(status, payload)
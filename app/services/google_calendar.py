@@ -1,83 +1,370 @@
-from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-from datetime import datetime, timedelta
-import os
-import pickle
-from typing import List, Dict
+from fastapi import HTTPException, status
+from datetime import datetime, date, timezone
+from urllib.parse import quote, urlparse
+from typing import AsyncIterator, List, Dict, Optional, Tuple
+import asyncio
+import math
+import time
+import httpx
 from app.core.config import settings
+from app.core.cache import LRUCache
+from app.core.http import get_http_client
+from app.core.metrics import GOOGLE_RATE_LIMITED, GOOGLE_RETRIES, observe_google_call, register_cache_stats
+from app.services.google_auth import GoogleAuthService
+from app.services.google_quota import (
+    RateLimited, google_limiter, rate_limit_scope, response_rate_limit_scope, retry_after, backoff_delay
+)
+from app.services.google_batch import BatchRequest, BatchResponse, encode_batch, decode_batch
+from app.services.fanout import gather_bounded
 
 SCOPES = ['https://www.googleapis.com/auth/calendar']
 
+# Status que valem nova tentativa (chamadas avulsas e itens de batch)
+RETRIABLE_STATUS = {429, 500, 502, 503, 504}
+# POSTs que podem ser repetidos após 5xx ou falha de rede (só consultas)
+IDEMPOTENT_POSTS = {'freebusy.query'}
+
+# Serviços prontos por email do cliente, reaproveitados entre requisições
+_service_cache = LRUCache(maxsize=settings.CALENDAR_SERVICE_CACHE_SIZE)
+register_cache_stats("calendar_service", _service_cache.stats)
+
+class SyncTokenExpired(Exception):
+    """O Google invalidou o sync token (410 Gone); é preciso uma sincronização completa"""
+
 class GoogleCalendarService:
-    def __init__(self, credentials_json: Dict):
+    def __init__(self, credentials_json: Dict, email: Optional[str] = None):
         """
-        Inicializa o serviço com as credenciais armazenadas no banco
+        Inicializa o serviço com as credenciais armazenadas no banco.
+
+        O token já deve estar válido: a renovação é feita pelo TokenRefresher.
+        `email` identifica o cliente no limitador de chamadas ao Google.
         """
-        credentials = Credentials(
-            token=credentials_json.get('token'),
-            refresh_token=credentials_json.get('refresh_token'),
-            token_uri=credentials_json.get('token_uri'),
-            client_id=credentials_json.get('client_id'),
-            client_secret=credentials_json.get('client_secret'),
-            scopes=credentials_json.get('scopes')
+        self.credentials = credentials_json
+        self.email = email
+
+    def matches(self, credentials_json: Dict) -> bool:
+        """Indica se o serviço foi construído com as credenciais informadas"""
+        return (
+            self.credentials.get('token') == credentials_json.get('token')
+            and self.credentials.get('refresh_token') == credentials_json.get('refresh_token')
         )
 
-        # Atualiza o token se necessário
-        if credentials.expired and credentials.refresh_token:
-            credentials.refresh(Request())
-            self.updated_credentials = credentials
-        else:
-            self.updated_credentials = None
-
-        self.service = build('calendar', 'v3', credentials=credentials)
-
-    def get_updated_credentials(self) -> Dict:
-        """Retorna as credenciais atualizadas se houver"""
-        if self.updated_credentials:
-            return {
-                'token': self.updated_credentials.token,
-                'refresh_token': self.updated_credentials.refresh_token,
-                'token_uri': self.updated_credentials.token_uri,
-                'client_id': self.updated_credentials.client_id,
-                'client_secret': self.updated_credentials.client_secret,
-                'scopes': self.updated_credentials.scopes
-            }
-        return None
+    async def _request(self, operation: str, method: str, path: str, **kwargs) -> httpx.Response:
+        """
+        Executa uma chamada à Calendar API pelo cliente HTTP compartilhado.
+
+        `operation` é o método da API (events.list, events.insert...) usado
+        nas métricas. A chamada passa pelo limitador (projeto e cliente) e é
+        repetida até GOOGLE_MAX_RETRIES vezes em limites de taxa e, se for
+        idempotente, em 5xx e falhas de rede.
+        """
+        idempotent = method != 'POST' or operation in IDEMPOTENT_POSTS
+        attempt = 0
+        while True:
+            await google_limiter.acquire(self.email)
+            start = time.perf_counter()
+            try:
+                response = await get_http_client().request(
+                    method,
+                    f"{settings.GOOGLE_CALENDAR_API_URL}{path}",
+                    headers={'Authorization': f"Bearer {self.credentials.get('token')}"},
+                    **kwargs
+                )
+            except httpx.HTTPError:
+                observe_google_call(operation, 'error', time.perf_counter() - start)
+                if not idempotent or attempt >= settings.GOOGLE_MAX_RETRIES:
+                    raise
+                delay = backoff_delay(attempt)
+            else:
+                observe_google_call(operation, str(response.status_code), time.perf_counter() - start)
+                if not response.is_error:
+                    return response
+                scope = response_rate_limit_scope(response)
+                if scope is not None:
+                    GOOGLE_RATE_LIMITED.labels(operation, scope).inc()
+                retriable = scope is not None or (idempotent and response.status_code in RETRIABLE_STATUS)
+                if not retriable or attempt >= settings.GOOGLE_MAX_RETRIES:
+                    _raise_for_status(response)
+                delay = backoff_delay(attempt, retry_after=retry_after(response))
+                if scope is not None:
+                    google_limiter.penalize(self.email, scope, delay)
+            GOOGLE_RETRIES.labels(operation).inc()
+            attempt += 1
+            await asyncio.sleep(delay)
 
     async def list_events(self, date: datetime) -> List[dict]:
         time_min = datetime.combine(date, datetime.min.time())
         time_max = datetime.combine(date, datetime.max.time())
         
-        events_result = self.service.events().list(
-            calendarId='primary',
-            timeMin=time_min.isoformat() + 'Z',
-            timeMax=time_max.isoformat() + 'Z',
-            singleEvents=True,
-            orderBy='startTime'
-        ).execute()
-        
-        return events_result.get('items', [])
+        return await self.list_range(time_min, time_max)
 
     async def create_event(self, event_data: dict) -> dict:
-        event = self.service.events().insert(
-            calendarId='primary',
-            body=event_data
-        ).execute()
-        return event
+        response = await self._request(
+            'events.insert',
+            'POST',
+            '/calendars/primary/events',
+            json=event_data
+        )
+        return response.json()
 
     async def delete_event(self, event_id: str):
-        self.service.events().delete(
-            calendarId='primary',
-            eventId=event_id
-        ).execute()
+        await self._request(
+            'events.delete',
+            'DELETE',
+            f"/calendars/primary/events/{quote(event_id, safe='')}"
+        )
 
     async def check_conflicts(self, start_time: datetime, end_time: datetime) -> List[dict]:
-        events_result = self.service.events().list(
-            calendarId='primary',
-            timeMin=start_time.isoformat() + 'Z',
-            timeMax=end_time.isoformat() + 'Z',
-            singleEvents=True
-        ).execute()
-        
-        return events_result.get('items', []) 
\ No newline at end of file
+        return await self.list_range(start_time, end_time)
+
+    async def batch_create_events(self, events: List[dict]) -> List[BatchResponse]:
+        """Cria vários eventos usando requisições batch; um resultado por evento"""
+        path = f"{_api_path()}/calendars/primary/events"
+        return await self._execute_batch([BatchRequest('POST', path, event) for event in events])
+
+    async def batch_delete_events(self, event_ids: List[str]) -> List[BatchResponse]:
+        """Remove vários eventos usando requisições batch; um resultado por evento"""
+        return await self._execute_batch([
+            BatchRequest('DELETE', f"{_api_path()}/calendars/primary/events/{quote(event_id, safe='')}")
+            for event_id in event_ids
+        ])
+
+    async def _execute_batch(self, requests: List[BatchRequest]) -> List[BatchResponse]:
+        """
+        Envia as chamadas em batches de até GOOGLE_BATCH_MAX_SIZE.
+
+        Só os itens que falharam com erro transitório são reenviados, até
+        GOOGLE_BATCH_MAX_RETRIES vezes: limites de taxa (o Google não executou
+        a chamada) e, para itens idempotentes, 5xx e falhas de rede. Inserções
+        com 5xx ou sem resposta não são repetidas, pois o evento pode ter sido
+        criado.
+
+        Cada item conta como uma chamada no limitador, como na cota do Google,
+        e os batches não passam da rajada dos buckets. Itens recusados pelo
+        limitador local voltam com 429 e retryAfter (segundos), sem nova
+        tentativa.
+        """
+        results: List[Optional[BatchResponse]] = [None] * len(requests)
+        pending = list(range(len(requests)))
+        size = min(settings.GOOGLE_BATCH_MAX_SIZE, google_limiter.max_cost() or settings.GOOGLE_BATCH_MAX_SIZE)
+
+        for attempt in range(settings.GOOGLE_BATCH_MAX_RETRIES + 1):
+            if attempt:
+                GOOGLE_RETRIES.labels('batch').inc(len(pending))
+                await asyncio.sleep(delay)
+
+            chunks = [pending[i:i + size] for i in range(0, len(pending), size)]
+            outcomes = await gather_bounded(
+                chunks,
+                lambda chunk: self._send_batch([requests[i] for i in chunk]),
+                limit=settings.GOOGLE_BATCH_CONCURRENCY
+            )
+
+            pending = []
+            scopes = set()
+            for chunk, outcome in outcomes:
+                if isinstance(outcome, RateLimited):
+                    throttled = BatchResponse(status.HTTP_429_TOO_MANY_REQUESTS, {'error': {
+                        'code': status.HTTP_429_TOO_MANY_REQUESTS,
+                        'message': outcome.detail,
+                        'retryAfter': outcome.retry_after
+                    }})
+                    for index in chunk:
+                        results[index] = throttled
+                    continue
+                if isinstance(outcome, BaseException):
+                    outcome = [BatchResponse(status.HTTP_502_BAD_GATEWAY, {'error': {'message': str(outcome)}})] * len(chunk)
+                for index, response in zip(chunk, outcome):
+                    if response is None:
+                        response = BatchResponse(status.HTTP_502_BAD_GATEWAY, {'error': {'message': 'Sem resposta no batch'}})
+                    results[index] = response
+                    scope = rate_limit_scope(response.status, response.body)
+                    if scope is not None:
+                        GOOGLE_RATE_LIMITED.labels('batch', scope).inc()
+                        scopes.add(scope)
+                    idempotent = requests[index].method != 'POST'
+                    if scope is not None or (idempotent and response.status in RETRIABLE_STATUS):
+                        pending.append(index)
+            if not pending:
+                break
+            delay = backoff_delay(attempt, base=settings.GOOGLE_BATCH_RETRY_BACKOFF)
+            for scope in scopes:
+                google_limiter.penalize(self.email, scope, delay)
+        return results
+
+    async def _send_batch(self, requests: List[BatchRequest]) -> List[Optional[BatchResponse]]:
+        content_type, body = encode_batch(
+            requests,
+            {'Authorization': f"Bearer {self.credentials.get('token')}"}
+        )
+        await google_limiter.acquire(self.email, cost=len(requests))
+        start = time.perf_counter()
+        try:
+            response = await get_http_client().post(
+                settings.GOOGLE_CALENDAR_BATCH_URL,
+                content=body,
+                headers={'Content-Type': content_type}
+            )
+        except httpx.HTTPError:
+            observe_google_call('batch', 'error', time.perf_counter() - start)
+            raise
+        observe_google_call('batch', str(response.status_code), time.perf_counter() - start)
+        if response.is_error:
+            # Falha do batch inteiro: todos os itens recebem o mesmo status
+            try:
+                payload = response.json()
+            except ValueError:
+                payload = {'error': {'message': response.text}}
+            return [BatchResponse(response.status_code, payload)] * len(requests)
+        return decode_batch(response.headers.get('Content-Type', ''), response.content, len(requests))
+
+    async def list_range(self, time_min: datetime, time_max: datetime) -> List[dict]:
+        """Lista todos os eventos que se sobrepõem ao período, seguindo a paginação"""
+        items = []
+        async for page in self.iter_range(time_min, time_max):
+            items.extend(page)
+        return items
+
+    async def iter_range(self, time_min: datetime, time_max: datetime) -> AsyncIterator[List[dict]]:
+        """Percorre os eventos do período página a página, à medida que chegam"""
+        params = {
+            'timeMin': as_utc(time_min).isoformat(),
+            'timeMax': as_utc(time_max).isoformat(),
+            'singleEvents': 'true',
+            'orderBy': 'startTime',
+            'maxResults': 2500
+        }
+        while True:
+            response = await self._request('events.list', 'GET', '/calendars/primary/events', params=params)
+            page = response.json()
+            yield page.get('items', [])
+            if not page.get('nextPageToken'):
+                return
+            params['pageToken'] = page['nextPageToken']
+
+    async def free_busy(self, time_min: datetime, time_max: datetime) -> List[Tuple[datetime, datetime]]:
+        """Intervalos ocupados do calendário principal no período (FreeBusy API)"""
+        response = await self._request('freebusy.query', 'POST', '/freeBusy', json={
+            'timeMin': as_utc(time_min).isoformat(),
+            'timeMax': as_utc(time_max).isoformat(),
+            'items': [{'id': 'primary'}]
+        })
+        calendar = response.json().get('calendars', {}).get('primary', {})
+        if calendar.get('errors'):
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail=f"Erro na API do Google Calendar: {calendar['errors']}"
+            )
+        return [
+            (_parse_event_time({'dateTime': busy['start']}), _parse_event_time({'dateTime': busy['end']}))
+            for busy in calendar.get('busy', [])
+        ]
+
+    async def list_changes(self, sync_token: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+        """
+        Lista os eventos alterados desde `sync_token` (ou todos, sem token).
+
+        Segue todas as páginas e retorna os itens e o próximo sync token.
+        Eventos removidos vêm com status 'cancelled'.
+        """
+        items = []
+        params = {'singleEvents': 'true', 'maxResults': 2500}
+        if sync_token:
+            params['syncToken'] = sync_token
+
+        while True:
+            try:
+                response = await self._request('events.sync', 'GET', '/calendars/primary/events', params=params)
+            except HTTPException as e:
+                if sync_token and e.status_code == status.HTTP_410_GONE:
+                    raise SyncTokenExpired() from e
+                raise
+            page = response.json()
+            items.extend(page.get('items', []))
+            if not page.get('nextPageToken'):
+                return items, page.get('nextSyncToken')
+            params['pageToken'] = page['nextPageToken']
+
+def get_service(email: str, credentials_json: Dict) -> GoogleCalendarService:
+    """
+    Retorna o serviço em cache do cliente ou constrói um novo.
+
+    A entrada é substituída quando as credenciais no banco mudaram ou o
+    token do serviço em cache expirou.
+    """
+    service = _service_cache.get(email)
+    if (
+        service is not None
+        and service.matches(credentials_json)
+        and not GoogleAuthService.needs_refresh(service.credentials)
+    ):
+        return service
+
+    service = GoogleCalendarService(credentials_json, email)
+    _service_cache.set(email, service)
+    return service
+
+def invalidate_service(email: str) -> None:
+    """Descarta o serviço em cache do cliente"""
+    _service_cache.pop(email)
+
+def _api_path() -> str:
+    """Caminho da Calendar API usado dentro das partes do batch (ex.: /calendar/v3)"""
+    return urlparse(settings.GOOGLE_CALENDAR_API_URL).path.rstrip('/')
+
+def batch_retry_after(responses: List[BatchResponse]) -> Optional[int]:
+    """Maior retryAfter entre os itens recusados pelo limitador local, se houver"""
+    waits = [
+        response.body['error']['retryAfter'] for response in responses
+        if isinstance((response.body or {}).get('error'), dict) and 'retryAfter' in response.body['error']
+    ]
+    return max(waits) if waits else None
+
+def batch_error_message(response: BatchResponse) -> str:
+    error = (response.body or {}).get('error')
+    if isinstance(error, dict):
+        return error.get('message', str(error))
+    return str(error or response.status)
+
+def as_utc(value: datetime) -> datetime:
+    """Datas sem fuso são tratadas como UTC, como na consulta ao Google"""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+def _parse_event_time(value: dict) -> datetime:
+    if 'dateTime' in value:
+        return as_utc(datetime.fromisoformat(value['dateTime'].replace('Z', '+00:00')))
+    # Eventos de dia inteiro só têm 'date'
+    day = date.fromisoformat(value['date'])
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+
+def event_bounds(event: dict) -> Tuple[datetime, datetime]:
+    """Início e fim (UTC) de um evento retornado pela Calendar API"""
+    return _parse_event_time(event['start']), _parse_event_time(event['end'])
+
+def _raise_for_status(response: httpx.Response):
+    """Converte erros da Calendar API em HTTPException"""
+    try:
+        error = response.json().get('error')
+    except ValueError:
+        error = None
+    if isinstance(error, dict):
+        message = error.get('message', response.text)
+    else:
+        message = error or response.text
+    # Erros 5xx do Google são falhas do upstream, não do nosso serviço;
+    # limites de taxa (429 ou 403 com motivo de cota) viram 429
+    status_code = response.status_code
+    headers = None
+    if status_code >= 500:
+        status_code = status.HTTP_502_BAD_GATEWAY
+    elif response_rate_limit_scope(response) is not None:
+        status_code = status.HTTP_429_TOO_MANY_REQUESTS
+        wait = retry_after(response)
+        headers = {'Retry-After': str(math.ceil(wait))} if wait is not None else None
+    raise HTTPException(
+        status_code=status_code,
+        detail=f"Erro na API do Google Calendar: {message}",
+        headers=headers
+    )
\ No newline at end of file
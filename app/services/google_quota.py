@@ -0,0 +1,201 @@
+import asyncio
+import math
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import List, Optional, Tuple
+import httpx
+from fastapi import HTTPException, status
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.core.metrics import GOOGLE_THROTTLED, GOOGLE_THROTTLE_WAIT
+
+# Motivos (error.errors[].reason) de limite de taxa por usuário/calendário
+RATE_LIMIT_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded'}
+# Cota do projeto (por minuto) esgotada
+PROJECT_RATE_LIMIT_REASONS = {'quotaExceeded'}
+
+class RateLimited(HTTPException):
+    """Chamada recusada pelo limitador local: a espera passaria de GOOGLE_RATE_LIMIT_MAX_WAIT"""
+
+    def __init__(self, retry_after: float):
+        self.retry_after = math.ceil(retry_after)
+        super().__init__(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Limite de chamadas ao Google atingido; tente novamente mais tarde",
+            headers={'Retry-After': str(self.retry_after)}
+        )
+
+class TokenBucket:
+    """
+    Token bucket com reserva: quem chama desconta o custo na hora (o saldo
+    pode ficar negativo) e espera o tempo que falta para o saldo voltar a
+    zero. As chamadas saem espaçadas em `rate` por segundo, na ordem de
+    chegada, em vez de em rajadas que estouram a cota e voltam juntas.
+
+    Não usa locks: é acessado apenas a partir do event loop.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, cost: float = 1) -> float:
+        """Desconta `cost` tokens e retorna quantos segundos esperar antes de usar"""
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        self.tokens -= cost
+        return max(0.0, -self.tokens / self.rate)
+
+    def refund(self, cost: float = 1) -> None:
+        """Devolve uma reserva que não foi usada"""
+        if self.rate > 0:
+            self._refill()
+            self.tokens = min(self.burst, self.tokens + cost)
+
+    def pause(self, seconds: float) -> None:
+        """Nenhuma reserva nova é liberada nos próximos `seconds` segundos"""
+        if self.rate > 0:
+            self._refill()
+            self.tokens = min(self.tokens, -seconds * self.rate)
+
+class GoogleRateLimiter:
+    """
+    Limita as chamadas ao Google por projeto (todas as chamadas do worker) e
+    por cliente, antes que o Google responda 429/403.
+
+    Os limites valem por worker (GOOGLE_PROJECT_RATE etc.). Quando a espera
+    passaria de GOOGLE_RATE_LIMIT_MAX_WAIT, a chamada é recusada com 429 em
+    vez de enfileirar indefinidamente.
+    """
+
+    def __init__(self):
+        self._project: Optional[TokenBucket] = None
+        self._users = LRUCache(maxsize=settings.GOOGLE_RATE_LIMIT_MAX_USERS)
+
+    def max_cost(self) -> Optional[int]:
+        """
+        Maior custo que cabe de uma vez nos buckets (a menor rajada). Lotes
+        maiores que isso esperariam mesmo com os buckets cheios.
+        """
+        if not settings.GOOGLE_RATE_LIMIT_ENABLED:
+            return None
+        bursts = [
+            burst for rate, burst in (
+                (settings.GOOGLE_PROJECT_RATE, settings.GOOGLE_PROJECT_BURST),
+                (settings.GOOGLE_USER_RATE, settings.GOOGLE_USER_BURST)
+            ) if rate > 0
+        ]
+        return max(1, int(min(bursts))) if bursts else None
+
+    def _project_bucket(self) -> TokenBucket:
+        if self._project is None:
+            self._project = TokenBucket(settings.GOOGLE_PROJECT_RATE, settings.GOOGLE_PROJECT_BURST)
+        return self._project
+
+    def _user_bucket(self, user: str) -> TokenBucket:
+        bucket = self._users.get(user)
+        if bucket is None:
+            bucket = TokenBucket(settings.GOOGLE_USER_RATE, settings.GOOGLE_USER_BURST)
+            self._users.set(user, bucket)
+        return bucket
+
+    async def acquire(self, user: Optional[str], cost: float = 1) -> None:
+        """Aguarda a vez de fazer `cost` chamadas em nome de `user` (None: só o projeto)"""
+        if not settings.GOOGLE_RATE_LIMIT_ENABLED:
+            return
+        buckets: List[Tuple[str, TokenBucket]] = [('project', self._project_bucket())]
+        if user is not None:
+            buckets.append(('user', self._user_bucket(user)))
+        waits = [(bucket.reserve(cost), scope) for scope, bucket in buckets]
+        wait, scope = max(waits)
+        if wait <= 0:
+            return
+
+        if wait > settings.GOOGLE_RATE_LIMIT_MAX_WAIT:
+            for _, bucket in buckets:
+                bucket.refund(cost)
+            GOOGLE_THROTTLED.labels(scope, 'rejected').inc()
+            raise RateLimited(wait)
+
+        GOOGLE_THROTTLED.labels(scope, 'delayed').inc()
+        GOOGLE_THROTTLE_WAIT.labels(scope).observe(wait)
+        try:
+            await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            for _, bucket in buckets:
+                bucket.refund(cost)
+            raise
+
+    def penalize(self, user: Optional[str], scope: str, seconds: float) -> None:
+        """
+        Após um limite de taxa do Google, segura as próximas chamadas do
+        cliente (ou do projeto) por `seconds`, para que as requisições
+        concorrentes esperem junto em vez de tentar e falhar de novo.
+        """
+        if not settings.GOOGLE_RATE_LIMIT_ENABLED:
+            return
+        if scope == 'project':
+            self._project_bucket().pause(seconds)
+        elif user is not None:
+            self._user_bucket(user).pause(seconds)
+
+google_limiter = GoogleRateLimiter()
+
+def rate_limit_scope(status_code: int, body) -> Optional[str]:
+    """'project' ou 'user' se a resposta é um limite de taxa do Google, senão None"""
+    if status_code not in (status.HTTP_403_FORBIDDEN, status.HTTP_429_TOO_MANY_REQUESTS):
+        return None
+    error = body.get('error') if isinstance(body, dict) else None
+    reasons = {item.get('reason') for item in error.get('errors', [])} if isinstance(error, dict) else set()
+    if reasons & PROJECT_RATE_LIMIT_REASONS:
+        return 'project'
+    if status_code == status.HTTP_429_TOO_MANY_REQUESTS or reasons & RATE_LIMIT_REASONS:
+        return 'user'
+    return None
+
+def response_rate_limit_scope(response: httpx.Response) -> Optional[str]:
+    try:
+        body = response.json()
+    except ValueError:
+        body = None
+    return rate_limit_scope(response.status_code, body)
+
+def retry_after(response: httpx.Response) -> Optional[float]:
+    """Segundos pedidos pelo cabeçalho Retry-After (número ou data HTTP)"""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+def backoff_delay(attempt: int, base: Optional[float] = None, retry_after: Optional[float] = None) -> float:
+    """
+    Espera antes da tentativa `attempt` + 1 (attempt começa em 0): exponencial
+    com jitter, limitada a GOOGLE_RETRY_MAX_BACKOFF. Com Retry-After, espera o
+    pedido pelo Google mais um jitter pequeno, para os workers não voltarem
+    todos no mesmo instante.
+    """
+    base = settings.GOOGLE_RETRY_BACKOFF if base is None else base
+    if retry_after is not None:
+        return retry_after + random.uniform(0, base)
+    delay = min(settings.GOOGLE_RETRY_MAX_BACKOFF, base * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
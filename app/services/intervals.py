@@ -0,0 +1,58 @@
+from bisect import bisect_left
+from datetime import datetime
+from typing import Any, Generic, Iterable, List, Tuple, TypeVar
+
+T = TypeVar("T")
+
+class IntervalIndex(Generic[T]):
+    """
+    Índice estático de intervalos [start, end) para consultas de sobreposição.
+
+    Os intervalos ficam ordenados pelo início; uma árvore de segmentos guarda
+    o maior fim de cada faixa. Uma consulta custa O(log M + k log M), onde k é
+    o número de intervalos sobrepostos, mesmo com eventos muito longos.
+    """
+
+    def __init__(self, intervals: Iterable[Tuple[datetime, datetime, T]]):
+        ordered = sorted(intervals, key=lambda interval: interval[0])
+        self._starts = [interval[0] for interval in ordered]
+        self._ends = [interval[1] for interval in ordered]
+        self._items = [interval[2] for interval in ordered]
+
+        self._size = 1
+        while self._size < len(ordered):
+            self._size *= 2
+        self._max_end: List[Any] = [None] * (2 * self._size)
+        for i, end in enumerate(self._ends):
+            self._max_end[self._size + i] = end
+        for node in range(self._size - 1, 0, -1):
+            left, right = self._max_end[2 * node], self._max_end[2 * node + 1]
+            self._max_end[node] = right if left is None or (right is not None and right > left) else left
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def overlapping(self, start: datetime, end: datetime) -> List[T]:
+        """Itens cujo intervalo se sobrepõe a [start, end), em ordem de início"""
+        # Só intervalos que começam antes de `end` podem se sobrepor
+        limit = bisect_left(self._starts, end)
+        if limit == 0:
+            return []
+
+        found = []
+        # Busca em profundidade nos nós da faixa [0, limit) com fim máximo > start
+        stack = [(1, 0, self._size)]
+        while stack:
+            node, lo, hi = stack.pop()
+            if lo >= limit:
+                continue
+            max_end = self._max_end[node]
+            if max_end is None or max_end <= start:
+                continue
+            if hi - lo == 1:
+                found.append(lo)
+                continue
+            mid = (lo + hi) // 2
+            stack.append((2 * node + 1, mid, hi))
+            stack.append((2 * node, lo, mid))
+        return [self._items[i] for i in found]
@@ -0,0 +1,155 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+from sqlalchemy import select, update, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from app.api.models import Cliente
+from app.core.config import settings
+from app.core.metrics import TOKEN_REFRESHES
+from app.core.sharding import shards
+from app.services.google_auth import GoogleAuthService
+from app.services.cliente_cache import cliente_cache
+from app.services.credential_writer import credential_writer
+
+logger = logging.getLogger(__name__)
+
+# Chave do advisory lock que garante um único sweep por shard entre os workers
+_SWEEP_LOCK_KEY = 0x5EC7_0001
+
+class TokenRefresher:
+    """
+    Renova tokens OAuth antes da expiração.
+
+    Um loop em background varre os clientes periodicamente e renova os tokens
+    que expiram dentro de TOKEN_REFRESH_MARGIN. Renovações do mesmo cliente
+    são deduplicadas: chamadas concorrentes aguardam a mesma tarefa.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def refresh(self, email: str, credentials: dict) -> dict:
+        """Renova as credenciais do cliente, com no máximo uma renovação em andamento"""
+        task = self._inflight.get(email)
+        if task is None:
+            task = asyncio.create_task(self._refresh_and_store(email, credentials))
+            self._inflight[email] = task
+            task.add_done_callback(lambda _: self._inflight.pop(email, None))
+        # shield: o cancelamento de uma requisição não aborta a renovação compartilhada
+        return await asyncio.shield(task)
+
+    async def _refresh_and_store(self, email: str, credentials: dict) -> dict:
+        try:
+            updated = await GoogleAuthService.refresh_credentials(credentials)
+        except Exception:
+            TOKEN_REFRESHES.labels("failure").inc()
+            raise
+        TOKEN_REFRESHES.labels("success").inc()
+        if settings.CREDENTIAL_WRITE_BEHIND:
+            # A gravação fica para o credential_writer; o cache já recebe as
+            # novas credenciais para que ninguém renove de novo com as antigas
+            credential_writer.submit(email, updated, credentials)
+            await cliente_cache.update_credentials(email, updated)
+            return updated
+
+        async with shards.session_for(email) as db:
+            await db.execute(
+                update(Cliente)
+                .where(Cliente.email == email)
+                .values(
+                    credentials=updated,
+                    token_expiry=GoogleAuthService.token_expiry(updated),
+                    updated_at=datetime.utcnow()
+                )
+            )
+            await db.commit()
+        await cliente_cache.invalidate(email)
+        return updated
+
+    async def sweep(self) -> int:
+        """Renova os tokens que expiram em breve. Retorna quantos foram renovados"""
+        counts = await asyncio.gather(*(
+            self._sweep_shard(engine, maker)
+            for engine, maker in zip(shards.engines(), shards.sessionmakers())
+        ))
+        return sum(counts)
+
+    async def _sweep_shard(self, engine: AsyncEngine, maker) -> int:
+        # Lock de sessão numa conexão só para ele, sem transação aberta: as
+        # renovações (chamadas ao Google) não seguram transação nenhuma
+        async with engine.connect() as lock:
+            if engine.dialect.name == "postgresql":
+                locked = await lock.scalar(text("SELECT pg_try_advisory_lock(:key)"), {"key": _SWEEP_LOCK_KEY})
+                await lock.commit()
+                if not locked:
+                    return 0
+            try:
+                return await self._refresh_due(maker)
+            finally:
+                if engine.dialect.name == "postgresql":
+                    await self._unlock(lock)
+
+    @staticmethod
+    async def _unlock(lock: AsyncConnection) -> None:
+        try:
+            await lock.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _SWEEP_LOCK_KEY})
+            await lock.commit()
+        except BaseException:
+            # Sem unlock a conexão não pode voltar ao pool com o lock; descartá-la o libera
+            await lock.invalidate()
+            raise
+
+    async def _refresh_due(self, maker) -> int:
+        # Varredura de intervalo no índice de token_expiry, e não na tabela
+        # inteira; tokens sem expiração conhecida são renovados sob demanda
+        cutoff = datetime.now(timezone.utc) + timedelta(seconds=settings.TOKEN_REFRESH_MARGIN)
+        due = []
+        async with maker() as db:
+            result = await db.stream(
+                select(Cliente.email, Cliente.credentials)
+                .where(Cliente.token_expiry < cutoff, Cliente.credentials.isnot(None))
+                .execution_options(yield_per=1000)
+            )
+            async for email, credentials in result:
+                credentials = credential_writer.pending(email) or credentials
+                if GoogleAuthService.needs_refresh(credentials, margin=settings.TOKEN_REFRESH_MARGIN):
+                    due.append((email, credentials))
+
+        semaphore = asyncio.Semaphore(settings.TOKEN_REFRESH_CONCURRENCY)
+
+        async def refresh_one(email: str, credentials: dict) -> bool:
+            async with semaphore:
+                try:
+                    await self.refresh(email, credentials)
+                    return True
+                except Exception:
+                    logger.exception("Falha ao renovar token de %s", email)
+                    return False
+
+        results = await asyncio.gather(*(refresh_one(e, c) for e, c in due))
+        return sum(results)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("Erro na varredura de tokens")
+            await asyncio.sleep(settings.TOKEN_REFRESH_INTERVAL)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+token_refresher = TokenRefresher()
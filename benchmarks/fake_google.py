@@ -0,0 +1,183 @@
+"""
+Servidor HTTP que imita as partes da Calendar API e do OAuth usadas pela
+aplicação, com latência configurável, para os benchmarks.
+
+Cada cliente tem um calendário próprio, identificado pelo access token
+(Bearer). O calendário é criado no primeiro acesso com `events` eventos de
+uma hora distribuídos por `days` dias a partir de `start`.
+"""
+import asyncio
+import bisect
+import itertools
+import random
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+@dataclass
+class FakeGoogleConfig:
+    latency: float = 0.02  # segundos por chamada (média)
+    jitter: float = 0.005  # desvio padrão da latência
+    events: int = 200  # eventos por calendário
+    days: int = 30
+    start: date = date(2024, 1, 1)
+    page_size: int = 250  # maxResults padrão do Google
+
+def _parse(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+def _format(value: datetime) -> str:
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+@dataclass
+class _Calendar:
+    # (início, id) em ordem, para buscar por período com bisect
+    index: List[Tuple[datetime, str]] = field(default_factory=list)
+    events: Dict[str, dict] = field(default_factory=dict)
+    # id -> versão da última alteração, para syncToken
+    versions: Dict[str, int] = field(default_factory=dict)
+    version: int = 0
+
+class FakeGoogle:
+    # Eventos gerados e criados duram no máximo isto (limite da busca por período)
+    MAX_DURATION = timedelta(hours=1)
+
+    def __init__(self, config: FakeGoogleConfig):
+        self.config = config
+        self.calendars: Dict[str, _Calendar] = {}
+        self.calls: Dict[str, int] = {}
+        self._ids = itertools.count(1)
+        self.app = Starlette(routes=[
+            Route("/token", self.token, methods=["POST"]),
+            Route("/calendar/v3/calendars/primary/events", self.list_events, methods=["GET"]),
+            Route("/calendar/v3/calendars/primary/events", self.insert_event, methods=["POST"]),
+            Route("/calendar/v3/calendars/primary/events/{event_id}", self.delete_event, methods=["DELETE"]),
+            Route("/calendar/v3/freeBusy", self.free_busy, methods=["POST"]),
+        ])
+
+    async def _delay(self, operation: str) -> None:
+        self.calls[operation] = self.calls.get(operation, 0) + 1
+        delay = random.gauss(self.config.latency, self.config.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def _calendar(self, request: Request) -> Optional[_Calendar]:
+        authorization = request.headers.get("authorization", "")
+        if not authorization.startswith("Bearer "):
+            return None
+        token = authorization[len("Bearer "):]
+        calendar = self.calendars.get(token)
+        if calendar is None:
+            calendar = self.calendars[token] = self._generate()
+        return calendar
+
+    def _generate(self) -> _Calendar:
+        calendar = _Calendar()
+        start = datetime(self.config.start.year, self.config.start.month, self.config.start.day, tzinfo=timezone.utc)
+        span = self.config.days * 24 * 60
+        for _ in range(self.config.events):
+            begin = start + timedelta(minutes=random.randrange(0, span, 15))
+            self._store(calendar, self._event(begin, begin + self.MAX_DURATION, "Evento"))
+        return calendar
+
+    def _event(self, start: datetime, end: datetime, summary: str, extra: Optional[dict] = None) -> dict:
+        event_id = f"ev{next(self._ids)}"
+        return {
+            **(extra or {}),
+            "id": event_id,
+            "status": "confirmed",
+            "summary": summary,
+            "start": {"dateTime": _format(start), "timeZone": "UTC"},
+            "end": {"dateTime": _format(end), "timeZone": "UTC"},
+            "htmlLink": f"https://calendar.google.com/event?eid={event_id}"
+        }
+
+    def _store(self, calendar: _Calendar, event: dict) -> None:
+        start = _parse(event["start"]["dateTime"])
+        bisect.insort(calendar.index, (start, event["id"]))
+        calendar.events[event["id"]] = event
+        calendar.version += 1
+        calendar.versions[event["id"]] = calendar.version
+
+    def _overlapping(self, calendar: _Calendar, time_min: datetime, time_max: datetime) -> List[dict]:
+        low = bisect.bisect_left(calendar.index, (time_min - self.MAX_DURATION, ""))
+        high = bisect.bisect_left(calendar.index, (time_max, ""))
+        found = []
+        for _, event_id in calendar.index[low:high]:
+            event = calendar.events[event_id]
+            if event["status"] != "cancelled" and _parse(event["end"]["dateTime"]) > time_min:
+                found.append(event)
+        return found
+
+    async def token(self, request: Request) -> Response:
+        await self._delay("token.refresh")
+        form = await request.form()
+        # O access token renovado é o próprio refresh token: o calendário não muda
+        return JSONResponse({"access_token": form.get("refresh_token"), "expires_in": 3600, "token_type": "Bearer"})
+
+    async def list_events(self, request: Request) -> Response:
+        calendar = self._calendar(request)
+        if calendar is None:
+            return JSONResponse({"error": {"code": 401, "message": "Unauthorized"}}, status_code=401)
+        params = request.query_params
+        sync_token = params.get("syncToken")
+        await self._delay("events.sync" if "timeMin" not in params else "events.list")
+
+        if "timeMin" in params:
+            items = self._overlapping(calendar, _parse(params["timeMin"]), _parse(params["timeMax"]))
+        elif sync_token:
+            since = int(sync_token)
+            items = [calendar.events[event_id] for event_id, version in calendar.versions.items() if version > since]
+        else:
+            items = [event for _, event_id in calendar.index
+                     for event in (calendar.events[event_id],) if event["status"] != "cancelled"]
+
+        offset = int(params.get("pageToken", 0))
+        size = min(int(params.get("maxResults", self.config.page_size)), 2500)
+        page = {"items": items[offset:offset + size]}
+        if offset + size < len(items):
+            page["nextPageToken"] = str(offset + size)
+        else:
+            page["nextSyncToken"] = str(calendar.version)
+        return JSONResponse(page)
+
+    async def insert_event(self, request: Request) -> Response:
+        calendar = self._calendar(request)
+        if calendar is None:
+            return JSONResponse({"error": {"code": 401, "message": "Unauthorized"}}, status_code=401)
+        body = await request.json()
+        await self._delay("events.insert")
+        event = self._event(
+            _parse(body["start"]["dateTime"]), _parse(body["end"]["dateTime"]), body.get("summary", ""),
+            {key: value for key, value in body.items() if key in ("description", "attendees")}
+        )
+        self._store(calendar, event)
+        return JSONResponse(event)
+
+    async def delete_event(self, request: Request) -> Response:
+        calendar = self._calendar(request)
+        if calendar is None:
+            return JSONResponse({"error": {"code": 401, "message": "Unauthorized"}}, status_code=401)
+        await self._delay("events.delete")
+        event = calendar.events.get(request.path_params["event_id"])
+        if event is None or event["status"] == "cancelled":
+            return JSONResponse({"error": {"code": 404, "message": "Not Found"}}, status_code=404)
+        event["status"] = "cancelled"
+        calendar.version += 1
+        calendar.versions[event["id"]] = calendar.version
+        return Response(status_code=204)
+
+    async def free_busy(self, request: Request) -> Response:
+        calendar = self._calendar(request)
+        if calendar is None:
+            return JSONResponse({"error": {"code": 401, "message": "Unauthorized"}}, status_code=401)
+        body = await request.json()
+        await self._delay("freebusy.query")
+        events = self._overlapping(calendar, _parse(body["timeMin"]), _parse(body["timeMax"]))
+        busy = [{"start": event["start"]["dateTime"], "end": event["end"]["dateTime"]} for event in events]
+        return JSONResponse({"calendars": {"primary": {"busy": busy}}})
@@ -0,0 +1,289 @@
+"""
+Benchmark da API em processo.
+
+A aplicação FastAPI roda no mesmo processo (httpx + ASGITransport), contra o
+servidor falso do Google em benchmarks/fake_google.py (HTTP de verdade, em
+uma porta local) e um banco local (SQLite via aiosqlite, por padrão). Cada
+cenário roda em cada nível de concorrência; o resultado (vazão, p50/p95/p99)
+é impresso e gravado em JSON para comparar commits.
+
+Uso:
+    python -m benchmarks.run [--concurrency 1,8,32] [--requests 200]
+        [--latency 0.02] [--events 200] [--db URL] [--output arquivo.json]
+        [--baseline resultado_anterior.json] [--set CHAVE=VALOR ...]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+Request = Tuple[str, str, Optional[dict]]
+
+@dataclass
+class Scenario:
+    name: str
+    # (índice da requisição, rodada) -> (método, caminho, corpo JSON); a
+    # rodada separa os clientes criados no aquecimento e em cada nível
+    request: Callable[[int, str], Request]
+    expected: Tuple[int, ...] = (200,)
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Percentil pelo posto mais próximo (values já ordenado)"""
+    if not values:
+        return 0.0
+    rank = max(1, int(round(fraction * len(values) + 0.5)))
+    return values[min(rank, len(values)) - 1]
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "mean": sum(latencies) / len(latencies) if latencies else 0.0,
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "max": latencies[-1] if latencies else 0.0
+    }
+
+def _parse_value(value: str):
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def scenarios(emails: List[str], days: int, start: date) -> List[Scenario]:
+    """Cenários na ordem de execução (delete remove o que create criou)"""
+    def email(i: int) -> str:
+        return emails[i % len(emails)]
+
+    def day(i: int) -> date:
+        return start + timedelta(days=i % days)
+
+    def event_body(i: int) -> dict:
+        begin = datetime(day(i).year, day(i).month, day(i).day, 9, tzinfo=timezone.utc) + timedelta(minutes=15 * (i % 32))
+        return {
+            "summary": f"Benchmark {i}",
+            "start": {"dateTime": begin.isoformat(), "timeZone": "UTC"},
+            "end": {"dateTime": (begin + timedelta(minutes=30)).isoformat(), "timeZone": "UTC"}
+        }
+
+    def new_email(i: int, run: str) -> str:
+        return f"novo-{run}-{i}@bench.example.com"
+
+    return [
+        Scenario("cliente.create", lambda i, run: (
+            "POST", f"/clientes/{new_email(i, run)}", {"email": new_email(i, run), "credentials": None}
+        ), (201,)),
+        Scenario("cliente.get", lambda i, run: ("GET", f"/clientes/{email(i)}", None)),
+        Scenario("cliente.update", lambda i, run: (
+            "PUT", f"/clientes/{new_email(i, run)}", {"email": new_email(i, run), "credentials": None}
+        )),
+        Scenario("cliente.list", lambda i, run: ("GET", "/clientes/?limit=100", None)),
+        Scenario("cliente.delete", lambda i, run: ("DELETE", f"/clientes/{new_email(i, run)}", None), (204,)),
+        Scenario("calendar.list_events", lambda i, run: (
+            "GET", f"/calendar/{email(i)}/events/{day(i).isoformat()}", None
+        )),
+        Scenario("calendar.create_event", lambda i, run: (
+            "POST", f"/calendar/{email(i)}/events", event_body(i)
+        )),
+        Scenario("calendar.check_conflicts", lambda i, run: (
+            "POST", f"/calendar/{email(i)}/check-conflicts", event_body(i)
+        )),
+    ]
+
+async def run_level(client, scenario: Scenario, level: int, total: int, run: str) -> dict:
+    counter = itertools.count()
+    latencies: List[float] = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        while True:
+            i = next(counter)
+            if i >= total:
+                return
+            method, path, body = scenario.request(i, run)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body)
+                ok = response.status_code in scenario.expected
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            if not ok:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(level)))
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+async def benchmark(args) -> dict:
+    # As configurações precisam estar prontas antes de importar a aplicação
+    from app.core.config import settings
+    # O limitador de chamadas ao Google mediria a cota, não a aplicação
+    # (reative com --set GOOGLE_RATE_LIMIT_ENABLED=true)
+    settings.GOOGLE_RATE_LIMIT_ENABLED = False
+    for item in args.set:
+        key, _, value = item.partition("=")
+        setattr(settings, key, _parse_value(value))
+    settings.TOKEN_REFRESH_ENABLED = False
+
+    import uvicorn
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from app.core import database
+    from benchmarks.fake_google import FakeGoogle, FakeGoogleConfig
+
+    config = FakeGoogleConfig(latency=args.latency, jitter=args.jitter, events=args.events, days=args.days)
+    google = FakeGoogle(config)
+    server = uvicorn.Server(uvicorn.Config(google.app, host="127.0.0.1", port=0, log_level="warning", lifespan="off"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    google_url = f"http://127.0.0.1:{port}"
+    settings.GOOGLE_CALENDAR_API_URL = f"{google_url}/calendar/v3"
+
+    if args.db.startswith("sqlite"):
+        engine = create_async_engine(args.db, connect_args={"timeout": 30})
+    else:
+        engine = database.make_engine(args.db, "benchmark")
+    database.engine = engine
+    database.AsyncSessionLocal = database.make_sessionmaker(engine)
+
+    import httpx
+    from app.main import app
+    from app.api.models import Cliente
+    from app.core.cache import get_cache_backend, close_cache_backend
+    from app.core.http import close_http_client
+    from app.services.credential_writer import credential_writer
+
+    async with engine.begin() as conn:
+        await conn.run_sync(database.Base.metadata.drop_all)
+        await conn.run_sync(database.Base.metadata.create_all)
+    await get_cache_backend().start()
+    credential_writer.start()
+
+    emails = [f"cliente{i}@bench.example.com" for i in range(args.clientes)]
+    expiry = (datetime.now(timezone.utc) + timedelta(days=1)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    async with database.AsyncSessionLocal() as db:
+        db.add_all([
+            Cliente(email=email, credentials={
+                "token": f"bench:{email}", "refresh_token": f"bench:{email}",
+                "token_uri": f"{google_url}/token", "client_id": "bench", "client_secret": "bench",
+                "expiry": expiry
+            })
+            for email in emails
+        ])
+        await db.commit()
+
+    selected = [scenario for scenario in scenarios(emails, config.days, config.start)
+                if not args.scenarios or scenario.name in args.scenarios]
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url=f"http://bench{settings.API_V1_STR}") as client:
+            for level in args.concurrency:
+                for scenario in selected:
+                    if args.warmup:
+                        # Aquecimento fora da medição
+                        await run_level(client, scenario, min(level, args.warmup), args.warmup, f"w{level}")
+                    summary = await run_level(client, scenario, level, args.requests, f"c{level}")
+                    results.append({"scenario": scenario.name, "concurrency": level, **summary})
+                    print(_format_row(results[-1]), flush=True)
+    finally:
+        await credential_writer.stop()
+        await close_cache_backend()
+        await close_http_client()
+        server.should_exit = True
+        await server_task
+        await engine.dispose()
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "database": engine.dialect.name,
+            "args": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+            "google_calls": google.calls
+        },
+        "results": results
+    }
+
+def _format_row(row: dict) -> str:
+    return (
+        f"{row['scenario']:<26} c={row['concurrency']:<4} {row['throughput']:>9.1f} req/s  "
+        f"p50={row['p50'] * 1000:>7.1f}ms p95={row['p95'] * 1000:>7.1f}ms "
+        f"p99={row['p99'] * 1000:>7.1f}ms erros={row['errors']}"
+    )
+
+def compare(current: dict, baseline: dict) -> None:
+    """Imprime a variação de vazão e p95 em relação a um resultado anterior"""
+    previous = {(row["scenario"], row["concurrency"]): row for row in baseline["results"]}
+    print(f"\nComparação com {baseline['meta'].get('commit') or 'baseline'}:")
+    for row in current["results"]:
+        old = previous.get((row["scenario"], row["concurrency"]))
+        if old is None:
+            continue
+        throughput = (row["throughput"] / old["throughput"] - 1) * 100 if old["throughput"] else 0.0
+        p95 = (row["p95"] / old["p95"] - 1) * 100 if old["p95"] else 0.0
+        print(f"{row['scenario']:<26} c={row['concurrency']:<4} vazão {throughput:+6.1f}%  p95 {p95:+6.1f}%")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark da API em processo, com Google falso e banco local")
+    parser.add_argument("--concurrency", type=lambda v: [int(x) for x in v.split(",")], default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="Requisições por cenário e nível")
+    parser.add_argument("--warmup", type=int, default=10, help="Requisições de aquecimento (não medidas)")
+    parser.add_argument("--scenarios", nargs="*", default=[], help="Só estes cenários (padrão: todos)")
+    parser.add_argument("--clientes", type=int, default=50, help="Clientes pré-cadastrados")
+    parser.add_argument("--latency", type=float, default=0.02, help="Latência média do Google falso (s)")
+    parser.add_argument("--jitter", type=float, default=0.005, help="Desvio padrão da latência (s)")
+    parser.add_argument("--events", type=int, default=200, help="Eventos por calendário")
+    parser.add_argument("--days", type=int, default=30, help="Dias cobertos pelos eventos")
+    parser.add_argument("--db", default=None, help="URL do banco (padrão: SQLite temporário)")
+    parser.add_argument("--set", action="append", default=[], metavar="CHAVE=VALOR",
+                        help="Sobrescreve uma configuração (ex.: CALENDAR_MIRROR_ENABLED=true)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--baseline", help="Resultado anterior para comparar")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        temporary = args.db is None
+        if temporary:
+            args.db = f"sqlite+aiosqlite:///{os.path.join(tmp, 'benchmark.sqlite3')}"
+        result = asyncio.run(benchmark(args))
+        if temporary:
+            result["meta"]["args"]["db"] = "sqlite (temporário)"
+
+    with open(args.output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nResultados em {args.output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(result, json.load(f))
+
+if __name__ == "__main__":
+    sys.exit(main())
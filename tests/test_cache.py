@@ -0,0 +1,178 @@
+import asyncio
+import uuid
+import pytest
+from app.core.cache import (
+    MemoryCacheBackend, SQLiteCacheBackend, RedisCacheBackend, register_invalidation_handler
+)
+from app.core.config import settings
+from app.services import cliente_cache as cliente_cache_module
+from app.services.cliente_cache import ClienteCache, ClienteInfo
+
+# Cada teste cria dois backends ligados ao mesmo armazenamento, como dois workers
+
+def memory_pair(tmp_path):
+    first = MemoryCacheBackend()
+    return first, MemoryCacheBackend(shared_with=first)
+
+def sqlite_pair(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    return SQLiteCacheBackend(path, poll_interval=0.01), SQLiteCacheBackend(path, poll_interval=0.01)
+
+def redis_pair(tmp_path):
+    # Dependências de desenvolvimento (requirements-dev.txt)
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("redis")
+    server = fakeredis.FakeServer()
+    backends = []
+    for _ in range(2):
+        backend = RedisCacheBackend("redis://localhost", prefix="test:")
+        backend._redis = fakeredis.aioredis.FakeRedis(server=server)
+        backends.append(backend)
+    return tuple(backends)
+
+PAIRS = [memory_pair, sqlite_pair, redis_pair]
+
+async def wait_for(condition, timeout: float = 2.0) -> bool:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            return False
+        await asyncio.sleep(0.01)
+    return True
+
+@pytest.mark.parametrize("make_pair", PAIRS)
+def test_invalidation_reaches_other_worker(make_pair, tmp_path):
+    namespace = f"test-{uuid.uuid4().hex}"
+    received = []
+    register_invalidation_handler(namespace, received.append)
+
+    async def run():
+        first, second = make_pair(tmp_path)
+        await first.start()
+        await second.start()
+        await asyncio.sleep(0.05)
+        try:
+            await first.invalidate(namespace, "a@x.com")
+            assert await wait_for(lambda: received)
+            # Só o outro worker recebe: quem invalida ignora o próprio eco
+            await asyncio.sleep(0.05)
+            assert received == ["a@x.com"]
+
+            await first.invalidate_many(namespace, ["b@x.com", "c@x.com"])
+            assert await wait_for(lambda: len(received) == 3)
+            assert received[1:] == ["b@x.com", "c@x.com"]
+        finally:
+            await first.close()
+            await second.close()
+
+    asyncio.run(run())
+
+@pytest.mark.parametrize("make_pair", PAIRS)
+def test_set_if_version_rejects_after_bump(make_pair, tmp_path):
+    async def run():
+        first, second = make_pair(tmp_path)
+        try:
+            version = (await first.versions(["k"]))["k"]
+            assert version is None
+            assert await first.set_if_version("k", {"v": 1}, 60, version)
+            assert await second.get("k") == {"v": 1}
+
+            # Escrita em outro worker entre a leitura da versão e a gravação
+            new_version = await second.bump("k")
+            assert await first.get("k") is None
+            assert not await first.set_if_version("k", {"v": "velho"}, 60, version)
+            assert await second.get("k") is None
+
+            assert (await first.versions(["k"]))["k"] == new_version
+            assert await first.set_if_version("k", {"v": 2}, 60, new_version)
+            assert await second.get("k") == {"v": 2}
+
+            await first.set("outra", {"v": 3})
+            versions = await first.bump_many(["k", "outra"])
+            assert await second.get_many(["k", "outra"]) == {}
+            assert await second.versions(["k", "outra"]) == versions
+        finally:
+            await first.close()
+            await second.close()
+
+    asyncio.run(run())
+
+CREDENTIALS = {"token": "t", "refresh_token": "segredo", "client_secret": "s"}
+
+@pytest.fixture
+def two_workers(monkeypatch):
+    """Dois ClienteCache, cada um usando seu próprio backend (mesmo armazenamento)"""
+    monkeypatch.setattr(settings, "CLIENTE_CACHE_ENABLED", True)
+    monkeypatch.setattr(cliente_cache_module, "_fernet", None)
+    first_backend = MemoryCacheBackend()
+    second_backend = MemoryCacheBackend(shared_with=first_backend)
+    workers = [(ClienteCache(), first_backend), (ClienteCache(), second_backend)]
+    current = {}
+    monkeypatch.setattr(cliente_cache_module, "get_cache_backend", lambda: current["backend"])
+
+    def use(index):
+        cache, backend = workers[index]
+        current["backend"] = backend
+        return cache
+
+    return use, first_backend
+
+def test_stale_read_does_not_reach_shared_cache(two_workers, monkeypatch):
+    monkeypatch.setattr(settings, "DB_READ_YOUR_WRITES_WINDOW", 0)
+    use, backend = two_workers
+    row = ClienteInfo(1, "a@x.com", None, None)
+
+    async def run():
+        async def slow_load(emails):
+            # Outro worker grava no cliente enquanto esta leitura está no banco
+            use(1)
+            await cache_b.invalidate("a@x.com")
+            use(0)
+            return {"a@x.com": row}
+
+        cache_b = use(1)
+        cache_a = use(0)
+        assert (await cache_a._lookup(["a@x.com"], slow_load))["a@x.com"] == row
+        assert await backend.get("cliente:a@x.com") is None
+
+        async def load(emails):
+            return {"a@x.com": row}
+
+        await cache_a._lookup(["a@x.com"], load)
+        assert await backend.get("cliente:a@x.com") is not None
+
+    asyncio.run(run())
+
+def test_credentials_stay_local_without_encryption_key(two_workers, monkeypatch):
+    monkeypatch.setattr(settings, "CACHE_ENCRYPTION_KEY", "")
+    use, backend = two_workers
+    row = ClienteInfo(1, "a@x.com", CREDENTIALS, None)
+
+    async def run():
+        async def load(emails):
+            return {"a@x.com": row}
+
+        assert (await use(0)._lookup(["a@x.com"], load))["a@x.com"] == row
+        assert await backend.get("cliente:a@x.com") is None
+
+    asyncio.run(run())
+
+def test_credentials_are_encrypted_in_shared_cache(two_workers, monkeypatch):
+    from cryptography.fernet import Fernet
+    monkeypatch.setattr(settings, "CACHE_ENCRYPTION_KEY", Fernet.generate_key().decode())
+    use, backend = two_workers
+    row = ClienteInfo(1, "a@x.com", CREDENTIALS, None)
+
+    async def run():
+        async def load(emails):
+            return {"a@x.com": row}
+
+        async def unexpected_load(emails):
+            raise AssertionError("deveria vir do cache compartilhado")
+
+        await use(0)._lookup(["a@x.com"], load)
+        stored = await backend.get("cliente:a@x.com")
+        assert "segredo" not in str(stored)
+        assert (await use(1)._lookup(["a@x.com"], unexpected_load))["a@x.com"] == row
+
+    asyncio.run(run())
@@ -0,0 +1,24 @@
+import asyncio
+import pytest
+from fastapi import HTTPException
+from app.services.cliente_service import ClienteService, decode_cursor, encode_cursor
+
+@pytest.mark.parametrize("value", ["a@x.com", "joão+agenda@exemplo.com.br", "", 42, True, None, ["a", 1]])
+def test_cursor_round_trip(value):
+    cursor = encode_cursor(value)
+    # Seguro em query string: sem padding nem caracteres fora do base64 urlsafe
+    assert "=" not in cursor and "+" not in cursor and "/" not in cursor
+    assert decode_cursor(cursor) == value
+
+@pytest.mark.parametrize("cursor", ["não-é-base64", "YWJj", "!!!!", encode_cursor("a")[:-1] + "*"])
+def test_invalid_cursor_is_bad_request(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+    assert error.value.status_code == 400
+
+@pytest.mark.parametrize("value", [True, 42, None, ["a@x.com"]])
+def test_list_clientes_rejects_cursor_that_is_not_an_email(value):
+    # decode_cursor aceita qualquer JSON; a listagem só aceita o email da página anterior
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(ClienteService.list_clientes(cursor=encode_cursor(value)))
+    assert error.value.status_code == 400
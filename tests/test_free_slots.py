@@ -0,0 +1,93 @@
+from datetime import datetime, time, timedelta, timezone
+import numpy as np
+from app.services import free_slots
+
+def utc(day: int, hour: int, minute: int = 0) -> datetime:
+    return datetime(2024, 1, day, hour, minute, tzinfo=timezone.utc)
+
+def arrays(*intervals):
+    return free_slots.intervals_to_arrays(intervals)
+
+def as_datetimes(starts: np.ndarray, ends: np.ndarray):
+    return [(free_slots.from_epoch(s), free_slots.from_epoch(e)) for s, e in zip(starts, ends)]
+
+def test_epoch_round_trip():
+    value = utc(22, 9, 30)
+    assert free_slots.from_epoch(free_slots.to_epoch(value)) == value
+    # Sem fuso é UTC
+    assert free_slots.to_epoch(value.replace(tzinfo=None)) == free_slots.to_epoch(value)
+
+def test_merge_joins_overlapping_and_touching_intervals():
+    starts, ends = arrays(
+        (utc(22, 14), utc(22, 15)),
+        (utc(22, 9), utc(22, 10)),
+        (utc(22, 10), utc(22, 11)),
+        (utc(22, 9, 30), utc(22, 9, 45)),
+    )
+    assert as_datetimes(*free_slots.merge_intervals(starts, ends)) == [
+        (utc(22, 9), utc(22, 11)),
+        (utc(22, 14), utc(22, 15)),
+    ]
+
+def test_subtract_busy_from_windows():
+    windows = arrays((utc(22, 9), utc(22, 12)), (utc(23, 9), utc(23, 12)))
+    busy = arrays((utc(22, 8), utc(22, 9, 30)), (utc(22, 11), utc(23, 10)))
+    assert as_datetimes(*free_slots.subtract_intervals(*windows, *busy)) == [
+        (utc(22, 9, 30), utc(22, 11)),
+        (utc(23, 10), utc(23, 12)),
+    ]
+
+def test_working_windows_skip_weekdays_and_clip_to_range():
+    # 2024-01-26 é sexta, 27 e 28 fim de semana
+    starts, ends = free_slots.working_windows(
+        utc(26, 10), utc(29, 23), "UTC", time(9), time(18), [0, 1, 2, 3, 4]
+    )
+    assert as_datetimes(starts, ends) == [
+        (utc(26, 10), utc(26, 18)),
+        (utc(29, 9), utc(29, 18)),
+    ]
+
+def test_working_windows_follow_daylight_saving():
+    # Horário de verão em Nova York começa em 2024-03-10
+    starts, ends = free_slots.working_windows(
+        datetime(2024, 3, 8, tzinfo=timezone.utc),
+        datetime(2024, 3, 12, tzinfo=timezone.utc),
+        "America/New_York", time(9), time(18), [0, 4]
+    )
+    assert [start.hour for start, _ in as_datetimes(starts, ends)] == [14, 13]
+
+def find(busy, **overrides):
+    options = dict(
+        range_start=utc(22, 0),
+        range_end=utc(23, 0),
+        duration=timedelta(minutes=30),
+        tz="UTC",
+        work_start=time(9),
+        work_end=time(12),
+        weekdays=[0],
+        step=timedelta(minutes=15),
+        limit=20,
+    )
+    options.update(overrides)
+    return free_slots.find_free_slots(busy, **options)
+
+def test_slots_free_for_every_calendar():
+    busy = [
+        arrays((utc(22, 9), utc(22, 9, 30))),
+        arrays((utc(22, 10), utc(22, 11))),
+    ]
+    assert [start for start, _ in find(busy)] == [
+        utc(22, 9, 30), utc(22, 11), utc(22, 11, 15), utc(22, 11, 30),
+    ]
+    assert find(busy)[0] == (utc(22, 9, 30), utc(22, 10))
+
+def test_slots_are_aligned_to_step():
+    # Livre das 9:40 às 10:00: o primeiro início alinhado (9:45) não cabe 30 min
+    busy = [arrays((utc(22, 9), utc(22, 9, 40)), (utc(22, 10), utc(22, 12)))]
+    assert find(busy) == []
+    assert find(busy, duration=timedelta(minutes=15)) == [(utc(22, 9, 45), utc(22, 10))]
+
+def test_limit_and_no_calendars():
+    slots = find([], limit=3)
+    assert [start for start, _ in slots] == [utc(22, 9), utc(22, 9, 15), utc(22, 9, 30)]
+    assert len(find([])) == 11
@@ -0,0 +1,76 @@
+import json
+from email.parser import BytesParser
+from email.policy import HTTP
+from app.services.google_batch import BatchRequest, BatchResponse, decode_batch, encode_batch
+
+def parse_parts(content_type: str, body: bytes):
+    message = BytesParser(policy=HTTP).parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+    return list(message.iter_parts())
+
+def google_response(parts) -> tuple:
+    """Monta uma resposta batch como a do Google: (Content-ID, status, corpo) por parte"""
+    boundary = "batch_resposta"
+    lines = []
+    for content_id, status_line, body in parts:
+        lines += [
+            f"--{boundary}",
+            "Content-Type: application/http",
+            f"Content-ID: <{content_id}>",
+            "",
+            f"HTTP/1.1 {status_line}",
+            "Content-Type: application/json; charset=UTF-8",
+            "",
+            body,
+            "",
+        ]
+    lines.append(f"--{boundary}--")
+    return f"multipart/mixed; boundary={boundary}", "\r\n".join(lines).encode()
+
+def test_encode_one_part_per_request():
+    requests = [
+        BatchRequest("POST", "/calendar/v3/calendars/primary/events", {"summary": "Reunião"}),
+        BatchRequest("DELETE", "/calendar/v3/calendars/primary/events/abc"),
+    ]
+    content_type, body = encode_batch(requests, {"Authorization": "Bearer t"})
+    assert content_type.startswith("multipart/mixed; boundary=batch_")
+
+    parts = parse_parts(content_type, body)
+    assert [part["Content-ID"] for part in parts] == ["<item-0>", "<item-1>"]
+    first = parts[0].get_payload(decode=True).decode()
+    head, _, payload = first.replace("\r\n", "\n").partition("\n\n")
+    assert head.splitlines()[0] == "POST /calendar/v3/calendars/primary/events HTTP/1.1"
+    assert "Authorization: Bearer t" in head
+    assert json.loads(payload) == {"summary": "Reunião"}
+    second = parts[1].get_payload(decode=True).decode()
+    assert second.splitlines()[0] == "DELETE /calendar/v3/calendars/primary/events/abc HTTP/1.1"
+
+def test_round_trip_matches_responses_by_content_id():
+    requests = [BatchRequest("POST", "/events", {"summary": f"evento {i}"}) for i in range(3)]
+    content_type, body = encode_batch(requests, {})
+
+    # Responde cada parte ecoando o corpo, fora de ordem como o Google pode fazer
+    answers = []
+    for part in reversed(parse_parts(content_type, body)):
+        index = part["Content-ID"].strip("<>").rsplit("-", 1)[1]
+        payload = part.get_payload(decode=True).decode().replace("\r\n", "\n").partition("\n\n")[2]
+        answers.append((f"response-item-{index}", "200 OK", payload.strip()))
+
+    responses = decode_batch(*google_response(answers), size=len(requests))
+    assert responses == [BatchResponse(200, {"summary": f"evento {i}"}) for i in range(3)]
+
+def test_decode_missing_and_failed_parts():
+    content_type, body = google_response([
+        ("response-item-0", "204 No Content", ""),
+        ("response-item-2", "403 Forbidden", json.dumps({"error": {"code": 403, "message": "negado"}})),
+        ("response-item-9", "200 OK", "{}"),
+        ("sem-indice", "200 OK", "{}"),
+    ])
+    responses = decode_batch(content_type, body, size=3)
+    assert responses[0] == BatchResponse(204, None)
+    assert responses[1] is None
+    assert responses[2] == BatchResponse(403, {"error": {"code": 403, "message": "negado"}})
+
+def test_decode_non_json_body_and_non_multipart():
+    content_type, body = google_response([("response-item-0", "500 Internal Server Error", "falhou")])
+    assert decode_batch(content_type, body, size=1) == [BatchResponse(500, {"error": {"message": "falhou"}})]
+    assert decode_batch("application/json", b"{}", size=2) == [None, None]
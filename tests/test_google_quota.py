@@ -0,0 +1,68 @@
+import pytest
+from app.core.config import settings
+from app.services import google_quota
+from app.services.google_quota import TokenBucket, backoff_delay
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(google_quota.time, "monotonic", fake)
+    return fake
+
+def test_burst_then_spaced_by_rate(clock):
+    bucket = TokenBucket(rate=10, burst=5)
+    assert [bucket.reserve() for _ in range(5)] == [0.0] * 5
+    # Cada reserva seguinte espera mais 1/rate segundos
+    assert bucket.reserve() == pytest.approx(0.1)
+    assert bucket.reserve() == pytest.approx(0.2)
+
+def test_refill_is_capped_at_burst(clock):
+    bucket = TokenBucket(rate=10, burst=5)
+    for _ in range(5):
+        bucket.reserve()
+    clock.now += 0.3
+    assert bucket.reserve(3) == pytest.approx(0)
+    assert bucket.reserve() == pytest.approx(0.1)
+    clock.now += 3600
+    assert bucket.reserve(5) == 0.0
+    assert bucket.reserve() == pytest.approx(0.1)
+
+def test_refund_returns_unused_reservation(clock):
+    bucket = TokenBucket(rate=10, burst=2)
+    bucket.reserve(2)
+    assert bucket.reserve() == pytest.approx(0.1)
+    bucket.refund()
+    assert bucket.reserve() == pytest.approx(0.1)
+    bucket.refund(10)
+    assert bucket.tokens == 2
+
+def test_pause_holds_new_reservations(clock):
+    bucket = TokenBucket(rate=10, burst=5)
+    bucket.pause(2)
+    assert bucket.reserve() == pytest.approx(2.1)
+    clock.now += 2
+    assert bucket.reserve() == pytest.approx(0.2)
+
+def test_zero_rate_disables_limit(clock):
+    bucket = TokenBucket(rate=0, burst=0)
+    assert [bucket.reserve(100) for _ in range(3)] == [0.0] * 3
+    bucket.pause(60)
+    assert bucket.reserve() == 0.0
+
+def test_backoff_grows_exponentially_with_jitter(monkeypatch):
+    monkeypatch.setattr(settings, "GOOGLE_RETRY_MAX_BACKOFF", 4.0)
+    for attempt, delay in [(0, 0.5), (1, 1.0), (2, 2.0), (3, 4.0), (10, 4.0)]:
+        for _ in range(50):
+            assert delay / 2 <= backoff_delay(attempt, base=0.5) <= delay
+
+def test_backoff_uses_retry_after(monkeypatch):
+    monkeypatch.setattr(settings, "GOOGLE_RETRY_BACKOFF", 0.5)
+    for _ in range(50):
+        assert 30 <= backoff_delay(5, retry_after=30) <= 30.5
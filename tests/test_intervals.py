@@ -0,0 +1,48 @@
+import random
+from datetime import datetime, timedelta, timezone
+from app.services.intervals import IntervalIndex
+
+BASE = datetime(2024, 1, 22, tzinfo=timezone.utc)
+
+def at(minutes: int) -> datetime:
+    return BASE + timedelta(minutes=minutes)
+
+def test_empty_index():
+    index = IntervalIndex([])
+    assert len(index) == 0
+    assert index.overlapping(at(0), at(60)) == []
+
+def test_half_open_intervals():
+    index = IntervalIndex([(at(60), at(120), "a")])
+    # Encostar no início ou no fim não é conflito
+    assert index.overlapping(at(0), at(60)) == []
+    assert index.overlapping(at(120), at(180)) == []
+    assert index.overlapping(at(119), at(180)) == ["a"]
+    assert index.overlapping(at(0), at(61)) == ["a"]
+
+def test_long_interval_is_found_after_many_short_ones():
+    # O evento longo começa antes de todos os outros e termina depois deles
+    intervals = [(at(10 * i), at(10 * i + 5), f"curto-{i}") for i in range(1, 100)]
+    intervals.append((at(0), at(10_000), "longo"))
+    index = IntervalIndex(intervals)
+    assert index.overlapping(at(7), at(9)) == ["longo"]
+    assert index.overlapping(at(500), at(506)) == ["longo", "curto-50"]
+
+def test_results_in_start_order():
+    index = IntervalIndex([(at(30), at(90), "c"), (at(0), at(60), "a"), (at(10), at(40), "b")])
+    assert index.overlapping(at(35), at(36)) == ["a", "b", "c"]
+
+def test_matches_brute_force():
+    rng = random.Random(7)
+    intervals = []
+    for i in range(300):
+        start = rng.randrange(0, 5000)
+        intervals.append((at(start), at(start + rng.randrange(1, 600)), i))
+    index = IntervalIndex(intervals)
+    ordered = sorted(intervals, key=lambda interval: interval[0])
+
+    for _ in range(200):
+        start = rng.randrange(-100, 5600)
+        end = start + rng.randrange(1, 300)
+        expected = [item for s, e, item in ordered if s < at(end) and e > at(start)]
+        assert index.overlapping(at(start), at(end)) == expected